@@ -1,9 +1,11 @@
 # oishii/oishii/settings.py
 import os
+import tempfile
 from pathlib import Path
 from urllib.parse import urlparse
 
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -92,6 +94,30 @@ DATABASES = {
     )
 }
 
+# --------------------------------------------------------------------------------------
+# Cache: Redis (REDIS_URL) in prod, per-process memory only for local DEBUG
+# --------------------------------------------------------------------------------------
+# Per-viewer caches (friend sets, friend ratings, ...) are invalidated from signals,
+# so with several gunicorn workers they must share one backend: a per-process cache
+# would keep serving stale friend sets (and private lists) from the other workers.
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+elif DEBUG:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+else:
+    raise ImproperlyConfigured("REDIS_URL must be set when DEBUG is off")
+
 # --------------------------------------------------------------------------------------
 # I18N / TZ
 # --------------------------------------------------------------------------------------
@@ -169,6 +195,22 @@ else:
     if not MEDIA_URL.endswith("/"):
         MEDIA_URL += "/"
 
+# Review photo uploads are spooled to local disk and pushed to media storage (plus
+# resized) by a per-process worker pool; see places/photo_jobs.py. 0 workers = inline.
+PHOTO_SPOOL_DIR = os.getenv("PHOTO_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "oishii-photo-spool"))
+PHOTO_WORKERS = int(os.getenv("PHOTO_WORKERS", "4"))
+
+# Uploaded review/saved-place history imports run in their own per-process pool; see
+# places/history_import.py. 0 workers = inline on commit.
+HISTORY_IMPORT_WORKERS = int(os.getenv("HISTORY_IMPORT_WORKERS", "1"))
+
+# Import geocoding; see places/geocoding.py. Results are cached on disk across runs, and
+# GEOCODING_URL can point at a local stub server. RATE is requests/second over all workers.
+GEOCODING_URL = os.getenv("GEOCODING_URL", "https://maps.googleapis.com/maps/api/geocode/json")
+GEOCODING_CACHE_PATH = os.getenv("GEOCODING_CACHE_PATH", str(BASE_DIR / "geocode_cache.sqlite3"))
+GEOCODING_WORKERS = int(os.getenv("GEOCODING_WORKERS", "8"))
+GEOCODING_RATE = float(os.getenv("GEOCODING_RATE", "25"))
+
 # --------------------------------------------------------------------------------------
 # Security (enable fully in prod)
 # --------------------------------------------------------------------------------------
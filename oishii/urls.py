@@ -22,6 +22,13 @@ urlpatterns = [
     path("lists/<int:list_id>/edit/", pviews.edit_list, name="edit_list"),
     path("lists/<int:list_id>/delete/", pviews.delete_list, name="delete_list"),
     path("lists/<int:list_id>/pin/<int:pin_id>/delete/", pviews.delete_pin, name="delete_pin"),
+    path("lists/bulk/add/", pviews.bulk_add_to_lists, name="bulk_add_to_lists"),
+    path("lists/bulk/remove/", pviews.bulk_remove_from_lists, name="bulk_remove_from_lists"),
+    path("lists/<int:list_id>/move/", pviews.move_list_pins, name="move_list_pins"),
+    path("lists/<int:list_id>/copy/", pviews.copy_list, name="copy_list"),
+    path("lists/<int:list_id>/merge/", pviews.merge_lists, name="merge_lists"),
+    path("lists/<int:list_id>/reorder/", pviews.reorder_list, name="reorder_list"),
+    path("lists/<int:list_id>/pin/<int:pin_id>/reorder/", pviews.reorder_pin, name="reorder_pin"),
     # social views
     path("me/", sviews.profile_me, name="profile_me"),
     path("friends/", sviews.friends, name="friends"),
@@ -44,7 +51,9 @@ urlpatterns = [
     path("notification-review/<int:activity_id>/", sviews.notification_review, name="notification_review"),
     path("me/", sviews.profile_me, name="profile_me"),
     path("me/edit/", sviews.edit_profile, name="edit_profile"),
+    path("me/tab/<slug:tab>/", sviews.profile_me_tab, name="profile_me_tab"),                  # HTMX tab body
     path("u/<str:username>/", sviews.profile_public, name="profile_public"),
+    path("u/<str:username>/tab/<slug:tab>/", sviews.profile_public_tab, name="profile_public_tab"),  # HTMX tab body
     # Include places URLs UNDER a namespace
     path("", include(("places.urls", "places"), namespace="places")),
 
@@ -1,6 +1,7 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
-from .models import List, Pin, Restaurant, Review
+from . import dedup
+from .models import DuplicateCandidate, HistoryImport, List, Pin, Restaurant, RestaurantScore, Review
 
 
 @admin.register(Restaurant)
@@ -12,9 +13,9 @@ class RestaurantAdmin(admin.ModelAdmin):
 
 @admin.register(List)
 class ListAdmin(admin.ModelAdmin):
-    list_display = ("title", "owner", "is_public")
+    list_display = ("title", "owner", "kind", "is_public")
     search_fields = ("title", "owner__username")
-    list_filter = ("is_public",)
+    list_filter = ("kind", "is_public")
 
 
 @admin.register(Pin)
@@ -28,3 +29,45 @@ class ReviewAdmin(admin.ModelAdmin):
     list_display = ("restaurant", "user", "overall_rating", "food", "service", "value", "atmosphere", "created_at")
     search_fields = ("restaurant__name", "user__username", "text")
     list_filter = ("overall_rating", "created_at")
+
+
+@admin.register(RestaurantScore)
+class RestaurantScoreAdmin(admin.ModelAdmin):
+    list_display = ("restaurant", "city", "category", "trending", "top_rated", "rating_count", "updated_at")
+    search_fields = ("restaurant__name", "city")
+    list_filter = ("category",)
+    raw_id_fields = ("restaurant",)
+
+
+@admin.register(DuplicateCandidate)
+class DuplicateCandidateAdmin(admin.ModelAdmin):
+    list_display = ("restaurant", "duplicate", "score", "status", "created_at")
+    list_filter = ("status",)
+    search_fields = ("restaurant__name", "duplicate__name")
+    raw_id_fields = ("restaurant", "duplicate")
+    actions = ("merge_pairs", "dismiss_pairs")
+
+    @admin.action(description="Merge selected pairs")
+    def merge_pairs(self, request, queryset):
+        merged = 0
+        for candidate in queryset.filter(status=DuplicateCandidate.PENDING).select_related("restaurant", "duplicate"):
+            # An earlier merge in this batch may already have removed one side.
+            if not DuplicateCandidate.objects.filter(pk=candidate.pk).exists():
+                continue
+            dedup.merge_candidate(candidate)
+            merged += 1
+        self.message_user(request, f"Merged {merged} pairs.", messages.SUCCESS)
+
+    @admin.action(description="Not duplicates: dismiss selected pairs")
+    def dismiss_pairs(self, request, queryset):
+        dismissed = queryset.update(status=DuplicateCandidate.DISMISSED)
+        self.message_user(request, f"Dismissed {dismissed} pairs.", messages.SUCCESS)
+
+
+@admin.register(HistoryImport)
+class HistoryImportAdmin(admin.ModelAdmin):
+    list_display = ("user", "status", "post_activity", "created_at", "finished_at")
+    list_filter = ("status",)
+    search_fields = ("user__username",)
+    raw_id_fields = ("user",)
+    readonly_fields = ("counts", "error", "started_at", "finished_at")
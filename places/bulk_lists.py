@@ -0,0 +1,153 @@
+"""
+Set-based list curation: add/remove many restaurants, move, copy and merge lists.
+
+Every operation runs in one transaction. Inserts use bulk_create(ignore_conflicts=True)
+against the (list, restaurant) unique constraint and removals are a single DELETE, so
+curating hundreds of places costs a handful of queries instead of one round trip each.
+
+Neither path sends Pin signals, so `_pins_changed` applies what those receivers would
+have done: trending events per restaurant, the owner's profile stats and their
+cached memberships.
+"""
+from django.db import transaction
+
+from social import stats
+
+from . import leaderboards, list_pages, ranks
+from .memberships import invalidate_memberships
+from .models import List, Pin
+
+BATCH_SIZE = 500
+# Upper bound on restaurants per request; the UI pages through larger selections.
+MAX_RESTAURANTS = 1000
+
+
+def _delete(pins):
+    # Pins have no dependent rows, so skip the collector's per-row fetch and signals;
+    # callers pass what was removed to _pins_changed instead.
+    return pins._raw_delete(pins.db)
+
+
+def _pins_changed(user_id, added=(), removed=()):
+    leaderboards.record_events(added, leaderboards.PIN_WEIGHT)
+    leaderboards.record_events(removed, -leaderboards.PIN_WEIGHT)
+    stats.recompute(user_ids=[user_id])
+    # Moves change per-list membership even when nothing was added or removed.
+    transaction.on_commit(lambda: invalidate_memberships(user_id))
+
+
+def add_to_lists(user, list_ids, restaurant_ids):
+    """Pin every restaurant to every list. Returns the number of pins created."""
+    with transaction.atomic():
+        existing = set(
+            Pin.objects.filter(list_id__in=list_ids, restaurant_id__in=restaurant_ids)
+            .values_list("list_id", "restaurant_id")
+        )
+        new_pins = []
+        # bulk_create skips the pre_save receivers that rank new pins and copy their
+        # sort keys; do both here.
+        sort_keys = list_pages.sort_keys(restaurant_ids)
+        for list_id in list_ids:
+            missing = [rid for rid in restaurant_ids if (list_id, rid) not in existing]
+            keys = ranks.append_keys(Pin.objects.filter(list_id=list_id), len(missing))
+            for restaurant_id, key in zip(missing, keys):
+                name, rating = sort_keys.get(restaurant_id, ("", 0.0))
+                new_pins.append(
+                    Pin(
+                        user=user,
+                        list_id=list_id,
+                        restaurant_id=restaurant_id,
+                        rank=key,
+                        sort_name=name,
+                        sort_rating=rating,
+                    )
+                )
+        Pin.objects.bulk_create(new_pins, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        _pins_changed(user.id, added=[(p.restaurant_id, p.created_at) for p in new_pins])
+    return len(new_pins)
+
+
+def remove_from_lists(user, list_ids, restaurant_ids):
+    """Unpin every restaurant from every list. Returns the number of pins deleted."""
+    with transaction.atomic():
+        pins = Pin.objects.filter(list_id__in=list_ids, restaurant_id__in=restaurant_ids)
+        removed = list(pins.values_list("restaurant_id", "created_at"))
+        _delete(pins)
+        _pins_changed(user.id, removed=removed)
+    return len(removed)
+
+
+def _move(source_id, target_id, restaurant_ids=None):
+    pins = Pin.objects.filter(list_id=source_id)
+    if restaurant_ids is not None:
+        pins = pins.filter(restaurant_id__in=restaurant_ids)
+    # Places already in the target keep the target's pin; the source copy goes.
+    duplicates = pins.filter(
+        restaurant_id__in=Pin.objects.filter(list_id=target_id).values("restaurant_id")
+    )
+    removed = list(duplicates.values_list("restaurant_id", "created_at"))
+    _delete(duplicates)
+    moved = assign_to_list(pins.order_by("rank", "id").values_list("pk", flat=True), target_id)
+    return moved + len(removed), removed
+
+
+def assign_to_list(pin_ids, target_id):
+    """
+    Move pins into `target_id` after its current last pin, keeping their order, with one
+    bulk UPDATE. Like the other bulk writes this sends no signals. Returns pins moved.
+    """
+    pin_ids = list(pin_ids)
+    keys = ranks.append_keys(Pin.objects.filter(list_id=target_id), len(pin_ids))
+    Pin.objects.bulk_update(
+        [Pin(pk=pk, list_id=target_id, rank=key) for pk, key in zip(pin_ids, keys)],
+        ["list", "rank"],
+        batch_size=BATCH_SIZE,
+    )
+    return len(pin_ids)
+
+
+def move_pins(user, source_id, target_id, restaurant_ids=None):
+    """
+    Move pins (all of them, or just `restaurant_ids`) from one list to another.
+    Returns the number of places moved.
+    """
+    with transaction.atomic():
+        moved, removed = _move(source_id, target_id, restaurant_ids)
+        _pins_changed(user.id, removed=removed)
+    return moved
+
+
+def copy_list(user, source, title, is_public=None):
+    """Create a new list called `title` holding the same places. Returns (list, pins_copied)."""
+    with transaction.atomic():
+        new_list = List.objects.create(
+            owner=user,
+            title=title,
+            is_public=source.is_public if is_public is None else is_public,
+        )
+        # Copying the ranks keeps the source's order in the new list.
+        fields = ("restaurant_id", "note", "rating", "rank", "sort_name", "sort_rating")
+        new_pins = [
+            Pin(user=user, list=new_list, **dict(zip(fields, values)))
+            for values in Pin.objects.filter(list=source).values_list(*fields).iterator(chunk_size=BATCH_SIZE)
+        ]
+        Pin.objects.bulk_create(new_pins, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        _pins_changed(user.id, added=[(p.restaurant_id, p.created_at) for p in new_pins])
+    return new_list, len(new_pins)
+
+
+def merge_lists(user, source_ids, target_id):
+    """
+    Move every pin from the source lists into the target, then delete the sources.
+    Returns the number of places moved.
+    """
+    moved = 0
+    removed = []
+    with transaction.atomic():
+        for source_id in source_ids:
+            n, dropped = _move(source_id, target_id)
+            moved += n
+            removed += dropped
+        List.objects.filter(pk__in=source_ids).delete()
+        _pins_changed(user.id, removed=removed)
+    return moved
@@ -0,0 +1,195 @@
+"""
+Sanity checks for restaurant coordinates, vectorized with NumPy.
+
+All coordinates are loaded into float arrays (NaN where missing) and every check is a
+whole-array expression, so the full catalog is checked in about a second:
+
+- ZERO: exactly (0, 0), the usual "no value" from a spreadsheet or failed geocode;
+- OUT_OF_RANGE: |lat| > 90 or |lng| > 180;
+- SWAPPED: lat and lng exchanged, i.e. the point is out of range or outside its city
+  while (lng, lat) is fine;
+- OUTSIDE_CITY: outside the bounding box (times TOLERANCE) of the city its address
+  names, or failing that its `city` field (see localities);
+- ISOLATED: no other restaurant within about ISOLATION_DEGREES, e.g. a London place
+  geocoded to Melbourne. Only checked over a whole catalog of at least
+  ISOLATION_MIN_ROWS places, where a lone point means something;
+- DUPLICATE: the exact same coordinates (to ~0.1 m) as another restaurant.
+
+The first four are BAD: `fix` nulls their coordinates (swapped ones are swapped back)
+so they stop showing up on maps in the wrong place. ISOLATED and DUPLICATE are only
+reported; food halls share a building and new cities start with one place.
+"""
+import math
+
+import numpy as np
+from django.db.models import F
+
+from . import localities
+from .models import Restaurant
+
+ZERO = "zero"
+OUT_OF_RANGE = "out_of_range"
+SWAPPED = "swapped"
+OUTSIDE_CITY = "outside_city"
+ISOLATED = "isolated"
+DUPLICATE = "duplicate"
+BAD = (ZERO, OUT_OF_RANGE, SWAPPED, OUTSIDE_CITY)
+
+TOLERANCE = 1.5
+ISOLATION_DEGREES = 0.5
+ISOLATION_MIN_ROWS = 50
+_KM_PER_DEGREE = 111.32
+
+
+def _city_boxes(index):
+    # casefolded city name -> (lat, lng, half-height, half-width) in degrees.
+    boxes = {}
+    for name, _country, lat, lng, radius in index.cities:
+        half_lat = radius * TOLERANCE / _KM_PER_DEGREE
+        half_lng = half_lat / max(math.cos(math.radians(lat)), 0.01)
+        boxes.setdefault(name.casefold(), (lat, lng, half_lat, half_lng))
+    return boxes
+
+
+def expected_cities(addresses, cities, index=None):
+    """Per row, the city its address names, else its `city` value (may be unknown)."""
+    index = index or localities.default_index()
+    expected = []
+    for address, city in zip(addresses, cities):
+        locality = localities.from_address(address, index)
+        expected.append(locality.city if locality else city or "")
+    return expected
+
+
+def check(lat, lng, expected, whole_catalog=False, index=None):
+    """
+    Findings for coordinate arrays `lat`/`lng` (NaN = missing) and the city each row is
+    expected in. Returns {problem: boolean mask}; a row has at most one BAD problem.
+    """
+    index = index or localities.default_index()
+    lat = np.asarray(lat, dtype=float)
+    lng = np.asarray(lng, dtype=float)
+    present = ~(np.isnan(lat) | np.isnan(lng))
+
+    boxes = _city_boxes(index)
+    known = np.array([name.casefold() in boxes for name in expected], dtype=bool)
+    box = np.array(
+        [boxes.get(name.casefold(), (np.nan,) * 4) for name in expected], dtype=float
+    ).reshape(-1, 4)
+
+    def inside(lat_, lng_):
+        return (np.abs(lat_ - box[:, 0]) <= box[:, 2]) & (np.abs(lng_ - box[:, 1]) <= box[:, 3])
+
+    def in_range(lat_, lng_):
+        return (np.abs(lat_) <= 90) & (np.abs(lng_) <= 180)
+
+    with np.errstate(invalid="ignore"):
+        zero = present & (lat == 0) & (lng == 0)
+        ok_range = in_range(lat, lng)
+        swapped_range = in_range(lng, lat)
+        swapped = present & ~zero & (
+            (~ok_range & swapped_range)
+            | (known & ok_range & ~inside(lat, lng) & inside(lng, lat))
+        )
+        out_of_range = present & ~ok_range & ~swapped
+        outside = present & known & ok_range & ~zero & ~swapped & ~inside(lat, lng)
+
+    found = {
+        ZERO: zero,
+        OUT_OF_RANGE: out_of_range,
+        SWAPPED: swapped,
+        OUTSIDE_CITY: outside,
+    }
+    plausible = present & ~np.logical_or.reduce([zero, out_of_range, swapped, outside])
+    found[DUPLICATE] = _duplicates(lat, lng, plausible)
+    if whole_catalog and plausible.sum() >= ISOLATION_MIN_ROWS:
+        found[ISOLATED] = _isolated(lat, lng, plausible)
+    else:
+        found[ISOLATED] = np.zeros(len(lat), dtype=bool)
+    return found
+
+
+def _duplicates(lat, lng, mask):
+    result = np.zeros(len(lat), dtype=bool)
+    if not mask.any():
+        return result
+    points = np.round(np.column_stack([lat[mask], lng[mask]]), 6)
+    _unique, inverse, counts = np.unique(points, axis=0, return_inverse=True, return_counts=True)
+    result[mask] = counts[inverse.ravel()] > 1
+    return result
+
+
+def _isolated(lat, lng, mask):
+    # Count points in each ISOLATION_DEGREES cell, then sum each point's 3x3 neighbourhood:
+    # a sum of 1 means the point is alone in it.
+    rows = np.floor(lat[mask] / ISOLATION_DEGREES).astype(np.int64)
+    cols = np.floor(lng[mask] / ISOLATION_DEGREES).astype(np.int64)
+    keys = (rows + 1000) * 10_000 + (cols + 1000)
+    cells, counts = np.unique(keys, return_counts=True)
+    neighbours = np.zeros(len(keys), dtype=np.int64)
+    for d_row in (-1, 0, 1):
+        for d_col in (-1, 0, 1):
+            wanted = keys + d_row * 10_000 + d_col
+            position = np.clip(np.searchsorted(cells, wanted), 0, len(cells) - 1)
+            neighbours += np.where(cells[position] == wanted, counts[position], 0)
+    result = np.zeros(len(lat), dtype=bool)
+    result[mask] = neighbours == 1
+    return result
+
+
+def check_catalog(queryset=None):
+    """
+    Check every restaurant. Returns (restaurants, found): `restaurants` is a list of
+    (pk, name, lat, lng, city, expected city) tuples aligned with check()'s masks.
+    """
+    queryset = Restaurant.objects.all() if queryset is None else queryset
+    restaurants = list(
+        queryset.order_by("pk").values_list("pk", "name", "lat", "lng", "address", "city").iterator(chunk_size=5000)
+    )
+    index = localities.default_index()
+    expected = expected_cities([r[4] for r in restaurants], [r[5] for r in restaurants], index)
+    lat = np.array([np.nan if r[2] is None else r[2] for r in restaurants], dtype=float)
+    lng = np.array([np.nan if r[3] is None else r[3] for r in restaurants], dtype=float)
+    found = check(lat, lng, expected, whole_catalog=True, index=index)
+    rows = [(pk, name, lat_, lng_, city, want) for (pk, name, lat_, lng_, _a, city), want in zip(restaurants, expected)]
+    return rows, found
+
+
+def fix(pks_by_problem):
+    """Null out BAD coordinates (swap SWAPPED ones back). Returns the rows changed."""
+    changed = 0
+    for problem in BAD:
+        pks = list(pks_by_problem.get(problem, ()))
+        for start in range(0, len(pks), 500):
+            rows = Restaurant.objects.filter(pk__in=pks[start:start + 500])
+            if problem == SWAPPED:
+                # Both sides of SET read the old row, so this swaps.
+                changed += rows.update(lat=F("lng"), lng=F("lat"))
+            else:
+                changed += rows.update(lat=None, lng=None)
+    return changed
+
+
+def check_rows(rows, on_problem=None):
+    """
+    Import stage for a chunk of rows: BAD coordinates are dropped (or swapped back) before
+    they're saved, and `on_problem(row, problem)` is called for each. Returns the rows.
+    """
+    rows = list(rows)
+    if not rows:
+        return rows
+    index = localities.default_index()
+    expected = expected_cities([row.get("address") for row in rows], [row.get("city") for row in rows], index)
+    lat = np.array([np.nan if row.get("lat") is None else row["lat"] for row in rows], dtype=float)
+    lng = np.array([np.nan if row.get("lng") is None else row["lng"] for row in rows], dtype=float)
+    found = check(lat, lng, expected, index=index)
+    for problem in BAD:
+        for position in np.flatnonzero(found[problem]):
+            row = rows[position]
+            if problem == SWAPPED:
+                row["lat"], row["lng"] = row["lng"], row["lat"]
+            else:
+                row["lat"], row["lng"] = None, None
+            if on_problem:
+                on_problem(row, problem)
+    return rows
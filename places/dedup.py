@@ -0,0 +1,330 @@
+"""
+Restaurant entity resolution: find likely duplicates, merge the sure ones, queue the rest.
+
+Comparing every pair is O(n²), so candidates are first grouped into small blocks and
+only pairs sharing a block are scored:
+
+- restaurants with coordinates go into geo cells of about CELL_METERS a side and are
+  blocked by (cell, name token), looking at the 3x3 neighbouring cells so places on a
+  cell edge still meet;
+- restaurants without coordinates are blocked by (city, name token) instead;
+- restaurants sharing an `external_id` (e.g. a Google Place ID) are always a match.
+
+Tokens carried by more than COMMON_TOKEN_SHARE of all names (a chain's brand, "pizza")
+are not used as block keys, and blocks bigger than MAX_BLOCK are skipped: the pair
+will usually share a rarer token too. The whole name is always a block key as well, so
+identical names still meet however common their words are.
+
+A pair's score mixes name similarity (character-level ratio, token overlap and one
+name containing the other, as in "Dishoom" / "Dishoom Shoreditch") with distance.
+Pairs scoring AUTO_MERGE or more are merged; pairs above REVIEW become
+`DuplicateCandidate` rows for staff (admin actions merge or dismiss them).
+
+`merge_restaurants` moves everything pointing at the duplicate (pins, reviews and their
+photos, feed activities, profile favourites, leaderboard score) onto the kept
+restaurant, resolving clashes with the unique constraints, then deletes it.
+"""
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+from django.db import transaction
+from django.db.models import Count
+
+from social import stats
+from social.friendships import get_friend_ids
+from social.models import Activity, Profile
+
+from . import leaderboards, list_pages
+from .friend_ratings import invalidate_friend_ratings
+from .memberships import invalidate_memberships
+from .models import DuplicateCandidate, Photo, Pin, Restaurant, Review
+
+CELL_METERS = 200
+MAX_DISTANCE_METERS = 250
+MAX_BLOCK = 100
+COMMON_TOKEN_SHARE = 0.01
+AUTO_MERGE = 0.92
+REVIEW = 0.75
+# Words that say little about which place it is.
+STOPWORDS = frozenset({"the", "and", "of", "de", "la", "le", "restaurant", "cafe"})
+
+_METERS_PER_DEGREE = 111_320
+
+
+def name_key(name):
+    """Case-, accent-, punctuation- and spacing-insensitive form of a name."""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char)).casefold()
+    return " ".join(re.sub(r"[^\w\s]", " ", name).split())
+
+
+def name_tokens(key):
+    return frozenset(token for token in key.split() if token not in STOPWORDS)
+
+
+def name_similarity(a, b):
+    """Similarity in [0, 1] of two `_Entry` names."""
+    if a.key == b.key:
+        return 1.0
+    if a.numbers and b.numbers and a.numbers != b.numbers:
+        # "Branch 2" is not "Branch 12", however alike the strings look.
+        return 0.0
+    ratio = SequenceMatcher(None, a.key, b.key).ratio()
+    if not a.tokens or not b.tokens:
+        return ratio
+    shared = len(a.tokens & b.tokens)
+    jaccard = shared / len(a.tokens | b.tokens)
+    containment = shared / min(len(a.tokens), len(b.tokens))
+    return max(ratio, (jaccard + containment) / 2)
+
+
+def distance_meters(lat1, lng1, lat2, lng2):
+    # Equirectangular approximation; plenty for a few hundred metres.
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return math.hypot(x, y) * 6_371_000
+
+
+def score(a, b):
+    """Match score in [0, 1] for two `_Entry`s."""
+    if a.external_id and a.external_id == b.external_id:
+        return 1.0
+    if a.lat is None or b.lat is None:
+        # Same city, no position to confirm: never sure enough to merge alone.
+        return 0.9 * name_similarity(a, b)
+    distance = distance_meters(a.lat, a.lng, b.lat, b.lng)
+    closeness = max(0.0, 1 - distance / MAX_DISTANCE_METERS)
+    return 0.75 * name_similarity(a, b) + 0.25 * closeness
+
+
+class _Entry:
+    """One restaurant as the matcher sees it, with its name pre-tokenized."""
+
+    __slots__ = ("pk", "key", "tokens", "numbers", "lat", "lng", "city", "external_id")
+
+    def __init__(self, pk, name, lat=None, lng=None, city="", external_id=""):
+        self.pk = pk
+        self.key = name_key(name)
+        self.tokens = name_tokens(self.key)
+        self.numbers = frozenset(token for token in self.tokens if token.isdigit())
+        self.lat = lat
+        self.lng = lng
+        self.city = name_key(city or "")
+        self.external_id = external_id
+
+
+def _cell(lat, lng):
+    size = CELL_METERS / _METERS_PER_DEGREE
+    return (
+        math.floor(lat / size),
+        math.floor(lng * math.cos(math.radians(lat)) / size),
+    )
+
+
+def _block_tokens(entries):
+    # pk -> the tokens (plus the whole name) an entry is blocked by.
+    frequency = Counter(token for entry in entries for token in entry.tokens)
+    common_above = max(MAX_BLOCK, len(entries) * COMMON_TOKEN_SHARE)
+    return {
+        entry.pk: {token for token in entry.tokens if frequency[token] <= common_above} | {entry.key}
+        for entry in entries
+    }
+
+
+def candidate_pairs(entries):
+    """Yield each (a, b) pair sharing a block once, with a.pk < b.pk."""
+    by_pk = {entry.pk: entry for entry in entries}
+    tokens = _block_tokens(entries)
+    blocks = defaultdict(list)
+    for entry in entries:
+        if entry.external_id:
+            blocks[("id", entry.external_id)].append(entry.pk)
+        if entry.lat is not None:
+            cell = _cell(entry.lat, entry.lng)
+            for token in tokens[entry.pk]:
+                blocks[("geo", cell, token)].append(entry.pk)
+        else:
+            for token in tokens[entry.pk]:
+                blocks[("city", entry.city, token)].append(entry.pk)
+
+    seen = set()
+    for entry in entries:
+        neighbours = []
+        if entry.external_id:
+            neighbours.append(blocks[("id", entry.external_id)])
+        if entry.lat is not None:
+            row, col = _cell(entry.lat, entry.lng)
+            for token in tokens[entry.pk]:
+                for d_row in (-1, 0, 1):
+                    for d_col in (-1, 0, 1):
+                        neighbours.append(blocks.get(("geo", (row + d_row, col + d_col), token), ()))
+        # Geocoded places can still match un-geocoded ones in the same city.
+        for token in tokens[entry.pk]:
+            neighbours.append(blocks.get(("city", entry.city, token), ()))
+
+        for block in neighbours:
+            if len(block) > MAX_BLOCK:
+                continue
+            for other_pk in block:
+                if other_pk <= entry.pk or (entry.pk, other_pk) in seen:
+                    continue
+                seen.add((entry.pk, other_pk))
+                yield entry, by_pk[other_pk]
+
+
+def find_duplicates(queryset=None, threshold=REVIEW):
+    """Scored pairs [(score, pk_a, pk_b)] at or above `threshold`, best first."""
+    queryset = Restaurant.objects.all() if queryset is None else queryset
+    entries = [
+        _Entry(*values)
+        for values in queryset.values_list("pk", "name", "lat", "lng", "city", "external_id").iterator(
+            chunk_size=5000
+        )
+    ]
+    pairs = []
+    for a, b in candidate_pairs(entries):
+        pair_score = score(a, b)
+        if pair_score >= threshold:
+            pairs.append((pair_score, a.pk, b.pk))
+    pairs.sort(reverse=True)
+    return pairs
+
+
+# -------------------
+# MERGING
+# -------------------
+
+def _fill_blanks(keep, drop):
+    changed = []
+    for field in ("address", "city", "country", "cuisine", "price", "opening_hours", "website", "external_id"):
+        if not getattr(keep, field) and getattr(drop, field):
+            setattr(keep, field, getattr(drop, field))
+            changed.append(field)
+    if keep.lat is None and drop.lat is not None:
+        keep.lat, keep.lng = drop.lat, drop.lng
+        changed += ["lat", "lng"]
+    if changed:
+        keep.save(update_fields=changed)
+
+
+def merge_restaurants(keep, drop):
+    """
+    Move everything from `drop` onto `keep` and delete `drop`.
+
+    Where a user has both, the kept restaurant's row wins: their duplicate pin in the
+    same list is deleted, and their review of `drop` hands its photos to their review
+    of `keep` before being deleted (through the ORM, so the usual signals fix stats
+    and leaderboards). Everything else is re-pointed with set-based UPDATEs.
+    """
+    if keep.pk == drop.pk:
+        raise ValueError("Cannot merge a restaurant into itself")
+
+    with transaction.atomic():
+        _fill_blanks(keep, drop)
+
+        kept_lists = Pin.objects.filter(restaurant=keep).values("list_id")
+        Pin.objects.filter(restaurant=drop, list_id__in=kept_lists).delete()
+        pin_users = set(Pin.objects.filter(restaurant=drop).values_list("user_id", flat=True))
+        Pin.objects.filter(restaurant=drop).update(restaurant=keep)
+
+        kept_reviews = dict(Review.objects.filter(restaurant=keep).values_list("user_id", "pk"))
+        clashing = Review.objects.filter(restaurant=drop, user_id__in=kept_reviews)
+        for user_id, review_id in clashing.values_list("user_id", "pk"):
+            Photo.objects.filter(review_id=review_id).update(review_id=kept_reviews[user_id])
+        clashing.delete()
+        review_users = set(Review.objects.filter(restaurant=drop).values_list("user_id", flat=True))
+        Review.objects.filter(restaurant=drop).update(restaurant=keep)
+        Activity.objects.filter(restaurant=drop).update(restaurant=keep)
+
+        Favorite = Profile.favorite_spots.through
+        Favorite.objects.filter(
+            restaurant=drop, profile_id__in=Favorite.objects.filter(restaurant=keep).values("profile_id")
+        ).delete()
+        Favorite.objects.filter(restaurant=drop).update(restaurant=keep)
+
+        leaderboards.merge_scores(keep.pk, drop.pk)
+        # The re-pointed pins still carry drop's name and rating.
+        list_pages.refresh_sort_keys([keep.pk])
+        drop.delete()
+
+        # The UPDATEs above skipped Pin/Review signals; refresh what they would have.
+        # A user who pinned both places in different lists now has two pins on one, so
+        # their distinct saved count is rebuilt rather than patched.
+        stats.recompute(user_ids=pin_users | review_users)
+        transaction.on_commit(lambda: invalidate_memberships(*pin_users, *review_users))
+        friends = set().union(*(get_friend_ids(user_id) for user_id in review_users))
+        transaction.on_commit(lambda: invalidate_friend_ratings(friends))
+    return keep
+
+
+def choose_survivor(a, b):
+    """(keep, drop): the restaurant with more pins and reviews stays, then the older one."""
+    engagement = dict(
+        Restaurant.objects.filter(pk__in=[a.pk, b.pk])
+        .annotate(n=Count("pins", distinct=True) + Count("reviews", distinct=True))
+        .values_list("pk", "n")
+    )
+    keep, drop = sorted((a, b), key=lambda r: (-engagement.get(r.pk, 0), r.pk))
+    return keep, drop
+
+
+def merge_candidate(candidate):
+    """Merge a queued pair (the survivor is picked as in choose_survivor)."""
+    keep, drop = choose_survivor(candidate.restaurant, candidate.duplicate)
+    return merge_restaurants(keep, drop)
+
+
+def deduplicate(auto_threshold=AUTO_MERGE, review_threshold=REVIEW, dry_run=False):
+    """
+    Find duplicates across all restaurants, merge pairs scoring `auto_threshold` or more
+    and queue the rest above `review_threshold`. Returns (merged, queued, pairs) where
+    `pairs` is every scored pair found (best first).
+    """
+    pairs = find_duplicates(threshold=review_threshold)
+    dismissed = set(
+        DuplicateCandidate.objects.filter(status=DuplicateCandidate.DISMISSED).values_list(
+            "restaurant_id", "duplicate_id"
+        )
+    )
+    pairs = [pair for pair in pairs if (pair[1], pair[2]) not in dismissed]
+    if dry_run:
+        merged = sum(1 for pair_score, _a, _b in pairs if pair_score >= auto_threshold)
+        return merged, len(pairs) - merged, pairs
+
+    merged_into = {}
+
+    def resolve(pk):
+        while pk in merged_into:
+            pk = merged_into[pk]
+        return pk
+
+    merged = 0
+    queue = {}
+    # Best first, so every merge happens before any pair is queued.
+    for pair_score, pk_a, pk_b in pairs:
+        pk_a, pk_b = sorted((resolve(pk_a), resolve(pk_b)))
+        if pk_a == pk_b:
+            continue
+        if pair_score < auto_threshold:
+            queue.setdefault((pk_a, pk_b), pair_score)
+            continue
+        restaurants = Restaurant.objects.in_bulk([pk_a, pk_b])
+        keep, drop = choose_survivor(restaurants[pk_a], restaurants[pk_b])
+        merged_into[drop.pk] = keep.pk
+        merge_restaurants(keep, drop)
+        merged += 1
+
+    DuplicateCandidate.objects.bulk_create(
+        [
+            DuplicateCandidate(restaurant_id=pk_a, duplicate_id=pk_b, score=pair_score)
+            for (pk_a, pk_b), pair_score in queue.items()
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["restaurant", "duplicate"],
+        update_fields=["score"],
+    )
+    return merged, len(queue), pairs
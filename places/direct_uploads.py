@@ -0,0 +1,105 @@
+"""
+Direct-to-storage uploads for review photos.
+
+Instead of streaming photo bytes through Django, the review forms ask for an upload
+URL per file, send the file straight to the bucket and submit only the resulting
+storage keys (`photo_keys`). The review POST confirms each key (it belongs to the
+user, exists and is within the size limit) and creates the Photo rows pointing at
+it; resizing then runs in places/photo_jobs.py as usual.
+
+- With USE_S3 the URL is an S3 presigned POST whose policy pins the key, the content
+  type and the size range. The bucket needs a CORS rule allowing POST from the site.
+- Without it (local development) the URL is `places:photo_upload_local`, which takes
+  a PUT authorised by a signed token and writes into the filesystem storage.
+
+Browsers without JS (or when an upload fails) still post the files as multipart.
+"""
+import posixpath
+import uuid
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+from .models import Photo, PhotoBlob
+
+UPLOAD_PREFIX = "uploads"
+MAX_UPLOAD_BYTES = 15 * 1024 * 1024
+URL_TTL = 10 * 60
+# Same set the review form's FileExtensionValidator accepts.
+CONTENT_TYPES = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+    "image/webp": "webp",
+}
+_SALT = "places.direct_uploads"
+
+
+def _user_prefix(user_id):
+    return f"{UPLOAD_PREFIX}/{user_id}/"
+
+
+def _bucket_key(storage, name):
+    location = getattr(storage, "location", "")
+    return posixpath.join(location, name) if location else name
+
+
+def upload_target(user, content_type, size):
+    """
+    Where the browser should send one file: {"key", "url", "method", "fields"}.
+    Raises ValueError for a type or size the review form wouldn't accept.
+    """
+    ext = CONTENT_TYPES.get(content_type)
+    if ext is None:
+        raise ValueError("Unsupported file type")
+    if not 0 < size <= MAX_UPLOAD_BYTES:
+        raise ValueError("File is too large")
+    key = f"{_user_prefix(user.id)}{uuid.uuid4().hex}.{ext}"
+
+    if settings.USE_S3:
+        client = default_storage.connection.meta.client
+        post = client.generate_presigned_post(
+            Bucket=default_storage.bucket_name,
+            Key=_bucket_key(default_storage, key),
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, MAX_UPLOAD_BYTES]],
+            ExpiresIn=URL_TTL,
+        )
+        return {"key": key, "url": post["url"], "method": "POST", "fields": post["fields"]}
+
+    token = signing.dumps({"key": key, "size": size}, salt=_SALT)
+    return {
+        "key": key,
+        "url": reverse("places:photo_upload_local", args=[token]),
+        "method": "PUT",
+        "fields": {},
+    }
+
+
+def load_local_token(token):
+    """(key, size) from a local upload token; raises signing.BadSignature if invalid/expired."""
+    data = signing.loads(token, salt=_SALT, max_age=URL_TTL)
+    return data["key"], data["size"]
+
+
+def confirm(user, key):
+    """Check an uploaded key before attaching it to a review. Raises ValueError if unusable."""
+    if not key.startswith(_user_prefix(user.id)) or posixpath.normpath(key) != key:
+        raise ValueError("Unknown upload")
+    if posixpath.splitext(key)[1].lstrip(".") not in CONTENT_TYPES.values():
+        raise ValueError("Unsupported file type")
+    try:
+        size = default_storage.size(key)
+    except (OSError, ClientError):
+        # Missing objects: FileNotFoundError locally, a 404 ClientError on S3.
+        raise ValueError("Upload not found") from None
+    if not 0 < size <= MAX_UPLOAD_BYTES:
+        raise ValueError("File is too large")
+    # A pending photo still has the key as its image; once processed it is the blob's
+    # file (the photo's image is blank in between).
+    if Photo.objects.filter(image=key).exists() or PhotoBlob.objects.filter(image=key).exists():
+        raise ValueError("Upload already attached")
+    return key
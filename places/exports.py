@@ -0,0 +1,129 @@
+"""
+Streaming CSV / JSON Lines exports of the main tables, for backups and analytics.
+
+Each dataset is a fixed list of columns read with `values_list(...).iterator()`, which
+uses a server-side cursor on Postgres (and fetches CHUNK_SIZE rows at a time on
+SQLite), so memory stays flat however big the table. Related names (a review's author
+and restaurant) are joined in the same query rather than looked up per row.
+
+`export()` yields encoded bytes: rows are rendered in groups of CHUNK_SIZE and
+optionally gzipped on the fly. The `export_data` command writes that to files and the
+staff-only `places:export` view streams it as a download, so both produce the same
+bytes.
+"""
+import csv
+import io
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from social.models import Activity
+
+from .models import List, Pin, Restaurant, Review
+
+CHUNK_SIZE = 2000
+FORMATS = ("csv", "jsonl")
+
+# dataset -> (model, columns); a column is a field path, or (header, field path).
+DATASETS = {
+    "restaurants": (
+        Restaurant,
+        [
+            "id", "name", "address", "city", "country", "cuisine", "category", "price",
+            "opening_hours", "website", "lat", "lng", "external_id",
+        ],
+    ),
+    "reviews": (
+        Review,
+        [
+            "id", "user_id", ("username", "user__username"), "restaurant_id",
+            ("restaurant", "restaurant__name"), "overall_rating", "would_go_again", "food",
+            "service", "value", "atmosphere", "text", "created_at",
+        ],
+    ),
+    "lists": (
+        List,
+        ["id", "owner_id", ("owner", "owner__username"), "title", "kind", "is_public", "rank"],
+    ),
+    "pins": (
+        Pin,
+        ["id", "user_id", "restaurant_id", "list_id", "note", "rating", "rank", "created_at"],
+    ),
+    "activities": (
+        Activity,
+        ["id", "type", "user_id", "restaurant_id", "review_id", "created_at"],
+    ),
+}
+
+
+def _columns(dataset):
+    model, columns = DATASETS[dataset]
+    headers = [column[0] if isinstance(column, tuple) else column for column in columns]
+    paths = [column[1] if isinstance(column, tuple) else column for column in columns]
+    return model, headers, paths
+
+
+def rows(dataset, chunk_size=CHUNK_SIZE):
+    """(headers, iterator of value tuples) for one dataset, in primary key order."""
+    model, headers, paths = _columns(dataset)
+    queryset = model.objects.order_by("pk").values_list(*paths)
+    return headers, queryset.iterator(chunk_size=chunk_size)
+
+
+def _chunks(iterator, size):
+    chunk = []
+    for item in iterator:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _csv_text(headers, values, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for chunk in _chunks(values, chunk_size):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _jsonl_text(headers, values, chunk_size):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for chunk in _chunks(values, chunk_size):
+        yield "".join(encoder.encode(dict(zip(headers, row))) + "\n" for row in chunk)
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(dataset, fmt="csv", compress=False, chunk_size=CHUNK_SIZE):
+    """Yield the encoded export of `dataset` as bytes. KeyError/ValueError for bad names."""
+    if dataset not in DATASETS:
+        raise KeyError(dataset)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    headers, values = rows(dataset, chunk_size)
+    render = _csv_text if fmt == "csv" else _jsonl_text
+    chunks = (text.encode("utf-8") for text in render(headers, values, chunk_size))
+    return _gzip(chunks) if compress else chunks
+
+
+def filename(dataset, fmt="csv", compress=False):
+    return f"{dataset}.{fmt}{'.gz' if compress else ''}"
+
+
+def content_type(fmt):
+    return "text/csv" if fmt == "csv" else "application/x-ndjson"
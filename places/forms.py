@@ -1,7 +1,9 @@
 from django import forms
 from django.core.validators import FileExtensionValidator
+from django.utils.functional import cached_property
 
-from .models import Restaurant, Review
+from . import direct_uploads
+from .models import HistoryImport, Restaurant, Review
 
 
 class MultipleFileInput(forms.ClearableFileInput):
@@ -22,6 +24,39 @@ class MultipleFileField(forms.FileField):
         return result
 
 
+class UploadKeysField(forms.Field):
+    """Storage keys of photos the browser uploaded directly (see places/direct_uploads.py)."""
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        return [key for key in (value or []) if key]
+
+
+class SelectedRestaurantsOnlyMixin:
+    """
+    Render <option>s only for the currently selected restaurants instead of the
+    whole table; everything else is found through the autocomplete endpoint.
+    Validation is unaffected: the model choice field only looks up submitted ids.
+    """
+    empty_label = "Select a restaurant..."
+
+    def optgroups(self, name, value, attrs=None):
+        ids = [v for v in value if str(v).isdigit()]
+        choices = [] if self.allow_multiple_selected else [("", self.empty_label)]
+        if ids:
+            choices += Restaurant.objects.filter(pk__in=ids).values_list("pk", "name")
+        self.choices = choices
+        return super().optgroups(name, value, attrs)
+
+
+class RestaurantAutocompleteSelect(SelectedRestaurantsOnlyMixin, forms.Select):
+    pass
+
+
+class RestaurantAutocompleteSelectMultiple(SelectedRestaurantsOnlyMixin, forms.SelectMultiple):
+    pass
+
+
 class EmojiRadioSelect(forms.RadioSelect):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -48,6 +83,8 @@ class ReviewForm(forms.ModelForm):
         help_text="Upload photos of your meal or the restaurant (optional)"
     )
 
+    photo_keys = UploadKeysField(required=False)
+
     would_go_again = forms.ChoiceField(
         choices=[(True, 'Yes'), (False, 'No')],
         widget=forms.RadioSelect(attrs={'class': 'flex gap-4'}),
@@ -59,7 +96,7 @@ class ReviewForm(forms.ModelForm):
         model = Review
         fields = ["restaurant", "overall_rating", "would_go_again", "food", "service", "value", "atmosphere", "text"]
         widgets = {
-            "restaurant": forms.Select(attrs={"class": "w-full border rounded-xl px-3 py-2"}),
+            "restaurant": RestaurantAutocompleteSelect(attrs={"class": "w-full border rounded-xl px-3 py-2"}),
             "overall_rating": forms.Select(attrs={"class": "w-full border rounded-xl px-3 py-2"}),
             "food": forms.Select(attrs={"class": "w-full border rounded-xl px-3 py-2"}),
             "service": forms.Select(attrs={"class": "w-full border rounded-xl px-3 py-2"}),
@@ -69,20 +106,37 @@ class ReviewForm(forms.ModelForm):
         }
 
     def __init__(self, *args, **kwargs):
-        user = kwargs.pop("user", None)  # future: personalize options
+        self.user = kwargs.pop("user", None)
         super().__init__(*args, **kwargs)
         # Optional fields
         for name in ["food", "service", "value", "atmosphere"]:
             self.fields[name].required = False
             self.fields[name].empty_label = "— (optional)"
-        # Nice ordering for restaurants
-        self.fields["restaurant"].queryset = Restaurant.objects.all().order_by("name")
+        # Only submitted ids are looked up; the widget renders just the selection
+        self.fields["restaurant"].queryset = Restaurant.objects.all()
 
         # Convert boolean values to strings for the form
         if self.instance and self.instance.pk:
             if hasattr(self.instance, 'would_go_again'):
                 self.fields['would_go_again'].initial = str(self.instance.would_go_again)
 
+    @cached_property
+    def selected_restaurant(self):
+        """The restaurant currently chosen in the form (bound or initial), if any."""
+        value = self["restaurant"].value()
+        if not str(value or "").isdigit():
+            return None
+        return Restaurant.objects.filter(pk=value).first()
+
+    def clean_photo_keys(self):
+        keys = self.cleaned_data.get("photo_keys") or []
+        try:
+            return [direct_uploads.confirm(self.user, key) for key in keys]
+        except ValueError as exc:
+            # Reported on the file input, which is what the user sees.
+            self.add_error("photos", f"Photo upload failed: {exc}. Please attach it again.")
+            return []
+
     def clean_would_go_again(self):
         value = self.cleaned_data.get('would_go_again')
         if value == 'True':
@@ -90,3 +144,19 @@ class ReviewForm(forms.ModelForm):
         elif value == 'False':
             return False
         return value
+
+
+class HistoryImportForm(forms.ModelForm):
+    """Upload of a review/saved-place history file; see places/history_import.py."""
+    MAX_BYTES = 5 * 1024 * 1024
+
+    class Meta:
+        model = HistoryImport
+        fields = ["file", "post_activity"]
+        labels = {"post_activity": "Post imported reviews to my friends' feeds"}
+
+    def clean_file(self):
+        file = self.cleaned_data["file"]
+        if file.size > self.MAX_BYTES:
+            raise forms.ValidationError("Files can be at most 5 MB.")
+        return file
@@ -0,0 +1,113 @@
+"""
+"Your friends rated this" summaries for restaurant cards and detail pages.
+
+For a viewer and a page of restaurants, one windowed query over the viewer's friends'
+reviews returns the review count, the average rating and the top few reviewers per
+restaurant. Results are cached per viewer and per restaurant under a per-viewer
+generation; bumping the generation (when a friend writes a review or the friend set
+changes) invalidates everything cached for that viewer at once.
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Window
+from django.db.models.functions import RowNumber
+
+from social.friendships import get_friend_ids
+
+from .models import Review
+
+FRIEND_RATINGS_TTL = 60 * 60
+TOP_REVIEWERS = 3
+
+
+def _generation_key(viewer_id):
+    return f"places:friend_ratings:gen:{viewer_id}"
+
+
+def _entry_key(viewer_id, generation, restaurant_id):
+    return f"places:friend_ratings:{viewer_id}:{generation}:{restaurant_id}"
+
+
+def _generation(viewer_id):
+    # Seeded from the clock so an evicted generation never resurrects old entries.
+    return cache.get_or_set(_generation_key(viewer_id), time.time_ns, None)
+
+
+def invalidate_friend_ratings(viewer_ids):
+    """Drop every cached summary for the given viewers."""
+    now = time.time_ns()
+    cache.set_many({_generation_key(vid): now for vid in viewer_ids}, None)
+
+
+def _compute(friend_ids, restaurant_ids):
+    summaries = {
+        rid: {"count": 0, "avg": None, "reviewers": []} for rid in restaurant_ids
+    }
+    if not friend_ids or not restaurant_ids:
+        return summaries
+
+    partition = [F("restaurant_id")]
+    rows = (
+        Review.objects.filter(user_id__in=friend_ids, restaurant_id__in=restaurant_ids)
+        .order_by()
+        .annotate(
+            friend_count=Window(Count("id"), partition_by=partition),
+            friend_avg=Window(Avg("overall_rating"), partition_by=partition),
+            rank=Window(
+                RowNumber(),
+                partition_by=partition,
+                order_by=[F("overall_rating").desc(), F("created_at").desc()],
+            ),
+        )
+        .filter(rank__lte=TOP_REVIEWERS)
+        .values_list(
+            "restaurant_id",
+            "friend_count",
+            "friend_avg",
+            "user__username",
+            "user__profile__display_name",
+        )
+    )
+    for rid, count, avg, username, display_name in rows:
+        summary = summaries[rid]
+        summary["count"] = count
+        summary["avg"] = round(avg, 1)
+        summary["reviewers"].append(display_name or username)
+    return summaries
+
+
+def get_friend_ratings(viewer, restaurant_ids):
+    """
+    Return {restaurant_id: {"count", "avg", "reviewers"}} for restaurants at least one
+    of the viewer's friends has reviewed. Cache misses are filled with one query.
+    """
+    if not viewer.is_authenticated:
+        return {}
+    restaurant_ids = list(dict.fromkeys(restaurant_ids))
+    if not restaurant_ids:
+        return {}
+
+    generation = _generation(viewer.id)
+    keys = {_entry_key(viewer.id, generation, rid): rid for rid in restaurant_ids}
+    cached = cache.get_many(keys)
+    summaries = {keys[key]: value for key, value in cached.items()}
+
+    missing = [rid for rid in restaurant_ids if rid not in summaries]
+    if missing:
+        fresh = _compute(get_friend_ids(viewer.id), missing)
+        cache.set_many(
+            {_entry_key(viewer.id, generation, rid): s for rid, s in fresh.items()},
+            FRIEND_RATINGS_TTL,
+        )
+        summaries.update(fresh)
+
+    return {rid: s for rid, s in summaries.items() if s["count"]}
+
+
+def annotate_friend_ratings(viewer, restaurants):
+    """Attach `friend_rating` (or None) to each restaurant in a page of cards."""
+    ratings = get_friend_ratings(viewer, [r.id for r in restaurants])
+    for r in restaurants:
+        r.friend_rating = ratings.get(r.id)
+    return restaurants
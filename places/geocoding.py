@@ -0,0 +1,236 @@
+"""
+Address geocoding for restaurant imports.
+
+`Geocoder.geocode_many` resolves a batch of addresses:
+
+- results (including "no match") are kept in an on-disk SQLite cache keyed by the
+  normalized address, so re-running an import only asks the API about new addresses;
+- cache misses are fetched by a bounded thread pool sharing one pooled HTTP session;
+- a token bucket caps the request rate across all threads;
+- network errors, 5xx/429 responses and OVER_QUERY_LIMIT are retried with exponential
+  backoff and jitter. Other failures are reported and not cached.
+
+`geocode_rows` is the import stage: it fills in lat/lng for rows that have an address
+but no coordinates, a chunk of rows at a time so the pool stays busy while the import
+streams.
+
+Providers turn one address into coordinates. `GoogleProvider` speaks the Geocoding
+API at settings.GEOCODING_URL, so pointing that at a local stub server exercises the
+whole pipeline offline; any object with a `geocode(session, address)` method works.
+"""
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+REQUEST_TIMEOUT = 10
+CHUNK_SIZE = 500
+
+
+class GeocodingError(Exception):
+    """A lookup that failed; `retry` says whether trying again could help."""
+
+    def __init__(self, message, retry=True):
+        super().__init__(message)
+        self.retry = retry
+
+
+def normalize(address):
+    """Cache key for an address: case, punctuation and spacing don't matter."""
+    address = unicodedata.normalize("NFKC", address).casefold()
+    return " ".join(re.sub(r"[^\w\s]", " ", address).split())
+
+
+class GoogleProvider:
+    def __init__(self, api_key, url=GOOGLE_URL):
+        self.api_key = api_key
+        self.url = url
+
+    def geocode(self, session, address):
+        """(lat, lng), or None if the address has no match. Raises GeocodingError."""
+        try:
+            response = session.get(
+                self.url, params={"address": address, "key": self.api_key}, timeout=REQUEST_TIMEOUT
+            )
+        except requests.RequestException as exc:
+            raise GeocodingError(str(exc)) from exc
+        if response.status_code == 429 or response.status_code >= 500:
+            raise GeocodingError(f"HTTP {response.status_code}")
+        if response.status_code != 200:
+            raise GeocodingError(f"HTTP {response.status_code}", retry=False)
+
+        try:
+            data = response.json()
+        except ValueError as exc:
+            # An HTML error page from a proxy or load balancer; usually transient.
+            raise GeocodingError("Response is not JSON") from exc
+        if not isinstance(data, dict):
+            raise GeocodingError("Unexpected response", retry=False)
+        status = data.get("status")
+        if status == "OK" and data.get("results"):
+            location = data["results"][0]["geometry"]["location"]
+            return location["lat"], location["lng"]
+        if status == "ZERO_RESULTS":
+            return None
+        message = f"{status}: {data.get('error_message', '')}".rstrip(": ")
+        raise GeocodingError(message, retry=status in ("OVER_QUERY_LIMIT", "UNKNOWN_ERROR"))
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, in bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class GeocodeCache:
+    """normalized address -> (lat, lng) or None, in a SQLite file shared by every import."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS geocodes (address TEXT PRIMARY KEY, lat REAL, lng REAL)"
+            )
+
+    def get_many(self, keys):
+        """Cached entries among `keys`; keys never looked up are absent."""
+        keys = list(keys)
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self.db.execute(
+                    f"SELECT address, lat, lng FROM geocodes WHERE address IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for key, lat, lng in rows:
+                    found[key] = (lat, lng) if lat is not None else None
+        return found
+
+    def put_many(self, results):
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO geocodes (address, lat, lng) VALUES (?, ?, ?)",
+                [(key, *(coords or (None, None))) for key, coords in results.items()],
+            )
+
+    def close(self):
+        self.db.close()
+
+
+class Geocoder:
+    def __init__(self, provider, cache=None, workers=8, rate=25, retries=4, backoff=0.5):
+        self.provider = provider
+        self.cache = cache
+        self.retries = retries
+        self.backoff = backoff
+        self.bucket = TokenBucket(rate)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="geocode")
+        self.stats = {"cached": 0, "fetched": 0, "failed": 0}
+
+    def _fetch(self, address):
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            try:
+                return self.provider.geocode(self.session, address)
+            except GeocodingError as exc:
+                if not exc.retry or attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt * (0.5 + random.random()))
+
+    def geocode_many(self, addresses):
+        """{address: (lat, lng) or None} for the distinct `addresses`."""
+        keys = {address: normalize(address) for address in set(addresses)}
+        results = self.cache.get_many(set(keys.values())) if self.cache else {}
+        self.stats["cached"] += sum(1 for key in keys.values() if key in results)
+
+        # One request per distinct key, however many spellings of it were passed.
+        todo = {key: address for address, key in keys.items() if key not in results}
+        futures = {self.pool.submit(self._fetch, address): key for key, address in todo.items()}
+        fetched = {}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                fetched[key] = future.result()
+            except GeocodingError as exc:
+                self.stats["failed"] += 1
+                logger.warning("Geocoding failed for %r: %s", todo[key], exc)
+        self.stats["fetched"] += len(fetched)
+        if self.cache and fetched:
+            self.cache.put_many(fetched)
+
+        results.update(fetched)
+        return {address: results.get(key) for address, key in keys.items()}
+
+    def close(self):
+        self.pool.shutdown()
+        self.session.close()
+        if self.cache:
+            self.cache.close()
+
+
+def default_geocoder():
+    """Geocoder configured from settings, or None if it would need a missing API key."""
+    api_key = os.getenv("GOOGLE_MAPS_API_KEY", "")
+    if not api_key and settings.GEOCODING_URL == GOOGLE_URL:
+        return None
+    return Geocoder(
+        GoogleProvider(api_key, settings.GEOCODING_URL),
+        cache=GeocodeCache(settings.GEOCODING_CACHE_PATH),
+        workers=settings.GEOCODING_WORKERS,
+        rate=settings.GEOCODING_RATE,
+    )
+
+
+def geocode_rows(rows, geocoder, chunk_size=CHUNK_SIZE, on_result=None):
+    """
+    Yield import rows with lat/lng filled in from their address where missing.
+    `on_result(row, coords)` is called for every row that needed geocoding.
+    """
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        needed = [row for row in chunk if row.get("address") and row.get("lat") is None]
+        found = geocoder.geocode_many(row["address"] for row in needed)
+        for row in needed:
+            coords = found[row["address"]]
+            if coords:
+                row["lat"], row["lng"] = coords
+            if on_result:
+                on_result(row, coords)
+        yield from chunk
@@ -0,0 +1,335 @@
+"""
+Bulk import of a user's history from another app: reviews, saved places and visits.
+
+Saving reviews one by one runs every Review receiver per row (visited pin, feed
+activity, leaderboard, profile stats, caches), which is slow for hundreds of reviews and
+posts them all to friends' feeds at once. `import_history` instead writes everything in
+one transaction with set-based statements and then applies, once, what the receivers
+would have done, so the end state matches saving each review through save_review:
+
+- restaurants are matched by name with the catalog import's normalisation
+  (`Restaurant.name_key`), looking up only the names in the file; uploads never add to
+  the shared catalog, so rows naming a place it doesn't have are counted as unmatched;
+- new reviews go in with one bulk INSERT; places the user has already reviewed keep
+  their review;
+- each reviewed place ends up in the user's Visited list, moving an existing pin there
+  like reviews.ensure_visited_pin; visits and saves are added with
+  bulk_lists.add_to_lists (saves to the Saved list or a named list);
+- feed activities are bulk-inserted unless the user opted out of posting them;
+- leaderboards, profile stats and the user's cached memberships and friends' ratings
+  are updated with batch calls.
+
+Uploads are imported by a per-process worker pool (like places/photo_jobs.py) after
+the `HistoryImport` row commits. The import is idempotent, so
+`manage.py process_history_imports` can safely rerun jobs a restart interrupted.
+"""
+import gzip
+import io
+import logging
+import threading
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from social import stats
+from social.friendships import get_friend_ids
+from social.models import Activity
+
+from . import bulk_lists, leaderboards, restaurant_import
+from .dedup import name_key
+from .friend_ratings import invalidate_friend_ratings
+from .memberships import invalidate_memberships
+from .models import HistoryImport, List, Pin, Restaurant, Review
+from .system_lists import ensure_system_lists
+
+logger = logging.getLogger(__name__)
+
+REVIEW = "review"
+SAVE = "save"
+VISIT = "visited"
+BATCH_SIZE = 500
+# Upper bound on records per upload; everything is written in one transaction.
+MAX_RECORDS = 5000
+SUB_RATINGS = ("food", "service", "value", "atmosphere")
+
+Entry = namedtuple("Entry", ["kind", "name_key", "review", "list_title"])
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _rating(value, required=False):
+    if value is None or str(value).strip() == "":
+        if required:
+            raise ValueError("missing rating")
+        return None
+    rating = round(float(value))
+    if not 1 <= rating <= 5:
+        raise ValueError(f"rating out of range: {value}")
+    return rating
+
+
+def _flag(value, default=True):
+    if value is None or str(value).strip() == "":
+        return default
+    return str(value).strip().lower() in {"1", "true", "yes", "y"}
+
+
+def parse_record(record):
+    """
+    One history entry from a file record: the restaurant's `name`, a `type` (review,
+    save or visited; default review when there's a rating), `rating`/sub-ratings/
+    `text`/`would_go_again` for reviews and an optional `list` title for saves.
+    Raises ValueError if unusable.
+    """
+    key = name_key(str(record.get("name") or ""))
+    if not key:
+        raise ValueError("missing restaurant name")
+    rating = record.get("overall_rating", record.get("rating"))
+    kind = str(record.get("type") or "").strip().lower() or (REVIEW if rating not in (None, "") else SAVE)
+
+    review = None
+    if kind == REVIEW:
+        review = {
+            "overall_rating": _rating(rating, required=True),
+            **{field: _rating(record.get(field)) for field in SUB_RATINGS},
+            "would_go_again": _flag(record.get("would_go_again")),
+            "text": str(record.get("text") or "").strip(),
+        }
+    elif kind not in (SAVE, VISIT):
+        raise ValueError(f"unknown type: {kind}")
+    return Entry(kind, key, review, str(record.get("list") or "").strip())
+
+
+def _match_restaurants(keys):
+    # name key -> restaurant id for the catalog places named; duplicate names match the
+    # oldest row, as in the catalog import.
+    keys = list(keys)
+    matched = {}
+    for start in range(0, len(keys), BATCH_SIZE):
+        rows = (
+            Restaurant.objects.filter(name_key__in=keys[start:start + BATCH_SIZE])
+            .order_by("-pk")
+            .values_list("name_key", "pk")
+        )
+        matched.update(rows)
+    return matched
+
+
+def _list_ids(user, titles):
+    ids = dict(List.objects.filter(owner=user, title__in=titles).values_list("title", "pk"))
+    for title in titles:
+        if title not in ids:
+            # Few per import; the ORM save ranks the new list after the user's others.
+            ids[title] = List.objects.create(owner=user, title=title).pk
+    return ids
+
+
+def _visited_pins(user, restaurant_ids, visited_id):
+    """
+    Put reviewed places in the Visited list like reviews.ensure_visited_pin: the oldest
+    existing pin moves there, otherwise a new pin is added. Returns (moved, created).
+    """
+    pins = defaultdict(list)
+    for pk, restaurant_id, list_id in (
+        Pin.objects.filter(user=user, restaurant_id__in=restaurant_ids)
+        .order_by("pk")
+        .values_list("pk", "restaurant_id", "list_id")
+    ):
+        pins[restaurant_id].append((pk, list_id))
+
+    move, create = [], []
+    for restaurant_id in restaurant_ids:
+        existing = pins[restaurant_id]
+        if any(list_id == visited_id for _pk, list_id in existing):
+            continue
+        if existing:
+            move.append(existing[0][0])
+        else:
+            create.append(restaurant_id)
+    bulk_lists.assign_to_list(move, visited_id)
+    created = bulk_lists.add_to_lists(user, [visited_id], create) if create else 0
+    return len(move), created
+
+
+def import_history(user, records, post_activity=True):
+    """
+    Import `records` (dicts, see parse_record) into `user`'s reviews and lists in one
+    transaction. Returns counts of what was written.
+    """
+    counts = dict.fromkeys(
+        (
+            "reviews", "reviews_existing", "visited", "saved", "pins_moved",
+            "activities", "unmatched", "invalid",
+        ),
+        0,
+    )
+    entries = []
+    for record in records:
+        try:
+            entries.append(parse_record(record))
+        except ValueError:
+            counts["invalid"] += 1
+    if not entries:
+        return counts
+
+    restaurant_ids = _match_restaurants({entry.name_key for entry in entries})
+    matched = [entry for entry in entries if entry.name_key in restaurant_ids]
+    counts["unmatched"] = len(entries) - len(matched)
+    entries = matched
+    if not entries:
+        return counts
+
+    with transaction.atomic():
+        system_lists = ensure_system_lists(user.id)
+        visited_id = system_lists[List.VISITED]
+
+        # Reviews: the last entry for a place wins; places already reviewed are left alone.
+        reviews = {}
+        visits, saves = [], defaultdict(list)
+        for entry in entries:
+            restaurant_id = restaurant_ids[entry.name_key]
+            if entry.kind == REVIEW:
+                reviews[restaurant_id] = entry.review
+            elif entry.kind == VISIT:
+                visits.append(restaurant_id)
+            else:
+                saves[entry.list_title].append(restaurant_id)
+
+        existing = set(
+            Review.objects.filter(user=user, restaurant_id__in=reviews).values_list("restaurant_id", flat=True)
+        )
+        new_reviews = [
+            Review(user=user, restaurant_id=restaurant_id, **values)
+            for restaurant_id, values in reviews.items()
+            if restaurant_id not in existing
+        ]
+        Review.objects.bulk_create(new_reviews, batch_size=BATCH_SIZE)
+        counts["reviews"], counts["reviews_existing"] = len(new_reviews), len(existing)
+
+        reviewed_ids = [review.restaurant_id for review in new_reviews]
+        counts["pins_moved"], counts["visited"] = _visited_pins(user, reviewed_ids, visited_id)
+        if visits:
+            counts["visited"] += bulk_lists.add_to_lists(user, [visited_id], list(dict.fromkeys(visits)))
+        list_ids = _list_ids(user, [title for title in saves if title])
+        for title, ids in saves.items():
+            list_id = list_ids[title] if title else system_lists[List.SAVED]
+            counts["saved"] += bulk_lists.add_to_lists(user, [list_id], list(dict.fromkeys(ids)))
+
+        if post_activity:
+            Activity.objects.bulk_create(
+                [
+                    Activity(type="review", user=user, restaurant_id=review.restaurant_id, review=review)
+                    for review in new_reviews
+                ],
+                batch_size=BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+            # ignore_conflicts hides skipped rows; the reviews are new, so count what's there.
+            review_ids = [review.pk for review in new_reviews]
+            counts["activities"] = sum(
+                Activity.objects.filter(type="review", review_id__in=review_ids[start:start + BATCH_SIZE]).count()
+                for start in range(0, len(review_ids), BATCH_SIZE)
+            )
+
+        # What the Review receivers would have done, once for the whole import. (Pins went
+        # through bulk_lists, which handles theirs; the moves are covered by recompute.)
+        leaderboards.record_events(
+            [(review.restaurant_id, review.created_at) for review in new_reviews], leaderboards.REVIEW_WEIGHT
+        )
+        leaderboards.refresh_ratings(reviewed_ids)
+        stats.recompute(user_ids=[user.id])
+        friend_ids = get_friend_ids(user.id)
+        transaction.on_commit(lambda: invalidate_memberships(user.id))
+        transaction.on_commit(lambda: invalidate_friend_ratings(friend_ids))
+    return counts
+
+
+# -------------------
+# BACKGROUND JOBS
+# -------------------
+
+def read_upload(field_file):
+    """Records of an uploaded CSV / JSON Lines file (optionally .gz), read incrementally."""
+    name = field_file.name
+    with field_file.open("rb") as raw:
+        binary = gzip.GzipFile(fileobj=raw) if name.endswith(".gz") else raw
+        text = io.TextIOWrapper(binary, encoding="utf-8", newline="")
+        yield from restaurant_import.read_records(text, restaurant_import.guess_format(name))
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.HISTORY_IMPORT_WORKERS, thread_name_prefix="history-import"
+            )
+    return _executor
+
+
+def run(import_id, stale_after=None):
+    """
+    Run one HistoryImport if it's pending. With `stale_after` (a timedelta), only if it
+    was queued or started at least that long ago, i.e. a restart dropped it. Returns its
+    final status, or None if it wasn't claimed (or another worker reclaimed it).
+    """
+    claimable = HistoryImport.objects.filter(pk=import_id, status=HistoryImport.PENDING)
+    if stale_after is not None:
+        cutoff = timezone.now() - stale_after
+        claimable = HistoryImport.objects.filter(
+            Q(status=HistoryImport.PENDING, created_at__lte=cutoff)
+            | Q(status=HistoryImport.RUNNING, started_at__lte=cutoff),
+            pk=import_id,
+        )
+    # The conditional UPDATE is the claim: two workers can't both run an import.
+    started_at = timezone.now()
+    if not claimable.update(status=HistoryImport.RUNNING, started_at=started_at):
+        return None
+    # Final writes only land while this worker's claim stands.
+    mine = HistoryImport.objects.filter(pk=import_id, status=HistoryImport.RUNNING, started_at=started_at)
+
+    try:
+        with transaction.atomic():
+            # Locked until the import commits together with its DONE status, so the stale
+            # job sweep can't reclaim an import that is merely slow.
+            job = HistoryImport.objects.select_for_update(of=("self",)).select_related("user").get(pk=import_id)
+            records = list(islice(read_upload(job.file), MAX_RECORDS + 1))
+            if len(records) > MAX_RECORDS:
+                raise ValueError(f"Too many records: at most {MAX_RECORDS:,} per import")
+            counts = import_history(job.user, records, post_activity=job.post_activity)
+            done = mine.update(status=HistoryImport.DONE, counts=counts, error="", finished_at=timezone.now())
+            if not done:
+                # Reclaimed before the lock was taken: the other worker's run counts.
+                transaction.set_rollback(True)
+    except Exception as exc:
+        logger.exception("History import %s failed", import_id)
+        if mine.update(status=HistoryImport.FAILED, error=str(exc), finished_at=timezone.now()):
+            return HistoryImport.FAILED
+        return None
+    return HistoryImport.DONE if done else None
+
+
+def _run(import_id):
+    close_old_connections()
+    try:
+        return run(import_id)
+    finally:
+        close_old_connections()
+
+
+def enqueue(import_id):
+    """Run the import once the current transaction commits."""
+
+    def submit():
+        if settings.HISTORY_IMPORT_WORKERS:
+            _pool().submit(_run, import_id)
+        else:
+            run(import_id)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,144 @@
+"""
+Sized, re-encoded variants of uploaded images (review photos and avatars).
+
+Uploads are often 5-12 MB phone photos, but a feed thumbnail or a 32px avatar needs a
+few kilobytes. `process_photo` / `process_avatar` render each configured width as WebP
+(and AVIF when Pillow was built with it), save the files next to the original and
+record their storage names and sizes in the model's `variants` JSON:
+
+    {"thumb": {"width": 320, "height": 240, "webp": "<name>", "avif": "<name>"}, ...}
+
+Variants are written without metadata, and an original carrying EXIF (GPS position,
+camera serial...) is re-saved without it, after applying its orientation tag so
+nothing comes out sideways. Photos also get a `placeholder`: a blurry 16px preview
+inlined in the page while the real image loads. Templates pick variants with the
+`responsive_images` tags; rows without variants fall back to the original.
+"""
+import base64
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+# Variant name -> maximum width in pixels. Images are never scaled up.
+PHOTO_VARIANTS = {"thumb": 320, "card": 800, "full": 1600}
+AVATAR_VARIANTS = {"thumb": 96, "card": 320}
+
+FORMATS = ["avif", "webp"] if features.check("avif") else ["webp"]
+SAVE_OPTIONS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "avif": {"format": "AVIF", "quality": 55},
+}
+# Longest side of the inline blurred preview shown while a photo loads.
+PLACEHOLDER_SIZE = 16
+# Formats whose originals are re-saved in place when they carry EXIF.
+STRIP_OPTIONS = {
+    "JPEG": {"quality": 92, "optimize": True},
+    "PNG": {"optimize": True},
+    "WEBP": {"quality": 90},
+}
+
+
+def _open(field_file):
+    field_file.open("rb")
+    try:
+        image = Image.open(field_file)
+        image.load()
+    finally:
+        field_file.close()
+    return image
+
+
+def _flatten(image):
+    # WebP/AVIF take RGB(A); palette and CMYK uploads are converted once up front.
+    if image.mode in ("RGB", "RGBA"):
+        return image
+    has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+    return image.convert("RGBA" if has_alpha else "RGB")
+
+
+def _encode(image, fmt, **extra):
+    buf = BytesIO()
+    image.save(buf, **{**SAVE_OPTIONS.get(fmt, {}), **extra})
+    return ContentFile(buf.getvalue())
+
+
+def strip_metadata(field_file, image=None):
+    """
+    Re-save the original without EXIF if it has any. Returns the (oriented) image.
+    The field gets a new storage name; the old file is deleted.
+    """
+    image = image or _open(field_file)
+    fmt = image.format
+    if fmt not in STRIP_OPTIONS or not image.getexif():
+        return ImageOps.exif_transpose(image)
+    oriented = ImageOps.exif_transpose(image)
+    buf = BytesIO()
+    extra = {"icc_profile": image.info["icc_profile"]} if image.info.get("icc_profile") else {}
+    oriented.save(buf, format=fmt, **STRIP_OPTIONS[fmt], **extra)
+    old_name = field_file.name
+    field_file.save(os.path.basename(old_name), ContentFile(buf.getvalue()), save=False)
+    field_file.storage.delete(old_name)
+    return oriented
+
+
+def make_variants(field_file, widths, image=None):
+    """Render every width in `widths` (name -> px) and save them; returns the variants map."""
+    image = _flatten(image or ImageOps.exif_transpose(_open(field_file)))
+    storage = field_file.storage
+    root, _ext = os.path.splitext(field_file.name)
+    variants = {}
+    for name, width in sorted(widths.items(), key=lambda item: item[1]):
+        resized = image
+        if image.width > width:
+            resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        entry = {"width": resized.width, "height": resized.height}
+        for fmt in FORMATS:
+            entry[fmt] = storage.save(f"{root}.{name}.{fmt}", _encode(resized, fmt))
+        variants[name] = entry
+    return variants
+
+
+def make_placeholder(image):
+    """
+    A tiny WebP of the image as a data: URI (typically 150-300 bytes), inlined as the
+    <img> background so the photo's colours show before the real file arrives.
+    """
+    small = _flatten(image).copy()
+    small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    data = _encode(small, "webp", quality=40).read()
+    return "data:image/webp;base64," + base64.b64encode(data).decode("ascii")
+
+
+def delete_variants(storage, variants):
+    for entry in (variants or {}).values():
+        for key, name in entry.items():
+            if key not in ("width", "height") and name:
+                storage.delete(name)
+
+
+def _process(instance, field_name, variants_field, widths, placeholder_field=None):
+    field_file = getattr(instance, field_name)
+    delete_variants(field_file.storage, getattr(instance, variants_field))
+    if not field_file:
+        # Image cleared: drop its old variants too.
+        setattr(instance, variants_field, {})
+        instance.save(update_fields=[variants_field])
+        return
+    image = strip_metadata(field_file)
+    setattr(instance, variants_field, make_variants(field_file, widths, image=image))
+    update_fields = [field_name, variants_field]
+    if placeholder_field:
+        setattr(instance, placeholder_field, make_placeholder(image))
+        update_fields.append(placeholder_field)
+    instance.save(update_fields=update_fields)
+
+
+def process_photo(photo):
+    """Variants and placeholder for a Photo or PhotoBlob."""
+    _process(photo, "image", "variants", PHOTO_VARIANTS, placeholder_field="placeholder")
+
+
+def process_avatar(profile):
+    _process(profile, "avatar", "avatar_variants", AVATAR_VARIANTS)
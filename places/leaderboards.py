@@ -0,0 +1,327 @@
+"""
+Trending and top-rated leaderboards.
+
+Every review, pin and like adds `weight * exp(DECAY * (t - SCORE_EPOCH))` to the
+restaurant's `RestaurantScore.trending`. Dividing by exp(DECAY * (now - SCORE_EPOCH))
+gives the exponentially decayed score, but because that factor is the same for every
+row, ranking by the stored column already ranks by decayed score. Writes are therefore
+one UPDATE per event, deletes subtract exactly what the event added, and a top-K read
+is an index scan on (city, category, -trending) however many events there have been.
+
+`top_rated` is a Bayesian average (pulled towards PRIOR_RATING until a place has a few
+reviews) recomputed from one restaurant's reviews whenever one of them changes.
+
+`compact()` (run periodically via `manage.py compact_leaderboards`) recomputes scores
+from the source tables, fixing drift from bulk writes that bypassed signals, and drops
+rows that have gone cold.
+
+top_rated is copied onto pins for rating-ordered list pages (see list_pages); only
+restaurants whose score actually moved have their pins rewritten.
+"""
+import math
+from collections import defaultdict
+from datetime import UTC, datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from . import list_pages
+from .models import Pin, Restaurant, RestaurantScore, Review
+
+HALF_LIFE = timedelta(days=7)
+DECAY = math.log(2) / HALF_LIFE.total_seconds()
+# Scores grow by 2x per half-life after the epoch; a float holds ~1000 doublings,
+# i.e. ~19 years with a weekly half-life.
+SCORE_EPOCH = datetime(2025, 1, 1, tzinfo=UTC)
+
+REVIEW_WEIGHT = 3.0
+PIN_WEIGHT = 1.0
+LIKE_WEIGHT = 1.0
+
+PRIOR_RATING = 3.5
+PRIOR_WEIGHT = 5
+
+# Contributions older than this are < 0.1% of a fresh event; compaction ignores them.
+COMPACTION_WINDOW = HALF_LIFE * 10
+COLD_SCORE = 0.01
+
+
+def _growth(at):
+    return math.exp(DECAY * (at - SCORE_EPOCH).total_seconds())
+
+
+def _bayesian(rating_sum, rating_count):
+    return (rating_sum + PRIOR_RATING * PRIOR_WEIGHT) / (rating_count + PRIOR_WEIGHT)
+
+
+def decayed(score, now=None):
+    """Turn a stored `trending` value into the decayed score as of `now`."""
+    return score / _growth(now or timezone.now())
+
+
+def _ensure_row(restaurant_id):
+    r = Restaurant.objects.filter(pk=restaurant_id).values("city", "category").first()
+    if r is None:
+        return False
+    RestaurantScore.objects.bulk_create(
+        [RestaurantScore(restaurant_id=restaurant_id, city=r["city"], category=r["category"])],
+        ignore_conflicts=True,
+    )
+    return True
+
+
+def _update(restaurant_id, create=True, **changes):
+    # Almost always a single UPDATE; the row is created on a restaurant's first event.
+    # Removals never create rows: during a cascade delete the restaurant is going away.
+    if RestaurantScore.objects.filter(pk=restaurant_id).update(**changes):
+        return
+    if create and _ensure_row(restaurant_id):
+        RestaurantScore.objects.filter(pk=restaurant_id).update(**changes)
+
+
+def record_event(restaurant_id, weight, at=None):
+    """Add (or, with a negative weight, remove) one event's trending contribution."""
+    contribution = weight * _growth(at or timezone.now())
+    _update(restaurant_id, create=weight > 0, trending=F("trending") + contribution)
+
+
+def record_events(events, weight, batch_size=500):
+    """
+    Batch form of `record_event` for (restaurant_id, at) pairs: missing rows are created
+    in one INSERT and each batch of restaurants is updated with a single CASE UPDATE.
+    """
+    totals = defaultdict(float)
+    for restaurant_id, at in events:
+        totals[restaurant_id] += weight * _growth(at)
+    if not totals:
+        return
+
+    if weight > 0:
+        existing = set(
+            RestaurantScore.objects.filter(pk__in=totals).values_list("pk", flat=True)
+        )
+        RestaurantScore.objects.bulk_create(
+            [
+                RestaurantScore(restaurant_id=r["id"], city=r["city"], category=r["category"])
+                for r in Restaurant.objects.filter(pk__in=set(totals) - existing)
+                .values("id", "city", "category")
+            ],
+            ignore_conflicts=True,
+        )
+
+    items = list(totals.items())
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        RestaurantScore.objects.filter(pk__in=[rid for rid, _ in batch]).update(
+            trending=F("trending") + Case(
+                *[When(pk=rid, then=Value(contribution)) for rid, contribution in batch],
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+
+
+def refresh_rating(restaurant_id, create=True):
+    """Recompute one restaurant's rating totals and top_rated score."""
+    totals = Review.objects.filter(restaurant_id=restaurant_id).aggregate(
+        rating_sum=Sum("overall_rating"), rating_count=Count("id")
+    )
+    rating_sum = totals["rating_sum"] or 0
+    rating_count = totals["rating_count"]
+    top = _bayesian(rating_sum, rating_count) if rating_count else 0
+    old = RestaurantScore.objects.filter(pk=restaurant_id).values_list("top_rated", flat=True).first()
+    _update(
+        restaurant_id,
+        create=create,
+        rating_sum=rating_sum,
+        rating_count=rating_count,
+        top_rated=top,
+    )
+    if top != (old or 0):
+        list_pages.set_sort_ratings({restaurant_id: top})
+
+
+def review_saved(review, created, old_rating=None, pinned=False):
+    """
+    Apply one review write to its restaurant's score in a single UPDATE: the review's
+    (and, with `pinned`, its new Visited pin's) trending contribution plus the change to
+    the rating totals, with top_rated recomputed from the new totals in SQL. Used by
+    places.reviews.save_review in place of the Review/Pin receivers; a place without a
+    score row yet falls back to record_event and refresh_rating.
+    """
+    restaurant_id = review.restaurant_id
+    weight = (REVIEW_WEIGHT if created else 0) + (PIN_WEIGHT if pinned else 0)
+    rating = int(review.overall_rating)
+    changes = {}
+    if weight:
+        changes["trending"] = F("trending") + weight * _growth(review.created_at)
+    if created or rating != old_rating:
+        rating_sum = F("rating_sum") + (rating - (old_rating or 0))
+        rating_count = F("rating_count") + (1 if created else 0)
+        changes.update(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            top_rated=(Cast(rating_sum, FloatField()) + PRIOR_RATING * PRIOR_WEIGHT)
+            / (Cast(rating_count, FloatField()) + PRIOR_WEIGHT),
+        )
+    if not changes:
+        return
+    if RestaurantScore.objects.filter(pk=restaurant_id).update(**changes):
+        if "top_rated" in changes:
+            list_pages.copy_sort_rating(restaurant_id)
+        return
+    if weight:
+        record_event(restaurant_id, weight, review.created_at)
+    refresh_rating(restaurant_id)
+
+
+def refresh_ratings(restaurant_ids, batch_size=500):
+    """refresh_rating for many restaurants: one grouped aggregate and bulk writes."""
+    restaurant_ids = set(restaurant_ids)
+    if not restaurant_ids:
+        return
+    totals = {
+        row["restaurant_id"]: (row["rating_sum"], row["rating_count"])
+        for row in Review.objects.filter(restaurant_id__in=restaurant_ids)
+        .order_by()
+        .values("restaurant_id")
+        .annotate(rating_sum=Sum("overall_rating"), rating_count=Count("id"))
+    }
+    existing = dict(RestaurantScore.objects.filter(pk__in=restaurant_ids).values_list("pk", "top_rated"))
+    RestaurantScore.objects.bulk_create(
+        [
+            RestaurantScore(restaurant_id=r["id"], city=r["city"], category=r["category"])
+            for r in Restaurant.objects.filter(pk__in=restaurant_ids - existing.keys()).values("id", "city", "category")
+        ],
+        ignore_conflicts=True,
+    )
+    scores = []
+    moved = {}
+    for restaurant_id in restaurant_ids:
+        rating_sum, rating_count = totals.get(restaurant_id, (0, 0))
+        top = _bayesian(rating_sum, rating_count) if rating_count else 0
+        scores.append(
+            RestaurantScore(
+                restaurant_id=restaurant_id,
+                rating_sum=rating_sum,
+                rating_count=rating_count,
+                top_rated=top,
+            )
+        )
+        if top != (existing.get(restaurant_id) or 0):
+            moved[restaurant_id] = top
+    RestaurantScore.objects.bulk_update(
+        scores, ["rating_sum", "rating_count", "top_rated"], batch_size=batch_size
+    )
+    list_pages.set_sort_ratings(moved)
+
+
+def merge_scores(keep_id, drop_id):
+    """
+    Fold a restaurant that is being merged away into the one kept: its trending score
+    carries over, and ratings are recomputed once its reviews have been moved.
+    """
+    trending = RestaurantScore.objects.filter(pk=drop_id).values_list("trending", flat=True).first()
+    if trending:
+        _update(keep_id, trending=F("trending") + trending)
+    refresh_rating(keep_id)
+
+
+def sync_restaurant(restaurant):
+    """Keep the denormalized city/category in step with the restaurant."""
+    RestaurantScore.objects.filter(pk=restaurant.pk).update(
+        city=restaurant.city, category=restaurant.category
+    )
+
+
+def sync_restaurants(restaurants):
+    """sync_restaurant for many restaurants: one UPDATE per distinct (city, category)."""
+    groups = defaultdict(list)
+    for restaurant in restaurants:
+        groups[(restaurant.city, restaurant.category)].append(restaurant.pk)
+    for (city, category), ids in groups.items():
+        RestaurantScore.objects.filter(pk__in=ids).update(city=city, category=category)
+
+
+def _board(order_field, city=None, category=None, limit=10):
+    qs = RestaurantScore.objects.select_related("restaurant")
+    if city:
+        qs = qs.filter(city=city)
+    if category:
+        qs = qs.filter(category=category)
+    qs = qs.filter(**{f"{order_field}__gt": 0}).order_by(f"-{order_field}")
+    return [s.restaurant for s in qs[:limit]]
+
+
+def trending(city=None, category=None, limit=10):
+    """Top `limit` restaurants by decayed engagement."""
+    return _board("trending", city, category, limit)
+
+
+def top_rated(city=None, category=None, limit=10):
+    """Top `limit` restaurants by Bayesian average rating."""
+    return _board("top_rated", city, category, limit)
+
+
+def compact(now=None, batch_size=1000):
+    """
+    Rebuild every score from the source tables and drop rows that have gone cold.
+    Returns (rows_written, rows_dropped).
+    """
+    from social.models import Like  # local import to avoid circular deps
+
+    now = now or timezone.now()
+    since = now - COMPACTION_WINDOW
+    scores = defaultdict(float)
+    event_sources = [
+        (Review.objects.filter(created_at__gte=since).values_list("restaurant_id", "created_at"), REVIEW_WEIGHT),
+        (Pin.objects.filter(created_at__gte=since).values_list("restaurant_id", "created_at"), PIN_WEIGHT),
+        (
+            Like.objects.filter(created_at__gte=since).values_list("activity__restaurant_id", "created_at"),
+            LIKE_WEIGHT,
+        ),
+    ]
+    for events, weight in event_sources:
+        for restaurant_id, at in events.iterator(chunk_size=batch_size):
+            scores[restaurant_id] += weight * _growth(at)
+
+    ratings = {
+        row["restaurant_id"]: (row["rating_sum"], row["rating_count"])
+        for row in Review.objects.order_by()
+        .values("restaurant_id")
+        .annotate(rating_sum=Sum("overall_rating"), rating_count=Count("id"))
+    }
+
+    cold_below = COLD_SCORE * _growth(now)
+    scores = {rid: score for rid, score in scores.items() if score >= cold_below}
+    live_ids = set(scores) | set(ratings)
+    rows = []
+    for r in Restaurant.objects.values("id", "city", "category").iterator(chunk_size=batch_size):
+        if r["id"] not in live_ids:
+            continue
+        rating_sum, rating_count = ratings.get(r["id"], (0, 0))
+        rows.append(
+            RestaurantScore(
+                restaurant_id=r["id"],
+                city=r["city"],
+                category=r["category"],
+                trending=scores.get(r["id"], 0.0),
+                rating_sum=rating_sum,
+                rating_count=rating_count,
+                top_rated=_bayesian(rating_sum, rating_count) if rating_count else 0,
+            )
+        )
+
+    # Swap the whole table in one transaction so readers never see a half-built board.
+    with transaction.atomic():
+        old = dict(RestaurantScore.objects.values_list("pk", "top_rated"))
+        deleted, _ = RestaurantScore.objects.all().delete()
+        RestaurantScore.objects.bulk_create(rows, batch_size=batch_size)
+        # Only places whose top_rated moved (usually none) need their pins rewritten.
+        new = {row.restaurant_id: row.top_rated for row in rows}
+        list_pages.set_sort_ratings(
+            {rid: new.get(rid, 0) for rid in old.keys() | new.keys() if new.get(rid, 0) != old.get(rid, 0)}
+        )
+    return len(rows), max(deleted - len(rows), 0)
@@ -0,0 +1,204 @@
+"""
+Keyset pagination for list contents.
+
+Each sort order is a sequence of (field, descending) keys ending in the pin id as a
+tie-breaker. A page's cursor carries the last row's key values, so the next page is a
+seek (`WHERE key beyond cursor ... LIMIT n`) that costs the same on page 1 and page 100,
+instead of an OFFSET scan over everything before it.
+
+The name and rating orders come from the restaurant, and an index on Restaurant can't
+order rows of one list across the join. Pins therefore carry copies of the name and
+top_rated score (`sort_name`, `sort_rating`), indexed with the list: new pins copy them
+on insert (`sort_keys`), and renames, merges and rating changes rewrite the copies of
+only the restaurants whose value actually moved. Every sort but distance is a seek on a
+(list, key, id) index.
+"""
+import base64
+import json
+import math
+
+from django.db.models import Case, F, FloatField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+
+from .models import Pin, Restaurant, RestaurantScore
+
+PAGE_SIZE = 24
+
+SORTS = {
+    "added": (("created_at", True), ("id", True)),
+    "custom": (("rank", False), ("id", False)),
+    "name": (("sort_name", False), ("id", False)),
+    "rating": (("sort_rating", True), ("id", False)),
+    "distance": (("sort_distance", False), ("id", False)),
+}
+SORT_CHOICES = [
+    ("added", "Recently added"),
+    ("custom", "My order"),
+    ("name", "Name"),
+    ("rating", "Rating"),
+    ("distance", "Distance"),
+]
+DEFAULT_SORT = "added"
+
+# Places without coordinates sort after everything else by distance.
+NO_DISTANCE = 1e12
+KM_PER_DEGREE = 111.32
+
+# JSON types each cursor value must have; created_at is then parsed from its string.
+_TYPES = {
+    "created_at": str,
+    "rank": str,
+    "sort_name": str,
+    "sort_rating": (int, float),
+    "sort_distance": (int, float),
+    "id": int,
+}
+_PARSERS = {"created_at": parse_datetime}
+BATCH_SIZE = 500
+
+
+def sort_keys(restaurant_ids):
+    """{restaurant id: (sort_name, sort_rating)} for pins about to be inserted."""
+    restaurant_ids = list(restaurant_ids)
+    keys = {}
+    for start in range(0, len(restaurant_ids), BATCH_SIZE):
+        batch = restaurant_ids[start:start + BATCH_SIZE]
+        ratings = dict(RestaurantScore.objects.filter(pk__in=batch).values_list("pk", "top_rated"))
+        for pk, name in Restaurant.objects.filter(pk__in=batch).values_list("pk", "name"):
+            keys[pk] = (name, ratings.get(pk, 0.0))
+    return keys
+
+
+def refresh_sort_keys(restaurant_ids):
+    """Copy current names and top_rated scores onto the pins of `restaurant_ids`."""
+    values = {
+        "sort_name": Subquery(Restaurant.objects.filter(pk=OuterRef("restaurant_id")).values("name")[:1]),
+        "sort_rating": Coalesce(
+            Subquery(RestaurantScore.objects.filter(pk=OuterRef("restaurant_id")).values("top_rated")[:1]),
+            Value(0.0),
+            output_field=FloatField(),
+        ),
+    }
+    restaurant_ids = list(restaurant_ids)
+    for start in range(0, len(restaurant_ids), BATCH_SIZE):
+        Pin.objects.filter(restaurant_id__in=restaurant_ids[start:start + BATCH_SIZE]).update(**values)
+
+
+def set_sort_name(restaurant_id, name):
+    """Copy a restaurant's name onto its pins; pins already holding it aren't written."""
+    Pin.objects.filter(restaurant_id=restaurant_id).exclude(sort_name=name).update(sort_name=name)
+
+
+def copy_sort_rating(restaurant_id):
+    """Copy a restaurant's stored top_rated onto its pins, in one UPDATE without a read."""
+    Pin.objects.filter(restaurant_id=restaurant_id).update(
+        sort_rating=Coalesce(
+            Subquery(RestaurantScore.objects.filter(pk=restaurant_id).values("top_rated")[:1]),
+            Value(0.0),
+            output_field=FloatField(),
+        )
+    )
+
+
+def set_sort_ratings(ratings):
+    """Copy new top_rated scores ({restaurant id: score}) onto those restaurants' pins."""
+    items = list(ratings.items())
+    for start in range(0, len(items), BATCH_SIZE):
+        batch = items[start:start + BATCH_SIZE]
+        Pin.objects.filter(restaurant_id__in=[rid for rid, _ in batch]).update(
+            sort_rating=Case(
+                *[When(restaurant_id=rid, then=Value(float(rating))) for rid, rating in batch],
+                output_field=FloatField(),
+            )
+        )
+
+
+def encode_cursor(values):
+    # isoformat() keeps microseconds (DjangoJSONEncoder rounds to ms, which breaks seeks)
+    raw = json.dumps(values, default=lambda v: v.isoformat()).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort):
+    """Inverse of `encode_cursor`; raises ValueError for anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    keys = SORTS[sort]
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise ValueError("Invalid cursor")
+    parsed = []
+    for (field, _), value in zip(keys, values):
+        if not isinstance(value, _TYPES[field]) or isinstance(value, bool):
+            raise ValueError("Invalid cursor")
+        value = _PARSERS.get(field, lambda v: v)(value)
+        if value is None:
+            raise ValueError("Invalid cursor")
+        parsed.append(value)
+    return parsed
+
+
+def _seek(keys, values):
+    """Rows strictly after `values` in (mixed-direction) lexicographic key order."""
+    condition = Q()
+    equal = Q()
+    for (field, descending), value in zip(keys, values):
+        condition |= equal & Q(**{f"{field}__{'lt' if descending else 'gt'}": value})
+        equal &= Q(**{field: value})
+    return condition
+
+
+def _queryset(lst, sort, origin):
+    qs = Pin.objects.filter(list=lst).select_related("restaurant")
+    if sort == "distance":
+        lat, lng = origin
+        # Equirectangular approximation: monotonic in true distance at city scale, and
+        # plain arithmetic so it runs on SQLite as well as Postgres.
+        lng_scale = math.cos(math.radians(lat))
+        dlat = F("restaurant__lat") - Value(lat)
+        dlng = (F("restaurant__lng") - Value(lng)) * Value(lng_scale)
+        qs = qs.annotate(
+            sort_distance=Coalesce(dlat * dlat + dlng * dlng, Value(NO_DISTANCE), output_field=FloatField())
+        )
+    return qs
+
+
+def page(lst, sort=DEFAULT_SORT, after=None, origin=None, size=PAGE_SIZE):
+    """
+    One page of a list's pins. Returns (pins, next_cursor, sort); next_cursor is None on
+    the last page and sort is the order actually used, since distance needs an
+    (lat, lng) origin and otherwise falls back to the default.
+    Raises ValueError for a malformed `after` cursor.
+    """
+    if sort not in SORTS or (sort == "distance" and origin is None):
+        sort = DEFAULT_SORT
+    keys = SORTS[sort]
+
+    qs = _queryset(lst, sort, origin)
+    if after:
+        qs = qs.filter(_seek(keys, decode_cursor(after, sort)))
+    qs = qs.order_by(*[f"-{field}" if descending else field for field, descending in keys])
+
+    pins = list(qs[:size + 1])
+    has_more = len(pins) > size
+    pins = pins[:size]
+
+    for p in pins:
+        if sort == "distance" and p.sort_distance < NO_DISTANCE:
+            p.distance_km = math.sqrt(p.sort_distance) * KM_PER_DEGREE
+
+    next_cursor = None
+    if has_more:
+        last = pins[-1]
+        next_cursor = encode_cursor([_key_value(last, field) for field, _ in keys])
+    return pins, next_cursor, sort
+
+
+def _key_value(pin, field):
+    obj = pin
+    for part in field.split("__"):
+        obj = getattr(obj, part)
+    return obj
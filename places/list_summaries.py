@@ -0,0 +1,51 @@
+"""
+Pin counts and previews for list cards.
+
+List cards only show how many places a list holds and the names of the few most
+recently added, so instead of prefetching every pin and restaurant a user has ever
+saved, one windowed query over the lists' pins returns the count and the top
+PREVIEW_SIZE rows per list. Full contents are only loaded by `list_detail`.
+"""
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Pin
+
+PREVIEW_SIZE = 3
+
+
+def annotate_list_summaries(lists):
+    """
+    Attach `pin_count` and `preview` (restaurant names, newest first) to each list.
+    Returns the lists as a Python list.
+    """
+    lists = list(lists)
+    by_id = {}
+    for lst in lists:
+        lst.pin_count = 0
+        lst.preview = []
+        by_id[lst.id] = lst
+    if not by_id:
+        return lists
+
+    partition = [F("list_id")]
+    rows = (
+        Pin.objects.filter(list_id__in=by_id)
+        .order_by()
+        .annotate(
+            list_count=Window(Count("id"), partition_by=partition),
+            preview_rank=Window(
+                RowNumber(),
+                partition_by=partition,
+                order_by=[F("created_at").desc(), F("id").desc()],
+            ),
+        )
+        .filter(preview_rank__lte=PREVIEW_SIZE)
+        .order_by("list_id", "preview_rank")
+        .values_list("list_id", "list_count", "restaurant__name")
+    )
+    for list_id, count, name in rows:
+        lst = by_id[list_id]
+        lst.pin_count = count
+        lst.preview.append(name)
+    return lists
@@ -0,0 +1,267 @@
+"""
+Offline city/country lookup for restaurants, from coordinates or from an address.
+
+Coordinates are matched against a bundled table of city centroids (data/cities.csv,
+each with a radius covering its built-up area). Cities are indexed in a grid of
+GRID_DEGREES cells: each city is filed under every cell its circle touches, so a lookup
+is one dict access plus a distance check against the handful of cities in that cell,
+and a whole catalog is located in well under a second.
+
+Addresses without coordinates go through precompiled matchers, most specific first:
+
+- a UK postcode ("WC2H 9FB") whose area (WC) is in POSTCODE_AREAS;
+- a French postcode followed by its commune ("75011 Paris"), when the commune is a
+  French city in the table or the address says France;
+- the last city name from the table that appears in the address ("..., Austin, TX")
+  and agrees with any country or US state the address also names, so "Paris, Texas"
+  isn't taken for Paris, France.
+
+Anything else is unknown (None) rather than guessed: a blank city is easy to find and
+fix, a wrong one silently hides a place from city filters.
+"""
+import csv
+import math
+import re
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+from pathlib import Path
+
+CITIES_PATH = Path(__file__).resolve().parent / "data" / "cities.csv"
+GRID_DEGREES = 1.0
+
+Locality = namedtuple("Locality", ["city", "country"])
+
+UK = "United Kingdom"
+FRANCE = "France"
+US = "United States"
+
+# Postcode area (the leading letters of the outward code) -> city.
+POSTCODE_AREAS = {
+    **dict.fromkeys(("E", "EC", "N", "NW", "SE", "SW", "W", "WC"), "London"),
+    "AB": "Aberdeen",
+    "B": "Birmingham",
+    "BA": "Bath",
+    "BN": "Brighton",
+    "BS": "Bristol",
+    "BT": "Belfast",
+    "CB": "Cambridge",
+    "CF": "Cardiff",
+    "CV": "Coventry",
+    "EH": "Edinburgh",
+    "G": "Glasgow",
+    "L": "Liverpool",
+    "LE": "Leicester",
+    "LS": "Leeds",
+    "M": "Manchester",
+    "NE": "Newcastle upon Tyne",
+    "NG": "Nottingham",
+    "OX": "Oxford",
+    "S": "Sheffield",
+    "YO": "York",
+}
+
+US_STATES = {
+    "Alabama": "AL", "Alaska": "AK", "Arizona": "AZ", "Arkansas": "AR", "California": "CA",
+    "Colorado": "CO", "Connecticut": "CT", "Delaware": "DE", "District of Columbia": "DC",
+    "Florida": "FL", "Georgia": "GA", "Hawaii": "HI", "Idaho": "ID", "Illinois": "IL",
+    "Indiana": "IN", "Iowa": "IA", "Kansas": "KS", "Kentucky": "KY", "Louisiana": "LA",
+    "Maine": "ME", "Maryland": "MD", "Massachusetts": "MA", "Michigan": "MI",
+    "Minnesota": "MN", "Mississippi": "MS", "Missouri": "MO", "Montana": "MT",
+    "Nebraska": "NE", "Nevada": "NV", "New Hampshire": "NH", "New Jersey": "NJ",
+    "New Mexico": "NM", "New York": "NY", "North Carolina": "NC", "North Dakota": "ND",
+    "Ohio": "OH", "Oklahoma": "OK", "Oregon": "OR", "Pennsylvania": "PA",
+    "Rhode Island": "RI", "South Carolina": "SC", "South Dakota": "SD", "Tennessee": "TN",
+    "Texas": "TX", "Utah": "UT", "Vermont": "VT", "Virginia": "VA", "Washington": "WA",
+    "West Virginia": "WV", "Wisconsin": "WI", "Wyoming": "WY",
+}
+
+# State of each US city in data/cities.csv.
+US_CITY_STATES = {
+    "New York": "NY",
+    "Los Angeles": "CA",
+    "San Francisco": "CA",
+    "Chicago": "IL",
+    "Boston": "MA",
+    "Washington": "DC",
+    "Miami": "FL",
+    "Seattle": "WA",
+    "Austin": "TX",
+    "New Orleans": "LA",
+}
+
+# Other ways addresses name a country from the table.
+COUNTRY_ALIASES = {
+    "UK": UK,
+    "U.K.": UK,
+    "Great Britain": UK,
+    "England": UK,
+    "Scotland": UK,
+    "Wales": UK,
+    "Northern Ireland": UK,
+    "USA": US,
+    "U.S.A.": US,
+    "United States of America": US,
+    "Deutschland": "Germany",
+    "España": "Spain",
+    "Italia": "Italy",
+    "Nederland": "Netherlands",
+    "Schweiz": "Switzerland",
+    "Suisse": "Switzerland",
+    "Belgique": "Belgium",
+    "België": "Belgium",
+}
+
+_UK_POSTCODE = re.compile(r"\b([A-Z]{1,2})\d[A-Z\d]?\s*\d[A-Z]{2}\b")
+_FR_POSTCODE = re.compile(r"\b(\d{5})\s+([^\W\d_][^,\d]*)")
+_CEDEX = re.compile(r"\s+cedex\b.*$", re.IGNORECASE)
+_DIGITS = re.compile(r"[\d-]+")
+_STATE_NAMES = {name.casefold(): code for name, code in US_STATES.items()}
+_STATE_CODES = set(US_STATES.values())
+
+def _distance_km(lat1, lng1, lat2, lng2):
+    # Equirectangular approximation; accurate to well under 1% at city scale.
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return math.hypot(x, y) * 6371
+
+
+def _cell(lat, lng):
+    return math.floor(lat / GRID_DEGREES), math.floor(lng / GRID_DEGREES)
+
+
+class CityIndex:
+    """Grid index over (city, country, lat, lng, radius_km) records."""
+
+    def __init__(self, cities):
+        self.cities = list(cities)
+        self.grid = defaultdict(list)
+        for city in self.cities:
+            _name, _country, lat, lng, radius = city
+            d_lat = radius / 111.32
+            d_lng = radius / (111.32 * max(math.cos(math.radians(lat)), 0.01))
+            (row0, col0), (row1, col1) = _cell(lat - d_lat, lng - d_lng), _cell(lat + d_lat, lng + d_lng)
+            for row in range(row0, row1 + 1):
+                for col in range(col0, col1 + 1):
+                    self.grid[(row, col)].append(city)
+
+        by_name = {}
+        for name, country, *_ in self.cities:
+            by_name.setdefault(name.casefold(), Locality(name, country))
+        self.by_name = by_name
+        names = sorted(by_name, key=len, reverse=True)
+        self.name_pattern = re.compile(
+            r"\b(" + "|".join(re.escape(name) for name in names) + r")\b", re.IGNORECASE
+        )
+
+        countries = {country.casefold(): country for _name, country, *_ in self.cities}
+        countries.update((alias.casefold(), country) for alias, country in COUNTRY_ALIASES.items())
+        self.countries = countries
+
+    def nearest(self, lat, lng):
+        """The closest city whose radius covers (lat, lng), or None."""
+        best, best_distance = None, None
+        for name, country, city_lat, city_lng, radius in self.grid.get(_cell(lat, lng), ()):
+            distance = _distance_km(lat, lng, city_lat, city_lng)
+            if distance <= radius and (best_distance is None or distance < best_distance):
+                best, best_distance = Locality(name, country), distance
+        return best
+
+    def named(self, name):
+        """The table's spelling of a city name, or None if it isn't in the table."""
+        return self.by_name.get(name.strip().casefold())
+
+
+@lru_cache(maxsize=1)
+def default_index():
+    with open(CITIES_PATH, encoding="utf-8", newline="") as file:
+        return CityIndex(
+            (row["city"], row["country"], float(row["lat"]), float(row["lng"]), float(row["radius_km"]))
+            for row in csv.DictReader(file)
+        )
+
+
+def from_coordinates(lat, lng, index=None):
+    if lat is None or lng is None:
+        return None
+    return (index or default_index()).nearest(lat, lng)
+
+
+def from_address(address, index=None):
+    """Locality named by an address (postcode first, then city names), or None."""
+    if not address:
+        return None
+    index = index or default_index()
+
+    match = _UK_POSTCODE.search(address.upper())
+    if match and match.group(1) in POSTCODE_AREAS:
+        return Locality(POSTCODE_AREAS[match.group(1)], UK)
+
+    match = _FR_POSTCODE.search(address)
+    if match:
+        if match.group(1).startswith("75"):
+            return Locality("Paris", FRANCE)
+        # Five digits and a word is also a US ZIP or a German PLZ: only trust it for a
+        # French city in the table or an address that says it's in France.
+        commune = _CEDEX.sub("", match.group(2)).strip()
+        known = index.named(commune)
+        if known and known.country == FRANCE:
+            return known
+        if commune and "france" in address.casefold():
+            return Locality(commune.title(), FRANCE)
+
+    # The city usually comes last, after street names that may contain one; skip names
+    # that contradict a country or US state the address spells out.
+    countries, state = _context(address, index)
+    for name in reversed(index.name_pattern.findall(address)):
+        locality = index.named(name)
+        if _consistent(locality, countries, state):
+            return locality
+    return None
+
+
+def _context(address, index):
+    """
+    (countries, US state code) an address names as whole parts ("..., Texas 75460",
+    "..., TX", "..., UK"); street names like "Virginia St" don't count.
+    """
+    countries, state = set(), None
+    for part in address.split(","):
+        part = " ".join(_DIGITS.sub(" ", part).split())
+        code = part if part in _STATE_CODES else _STATE_NAMES.get(part.casefold())
+        if code:
+            state = code
+            countries.add(US)
+        elif part.casefold() in index.countries:
+            countries.add(index.countries[part.casefold()])
+    return countries, state
+
+
+def _consistent(locality, countries, state):
+    if countries and locality.country not in countries:
+        return False
+    if state and US_CITY_STATES.get(locality.city, state) != state:
+        return False
+    return True
+
+
+def locate(lat=None, lng=None, address="", index=None):
+    """Locality from coordinates when they fall in a known city, else from the address."""
+    index = index or default_index()
+    return from_coordinates(lat, lng, index) or from_address(address, index)
+
+
+def locate_rows(rows, on_unknown=None):
+    """
+    Import stage: yield rows with "city" and "country" set from lat/lng or the address.
+    Rows that can't be located get a blank city, and `on_unknown(row)` if given.
+    """
+    index = default_index()
+    for row in rows:
+        locality = locate(row.get("lat"), row.get("lng"), row.get("address"), index)
+        if locality:
+            row["city"], row["country"] = locality
+        else:
+            row["city"], row["country"] = "", ""
+            if on_unknown:
+                on_unknown(row)
+        yield row
@@ -0,0 +1,62 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from places import leaderboards, localities
+from places.models import Restaurant
+
+
+class Command(BaseCommand):
+    help = 'Set every restaurant\'s city and country from its coordinates or address'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only fill in restaurants that have no city yet'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without writing'
+        )
+
+    def handle(self, *args, **options):
+        index = localities.default_index()
+        rows = Restaurant.objects.values_list('pk', 'lat', 'lng', 'address', 'city', 'country', 'category')
+        if options['missing_only']:
+            rows = rows.filter(city='')
+
+        # (city, country) -> restaurants moving there; one UPDATE per group.
+        changes = defaultdict(list)
+        unchanged = unknown = 0
+        for pk, lat, lng, address, city, country, category in rows.iterator(chunk_size=5000):
+            locality = localities.locate(lat, lng, address, index)
+            if locality is None:
+                unknown += 1
+            elif locality == (city, country):
+                unchanged += 1
+            else:
+                changes[locality].append(Restaurant(pk=pk, city=locality.city, category=category))
+
+        changed = sum(len(restaurants) for restaurants in changes.values())
+        for (city, country), restaurants in sorted(changes.items(), key=lambda item: -len(item[1])):
+            self.stdout.write(f'{len(restaurants):>7,}  {city}, {country}')
+
+        if not options['dry_run']:
+            with transaction.atomic():
+                for (city, country), restaurants in changes.items():
+                    for start in range(0, len(restaurants), 500):
+                        batch = restaurants[start:start + 500]
+                        Restaurant.objects.filter(pk__in=[r.pk for r in batch]).update(
+                            city=city, country=country
+                        )
+                        leaderboards.sync_restaurants(batch)
+
+        verb = 'would change' if options['dry_run'] else 'changed'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Cities assigned: {changed} {verb}, {unchanged} unchanged, {unknown} unknown (left as they were)'
+            )
+        )
@@ -0,0 +1,56 @@
+import csv
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from places import coordinate_checks
+
+
+class Command(BaseCommand):
+    help = 'Find zeroed, swapped, out-of-city, isolated and duplicate restaurant coordinates'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--report',
+            type=str,
+            help='Write every finding to this CSV file'
+        )
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Null out bad coordinates (swapped ones are swapped back)'
+        )
+
+    def handle(self, *args, **options):
+        restaurants, found = coordinate_checks.check_catalog()
+        self.stdout.write(f'Checked {len(restaurants):,} restaurants')
+        for problem, mask in found.items():
+            kind = 'bad' if problem in coordinate_checks.BAD else 'suspect'
+            self.stdout.write(f'{int(mask.sum()):>7,}  {problem} ({kind})')
+
+        if options['report']:
+            with open(options['report'], 'w', encoding='utf-8', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(['id', 'name', 'problem', 'lat', 'lng', 'city', 'expected_city'])
+                for problem, mask in found.items():
+                    for position in mask.nonzero()[0]:
+                        pk, name, lat, lng, city, expected = restaurants[position]
+                        writer.writerow([pk, name, problem, lat, lng, city, expected])
+            self.stdout.write(f'Report written to {options["report"]}')
+
+        if options['fix']:
+            pks = {
+                problem: [restaurants[position][0] for position in found[problem].nonzero()[0]]
+                for problem in coordinate_checks.BAD
+            }
+            with transaction.atomic():
+                changed = coordinate_checks.fix(pks)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Fixed {changed} restaurants; run assign_cities to update their cities'
+                )
+            )
+            return
+
+        bad = sum(int(found[problem].sum()) for problem in coordinate_checks.BAD)
+        self.stdout.write(self.style.SUCCESS(f'Coordinate check done: {bad} bad (use --fix to clear them)'))
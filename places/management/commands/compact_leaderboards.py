@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from places import leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Rebuild trending/top-rated leaderboard scores and drop cold rows (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per bulk insert / server-side cursor chunk'
+        )
+
+    def handle(self, *args, **options):
+        written, dropped = leaderboards.compact(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Leaderboards compacted: {written} scores written, {dropped} cold rows dropped'
+            )
+        )
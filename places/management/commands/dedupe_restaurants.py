@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from places import dedup
+from places.models import Restaurant
+
+
+class Command(BaseCommand):
+    help = 'Merge duplicate restaurants and queue likely ones for review in the admin'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list the pairs that would be merged or queued'
+        )
+        parser.add_argument(
+            '--auto-threshold',
+            type=float,
+            default=dedup.AUTO_MERGE,
+            help='Merge pairs scoring at least this much without review'
+        )
+        parser.add_argument(
+            '--review-threshold',
+            type=float,
+            default=dedup.REVIEW,
+            help='Queue pairs scoring at least this much for review'
+        )
+
+    def handle(self, *args, **options):
+        merged, queued, pairs = dedup.deduplicate(
+            auto_threshold=options['auto_threshold'],
+            review_threshold=options['review_threshold'],
+            dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            names = dict(
+                Restaurant.objects.filter(pk__in={pk for _s, a, b in pairs for pk in (a, b)})
+                .values_list('pk', 'name')
+            )
+            for score, pk_a, pk_b in pairs:
+                action = 'merge' if score >= options['auto_threshold'] else 'review'
+                self.stdout.write(f'{score:.2f} {action:6} {names[pk_a]} (#{pk_a}) ~ {names[pk_b]} (#{pk_b})')
+            self.stdout.write(self.style.SUCCESS(f'Dry run: {merged} pairs would be merged, {queued} queued'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Deduplication done: {merged} merged, {queued} queued for review'))
@@ -0,0 +1,71 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from places import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream restaurants, reviews, lists, pins and activities to CSV or JSON Lines files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'datasets',
+            nargs='*',
+            help=f'Datasets to export: {", ".join(exports.DATASETS)} (default: all)'
+        )
+        parser.add_argument(
+            '--format',
+            choices=exports.FORMATS,
+            default='csv',
+            help='Output format'
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Compress the output'
+        )
+        parser.add_argument(
+            '--output-dir',
+            type=str,
+            default='.',
+            help='Directory for the files, named <dataset>.<format>[.gz]; "-" writes to stdout'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=exports.CHUNK_SIZE,
+            help='Rows fetched and written at a time'
+        )
+
+    def handle(self, *args, **options):
+        datasets = options['datasets'] or list(exports.DATASETS)
+        unknown = set(datasets) - set(exports.DATASETS)
+        if unknown:
+            raise CommandError(f'Unknown datasets: {", ".join(sorted(unknown))}')
+        fmt, compress = options['format'], options['gzip']
+        output_dir = options['output_dir']
+
+        for dataset in datasets:
+            chunks = exports.export(dataset, fmt, compress, options['chunk_size'])
+            if output_dir == '-':
+                for chunk in chunks:
+                    sys.stdout.buffer.write(chunk)
+                sys.stdout.buffer.flush()
+                continue
+
+            os.makedirs(output_dir, exist_ok=True)
+            path = os.path.join(output_dir, exports.filename(dataset, fmt, compress))
+            # Written under a temporary name so a backup never picks up half a file.
+            tmp = f'{path}.tmp'
+            size = 0
+            with open(tmp, 'wb') as file:
+                for chunk in chunks:
+                    file.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp, path)
+            self.stdout.write(f'{dataset}: {size:,} bytes -> {path}')
+
+        if output_dir != '-':
+            self.stdout.write(self.style.SUCCESS(f'Export completed: {len(datasets)} datasets'))
@@ -1,10 +1,7 @@
-import csv
 import os
-import requests
-import time
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
-from places.models import Restaurant
+from places import coordinate_checks, geocoding, localities, restaurant_import
 
 
 class Command(BaseCommand):
@@ -14,7 +11,7 @@ class Command(BaseCommand):
         parser.add_argument(
             'csv_file',
             type=str,
-            help='Path to the CSV file containing restaurant data'
+            help='Path to the CSV or JSON Lines file containing restaurant data (may be .gz)'
         )
         parser.add_argument(
             '--update',
@@ -26,11 +23,38 @@ class Command(BaseCommand):
             action='store_true',
             help='Geocode addresses to get coordinates'
         )
+        parser.add_argument(
+            '--check-coordinates',
+            action='store_true',
+            help='Drop zeroed, out-of-range and out-of-city coordinates (and fix swapped ones); needs NumPy'
+        )
         parser.add_argument(
             '--skip-existing',
             action='store_true',
             help='Skip restaurants that already exist (default behavior)'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=restaurant_import.BATCH_SIZE,
+            help='Rows written per bulk INSERT/UPDATE'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=restaurant_import.CHUNK_SIZE,
+            help='Input records per transaction; progress is reported and checkpointed after each'
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='Input format (default: from the file extension)'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            type=str,
+            help='Progress file; an interrupted import rerun with the same file resumes from it'
+        )
 
     def handle(self, *args, **options):
         csv_file = options['csv_file']
@@ -43,176 +67,115 @@ class Command(BaseCommand):
             )
             return
 
-        imported_count = 0
-        updated_count = 0
-        skipped_count = 0
-        geocoded_count = 0
-
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            
-            for row in reader:
-                name = row.get('name', '').strip()
-                cuisine = row.get('cuisine', '').strip()
-                lat = row.get('lat', '').strip()
-                lon = row.get('lon', '').strip()
-                address = row.get('address', '').strip()
-                website = row.get('website', '').strip()
-                price = row.get('price', '').strip()
-                category = row.get('category', 'restaurant').strip()
-                
-                if not name:
-                    self.stdout.write(
-                        self.style.WARNING(f'Skipping row with empty name: {row}')
-                    )
-                    skipped_count += 1
-                    continue
-                
-                # Skip restaurants without addresses if geocoding is requested
-                if geocode_addresses and not address:
-                    self.stdout.write(
-                        self.style.WARNING(f'Skipping {name} - no address provided for geocoding')
-                    )
-                    skipped_count += 1
-                    continue
-                
-                # Convert coordinates to float
-                lat_float = None
-                lon_float = None
-                if lat and lon:
-                    try:
-                        lat_float = float(lat)
-                        lon_float = float(lon)
-                    except ValueError:
-                        self.stdout.write(
-                            self.style.WARNING(f'Invalid coordinates for {name}: lat={lat}, lon={lon}')
-                        )
-                
-                # Extract city from address
-                city = self.extract_city_from_address(address) if address else 'London'
-                
-                # Geocode address if requested and no coordinates
-                if geocode_addresses and not lat_float and address:
-                    lat_float, lon_float = self.geocode_address(address)
-                    if lat_float:
-                        geocoded_count += 1
-                        self.stdout.write(f'Geocoded: {name} -> {lat_float}, {lon_float}')
-                    else:
-                        self.stdout.write(
-                            self.style.WARNING(f'Failed to geocode: {name} at {address}')
-                        )
-                
-                # Check if restaurant already exists
-                existing_restaurant = Restaurant.objects.filter(name=name).first()
-                
-                if existing_restaurant:
-                    if update_existing:
-                        existing_restaurant.cuisine = cuisine
-                        existing_restaurant.lat = lat_float
-                        existing_restaurant.lng = lon_float
-                        existing_restaurant.address = address
-                        existing_restaurant.city = city
-                        existing_restaurant.website = website
-                        existing_restaurant.price = price
-                        existing_restaurant.category = category
-                        existing_restaurant.save()
-                        updated_count += 1
-                        self.stdout.write(f'Updated: {name}')
-                    else:
-                        skipped_count += 1
-                        self.stdout.write(f'Skipped existing: {name}')
-                else:
-                    Restaurant.objects.create(
-                        name=name,
-                        cuisine=cuisine,
-                        lat=lat_float,
-                        lng=lon_float,
-                        address=address,
-                        city=city,
-                        website=website,
-                        price=price,
-                        category=category
-                    )
-                    imported_count += 1
-                    self.stdout.write(f'Imported: {name}')
+        self.skipped_count = 0
+        self.geocoded_count = 0
+        self.unlocated_count = 0
+        self.bad_coordinates_count = 0
+
+        check_coordinates = options['check_coordinates']
+
+        geocoder = geocoding.default_geocoder() if geocode_addresses else None
+        if geocode_addresses and geocoder is None:
+            self.stdout.write(
+                self.style.ERROR('GOOGLE_MAPS_API_KEY not set. Cannot geocode addresses.')
+            )
+
+        def prepare(records):
+            rows = self.parse_rows(records, geocode_addresses)
+            if geocoder:
+                rows = geocoding.geocode_rows(rows, geocoder, on_result=self.geocoded)
+            if check_coordinates:
+                rows = coordinate_checks.check_rows(rows, on_problem=self.bad_coordinates)
+            # Last, so geocoded (and checked) coordinates decide the city.
+            return list(localities.locate_rows(rows, on_unknown=self.unlocated))
+
+        checkpoint = None
+        if options['checkpoint']:
+            checkpoint = restaurant_import.Checkpoint(options['checkpoint'], csv_file)
+            try:
+                position, _counts = checkpoint.load()
+            except ValueError as exc:
+                raise CommandError(str(exc)) from exc
+            if position:
+                self.stdout.write(f'Resuming after record {position:,}')
+
+        try:
+            counts = restaurant_import.import_file(
+                csv_file,
+                prepare,
+                update=update_existing,
+                fmt=options['format'],
+                chunk_size=options['chunk_size'],
+                batch_size=options['batch_size'],
+                checkpoint=checkpoint,
+                progress=self.progress,
+            )
+        finally:
+            if geocoder:
+                geocoder.close()
+
+        if geocoder:
+            stats = geocoder.stats
+            self.stdout.write(
+                f'Geocoding: {stats["cached"]} cached, {stats["fetched"]} fetched, {stats["failed"]} failed'
+            )
 
         self.stdout.write(
             self.style.SUCCESS(
-                f'Import completed: {imported_count} imported, '
-                f'{updated_count} updated, {skipped_count} skipped, '
-                f'{geocoded_count} geocoded'
+                f'Import completed: {counts["created"]} imported, '
+                f'{counts["updated"]} updated, {counts["unchanged"]} unchanged, '
+                f'{counts["skipped"] + self.skipped_count} skipped, '
+                f'{self.geocoded_count} geocoded, {self.unlocated_count} without a known city, '
+                f'{self.bad_coordinates_count} with bad coordinates'
             )
         )
 
-    def extract_city_from_address(self, address):
-        """Extract city from address string"""
-        if not address:
-            return 'London'
-        
-        # Common London postcodes and areas
-        london_indicators = [
-            'London', 'E1', 'E2', 'E3', 'E4', 'E5', 'E6', 'E7', 'E8', 'E9', 'E10', 'E11', 'E12', 'E13', 'E14', 'E15', 'E16', 'E17', 'E18', 'E20',
-            'W1', 'W2', 'W3', 'W4', 'W5', 'W6', 'W7', 'W8', 'W9', 'W10', 'W11', 'W12', 'W13', 'W14',
-            'N1', 'N2', 'N3', 'N4', 'N5', 'N6', 'N7', 'N8', 'N9', 'N10', 'N11', 'N12', 'N13', 'N14', 'N15', 'N16', 'N17', 'N18', 'N19', 'N20', 'N21', 'N22',
-            'S1', 'S2', 'S3', 'S4', 'S5', 'S6', 'S7', 'S8', 'S9', 'S10', 'S11', 'S12', 'S13', 'S14', 'S15', 'S16', 'S17', 'S18', 'S19', 'S20', 'S21', 'S22',
-            'SW1', 'SW2', 'SW3', 'SW4', 'SW5', 'SW6', 'SW7', 'SW8', 'SW9', 'SW10', 'SW11', 'SW12', 'SW13', 'SW14', 'SW15', 'SW16', 'SW17', 'SW18', 'SW19', 'SW20',
-            'SE1', 'SE2', 'SE3', 'SE4', 'SE5', 'SE6', 'SE7', 'SE8', 'SE9', 'SE10', 'SE11', 'SE12', 'SE13', 'SE14', 'SE15', 'SE16', 'SE17', 'SE18', 'SE19', 'SE20', 'SE21', 'SE22', 'SE23', 'SE24', 'SE25', 'SE26', 'SE27', 'SE28',
-            'NW1', 'NW2', 'NW3', 'NW4', 'NW5', 'NW6', 'NW7', 'NW8', 'NW9', 'NW10', 'NW11',
-            'EC1', 'EC2', 'EC3', 'EC4', 'EC1A', 'EC1M', 'EC1N', 'EC1R', 'EC1V', 'EC1Y',
-            'WC1', 'WC2', 'WC1A', 'WC1B', 'WC1E', 'WC1H', 'WC1N', 'WC1R', 'WC1V', 'WC1X', 'WC2A', 'WC2B', 'WC2E', 'WC2H', 'WC2N', 'WC2R'
-        ]
-        
-        # Check if address contains London indicators
-        address_upper = address.upper()
-        for indicator in london_indicators:
-            if indicator.upper() in address_upper:
-                return 'London'
-        
-        # If no London indicators found, try to extract city from end of address
-        # Look for patterns like "City Name" or "City Name, Country"
-        parts = address.split(',')
-        if len(parts) >= 2:
-            # Take the second-to-last part as potential city
-            potential_city = parts[-2].strip()
-            if potential_city and len(potential_city) > 2:
-                return potential_city
-        
-        # Default to London if we can't determine
-        return 'London'
+    def parse_rows(self, records, geocode_addresses):
+        """Yield import rows, warning about (and counting) the ones that can't be used."""
+        for row in records:
+            try:
+                values = restaurant_import.parse_row(row)
+            except ValueError:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'Invalid coordinates for {row.get("name")}: lat={row.get("lat")}, lon={row.get("lon")}'
+                    )
+                )
+                values = restaurant_import.parse_row({**row, 'lat': '', 'lon': ''})
+            name = values['name']
+            address = values['address']
 
-    def geocode_address(self, address):
-        """Geocode an address using Google Maps Geocoding API"""
-        api_key = os.getenv('GOOGLE_MAPS_API_KEY')
-        if not api_key:
-            self.stdout.write(
-                self.style.ERROR('GOOGLE_MAPS_API_KEY not set. Cannot geocode addresses.')
-            )
-            return None, None
-        
-        try:
-            url = f'https://maps.googleapis.com/maps/api/geocode/json'
-            params = {
-                'address': address,
-                'key': api_key
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data['status'] == 'OK' and data['results']:
-                location = data['results'][0]['geometry']['location']
-                # Small delay to respect rate limits
-                time.sleep(0.1)
-                return location['lat'], location['lng']
-            else:
+            if not name:
+                self.stdout.write(
+                    self.style.WARNING(f'Skipping row with empty name: {row}')
+                )
+                self.skipped_count += 1
+                continue
+
+            # Skip restaurants without addresses if geocoding is requested
+            if geocode_addresses and not address:
                 self.stdout.write(
-                    self.style.WARNING(f'Geocoding failed for "{address}": {data.get("status", "Unknown error")}')
+                    self.style.WARNING(f'Skipping {name} - no address provided for geocoding')
                 )
-                return None, None
-                
-        except requests.RequestException as e:
+                self.skipped_count += 1
+                continue
+
+            yield values
+
+    def progress(self, position, rate):
+        self.stdout.write(f'{position:,} records read ({rate:,.0f}/s)')
+
+    def geocoded(self, row, coords):
+        if coords:
+            self.geocoded_count += 1
+        else:
             self.stdout.write(
-                self.style.ERROR(f'Geocoding request failed for "{address}": {e}')
+                self.style.WARNING(f'Failed to geocode: {row["name"]} at {row["address"]}')
             )
-            return None, None
+
+    def bad_coordinates(self, row, problem):
+        self.bad_coordinates_count += 1
+        self.stdout.write(self.style.WARNING(f'Bad coordinates ({problem}) for {row["name"]}'))
+
+    def unlocated(self, row):
+        self.unlocated_count += 1
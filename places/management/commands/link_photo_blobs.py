@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from places import photo_blobs
+from places.models import Photo
+
+
+class Command(BaseCommand):
+    help = 'Move review photos uploaded before content-addressed storage onto shared blobs, deleting duplicate files'
+
+    def handle(self, *args, **options):
+        photos = Photo.objects.filter(blob__isnull=True, status=Photo.READY).exclude(image="")
+        linked = shared = failed = 0
+        for photo in photos.order_by('pk').iterator(chunk_size=100):
+            try:
+                # The first copy of each file keeps its name and variants; later ones are deleted.
+                blob, created = photo_blobs.attach(
+                    photo, photo.image.storage, photo.image.name, adopt=True, variants=photo.variants
+                )
+            except OSError as exc:
+                failed += 1
+                self.stderr.write(f'{photo!r}: {exc}')
+                continue
+            if not blob.variants:
+                photo_blobs.process(blob)
+            photo_blobs.publish(blob)
+            linked += 1
+            shared += not created
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Linked {linked} photos to blobs ({shared} duplicates removed, {failed} failed)')
+        )
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from places import history_import
+from places.models import HistoryImport
+
+
+class Command(BaseCommand):
+    help = 'Run history imports left pending/running by a restarted worker (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=10,
+            help='Only pick up imports uploaded at least this many minutes ago (skips ones still queued)'
+        )
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(minutes=options['older_than'])
+        import_ids = list(
+            HistoryImport.objects.filter(status__in=[HistoryImport.PENDING, HistoryImport.RUNNING])
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        results = [history_import.run(import_id, stale_after=stale_after) for import_id in import_ids]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'History imports processed: {results.count(HistoryImport.DONE)} done, '
+                f'{results.count(HistoryImport.FAILED)} failed'
+            )
+        )
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from places import photo_jobs
+from places.models import Photo
+
+
+class Command(BaseCommand):
+    help = 'Store and resize review photos left processing/failed by a restarted worker (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=10,
+            help='Only pick up photos uploaded at least this many minutes ago (skips ones still queued)'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options['older_than'])
+        photo_ids = list(
+            Photo.objects.filter(Q(status=Photo.PROCESSING) | Q(status=Photo.FAILED), created_at__lte=cutoff)
+            # Failed decodes keep nothing to retry from
+            .exclude(status=Photo.FAILED, blob__isnull=True, spool_name='', image='')
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        results = [photo_jobs.process(photo_id) for photo_id in photo_ids]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Pending photos processed: {results.count(Photo.READY)} ready, '
+                f'{results.count(Photo.FAILED)} still failing'
+            )
+        )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from places import ranks
+
+
+class Command(BaseCommand):
+    help = 'Respace list/pin order keys that have grown long from repeated reordering (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--length',
+            type=int,
+            default=ranks.REBALANCE_LENGTH,
+            help='Rebalance any scope holding a key longer than this'
+        )
+
+    def handle(self, *args, **options):
+        list_scopes, pin_scopes = ranks.rebalance_all(length=options['length'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Ranks rebalanced: {list_scopes} users\' lists, {pin_scopes} lists\' pins'
+            )
+        )
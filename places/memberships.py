@@ -0,0 +1,101 @@
+"""
+Per-user "is this restaurant pinned / reviewed / in that list" lookups.
+
+A user's memberships are a few sorted int arrays (restaurant ids pinned, reviewed,
+and per list), built with two queries and cached as compact `array` blobs. Pages of
+restaurant cards and the list picker then answer membership with a binary search in
+memory instead of a query per page. Pin and review writes (signals, and the bulk list
+paths that bypass them) drop the entry; the next read rebuilds it.
+"""
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from .models import Pin, Review
+
+MEMBERSHIPS_TTL = 60 * 60
+
+
+def _key(user_id):
+    return f"places:memberships:{user_id}"
+
+
+def _sorted_array(ids):
+    return array("q", sorted(set(ids)))
+
+
+def _contains(arr, value):
+    i = bisect_left(arr, value)
+    return i < len(arr) and arr[i] == value
+
+
+class Memberships:
+    """Read-only view over one user's cached membership arrays."""
+
+    __slots__ = ("pinned_ids", "reviewed_ids", "list_ids")
+
+    def __init__(self, pinned_ids=None, reviewed_ids=None, list_ids=None):
+        self.pinned_ids = pinned_ids or array("q")
+        self.reviewed_ids = reviewed_ids or array("q")
+        self.list_ids = list_ids or {}
+
+    def pinned(self, restaurant_id):
+        return _contains(self.pinned_ids, restaurant_id)
+
+    def reviewed(self, restaurant_id):
+        return _contains(self.reviewed_ids, restaurant_id)
+
+    def lists_with(self, restaurant_id):
+        """Ids of the user's lists that hold this restaurant."""
+        return {
+            list_id for list_id, ids in self.list_ids.items() if _contains(ids, restaurant_id)
+        }
+
+
+def _build(user_id):
+    pinned = []
+    by_list = defaultdict(list)
+    for list_id, restaurant_id in Pin.objects.filter(user_id=user_id).values_list(
+        "list_id", "restaurant_id"
+    ):
+        pinned.append(restaurant_id)
+        if list_id is not None:
+            by_list[list_id].append(restaurant_id)
+    reviewed = Review.objects.filter(user_id=user_id).values_list("restaurant_id", flat=True)
+    return Memberships(
+        _sorted_array(pinned),
+        _sorted_array(reviewed),
+        {list_id: _sorted_array(ids) for list_id, ids in by_list.items()},
+    )
+
+
+def get_memberships(user):
+    """The user's memberships (empty for anonymous users); two queries on a cache miss."""
+    if not user.is_authenticated:
+        return Memberships()
+    key = _key(user.id)
+    cached = cache.get(key)
+    if cached is not None:
+        return Memberships(*cached)
+    memberships = _build(user.id)
+    cache.set(
+        key,
+        (memberships.pinned_ids, memberships.reviewed_ids, memberships.list_ids),
+        MEMBERSHIPS_TTL,
+    )
+    return memberships
+
+
+def invalidate_memberships(*user_ids):
+    cache.delete_many([_key(uid) for uid in user_ids])
+
+
+def annotate_memberships(user, restaurants):
+    """Attach `is_pinned` and `is_reviewed` to each restaurant in a page of cards."""
+    memberships = get_memberships(user)
+    for r in restaurants:
+        r.is_pinned = memberships.pinned(r.id)
+        r.is_reviewed = memberships.reviewed(r.id)
+    return restaurants
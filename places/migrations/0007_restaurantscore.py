@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0006_review_would_go_again'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RestaurantScore',
+            fields=[
+                ('restaurant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='places.restaurant')),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('category', models.CharField(blank=True, max_length=50)),
+                ('trending', models.FloatField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('top_rated', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-trending'], name='score_trending_idx'), models.Index(fields=['city', '-trending'], name='score_city_trending_idx'), models.Index(fields=['city', 'category', '-trending'], name='score_city_cat_trending_idx'), models.Index(fields=['-top_rated'], name='score_top_rated_idx'), models.Index(fields=['city', '-top_rated'], name='score_city_top_rated_idx'), models.Index(fields=['city', 'category', '-top_rated'], name='score_city_cat_top_rated_idx')],
+            },
+        ),
+    ]
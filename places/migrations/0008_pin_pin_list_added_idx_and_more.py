@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0007_restaurantscore'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['list', '-created_at', '-id'], name='pin_list_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['name', 'id'], name='restaurant_name_idx'),
+        ),
+    ]
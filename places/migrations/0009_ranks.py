@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:56
+
+from django.conf import settings
+from itertools import groupby
+
+from django.db import migrations, models
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+
+def spaced_keys(n):
+    # Frozen copy of places.ranks.spaced_keys
+    width = 1
+    while len(DIGITS) ** width <= n:
+        width += 1
+    span = len(DIGITS) ** width
+    keys = []
+    for i in range(1, n + 1):
+        value = i * span // (n + 1)
+        digits = []
+        for _ in range(width):
+            value, d = divmod(value, len(DIGITS))
+            digits.append(DIGITS[d])
+        keys.append("".join(reversed(digits)).rstrip(DIGITS[0]))
+    return keys
+
+
+def backfill_ranks(apps, schema_editor):
+    """Lists keep their alphabetical order per owner; pins keep insertion order per list."""
+    List = apps.get_model("places", "List")
+    Pin = apps.get_model("places", "Pin")
+    for model, scope, order in (
+        (List, "owner_id", ("owner_id", "title", "id")),
+        (Pin, "list_id", ("list_id", "created_at", "id")),
+    ):
+        rows = model.objects.order_by(*order).only("pk", scope)
+        updated = []
+        for _, group in groupby(rows.iterator(chunk_size=2000), key=lambda row: getattr(row, scope)):
+            group = list(group)
+            for row, key in zip(group, spaced_keys(len(group))):
+                row.rank = key
+                updated.append(row)
+            if len(updated) >= 2000:
+                model.objects.bulk_update(updated, ["rank"])
+                updated = []
+        model.objects.bulk_update(updated, ["rank"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0008_pin_pin_list_added_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='list',
+            name='rank',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='pin',
+            name='rank',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(backfill_ranks, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='list',
+            options={'ordering': ('rank', 'id')},
+        ),
+        migrations.RemoveField(
+            model_name='list',
+            name='position',
+        ),
+        migrations.AddIndex(
+            model_name='list',
+            index=models.Index(fields=['owner', 'rank', 'id'], name='list_owner_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['list', 'rank', 'id'], name='pin_list_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Titles the old code matched case-insensitively, best match first.
+SYSTEM_TITLES = {
+    "visited": ["visited"],
+    "saved": ["saved", "want to go"],
+}
+
+
+def backfill_kinds(apps, schema_editor):
+    """Tag each owner's default lists, found by title as before, with their kind."""
+    List = apps.get_model("places", "List")
+    candidates = {}
+    for lst in List.objects.filter(
+        models.Q(title__iexact="visited") | models.Q(title__iexact="saved") | models.Q(title__iexact="want to go")
+    ).only("pk", "owner_id", "title"):
+        candidates.setdefault(lst.owner_id, {})[lst.title.strip().lower()] = lst.pk
+    for kind, titles in SYSTEM_TITLES.items():
+        pks = []
+        for by_title in candidates.values():
+            pk = next((by_title[t] for t in titles if t in by_title), None)
+            if pk is not None:
+                pks.append(pk)
+        List.objects.filter(pk__in=pks).update(kind=kind)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0009_ranks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='list',
+            name='kind',
+            field=models.CharField(choices=[('visited', 'Visited'), ('saved', 'Saved'), ('custom', 'Custom')], default='custom', max_length=10),
+        ),
+        migrations.RunPython(backfill_kinds, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='list',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'custom'), _negated=True), fields=('owner', 'kind'), name='list_owner_system_kind_uniq'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0010_list_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
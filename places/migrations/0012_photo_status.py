@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0011_photo_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='spool_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='status',
+            field=models.CharField(choices=[('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', max_length=10),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0013_photoblob_photo_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='placeholder',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='photoblob',
+            name='placeholder',
+            field=models.TextField(blank=True),
+        ),
+    ]
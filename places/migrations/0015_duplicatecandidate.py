@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0014_photo_placeholder_photoblob_placeholder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('dismissed', 'Dismissed')], default='pending', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('duplicate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='places.restaurant')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='places.restaurant')),
+            ],
+            options={
+                'ordering': ('-score',),
+                'constraints': [models.UniqueConstraint(fields=('restaurant', 'duplicate'), name='duplicate_candidate_pair_uniq')],
+            },
+        ),
+    ]
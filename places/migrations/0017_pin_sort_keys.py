@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:00
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_sort_keys(apps, schema_editor):
+    """Copy each pin's restaurant name and top_rated score (frozen list_pages.refresh_sort_keys)."""
+    Pin = apps.get_model("places", "Pin")
+    Restaurant = apps.get_model("places", "Restaurant")
+    RestaurantScore = apps.get_model("places", "RestaurantScore")
+    Pin.objects.update(
+        sort_name=Subquery(Restaurant.objects.filter(pk=OuterRef("restaurant_id")).values("name")[:1]),
+        sort_rating=Coalesce(
+            Subquery(RestaurantScore.objects.filter(pk=OuterRef("restaurant_id")).values("top_rated")[:1]),
+            Value(0.0),
+            output_field=FloatField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0016_historyimport'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='restaurant',
+            name='restaurant_name_idx',
+        ),
+        migrations.AddField(
+            model_name='pin',
+            name='sort_name',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='pin',
+            name='sort_rating',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(backfill_sort_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['list', 'sort_name', 'id'], name='pin_list_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['list', '-sort_rating', 'id'], name='pin_list_rating_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:04
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+def name_key(name):
+    # Frozen copy of places.dedup.name_key
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char)).casefold()
+    return " ".join(re.sub(r"[^\w\s]", " ", name).split())
+
+
+def backfill_name_keys(apps, schema_editor):
+    Restaurant = apps.get_model("places", "Restaurant")
+    updated = []
+    for restaurant in Restaurant.objects.only("pk", "name").iterator(chunk_size=2000):
+        restaurant.name_key = name_key(restaurant.name)
+        updated.append(restaurant)
+        if len(updated) >= 2000:
+            Restaurant.objects.bulk_update(updated, ["name_key"])
+            updated = []
+    Restaurant.objects.bulk_update(updated, ["name_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0017_pin_sort_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='name_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_name_keys, migrations.RunPython.noop),
+    ]
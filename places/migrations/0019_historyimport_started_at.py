@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0018_restaurant_name_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historyimport',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
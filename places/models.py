@@ -21,6 +21,8 @@ class Restaurant(models.Model):
     ]
 
     name = models.CharField(max_length=200)
+    # dedup.name_key(name), set on save: imports look names up by it a chunk at a time.
+    name_key = models.CharField(max_length=255, blank=True, db_index=True, editable=False)
     address = models.CharField(max_length=300, blank=True)
     city = models.CharField(max_length=100, blank=True)
     country = models.CharField(max_length=100, blank=True)
@@ -55,14 +57,41 @@ class Restaurant(models.Model):
 
 
 class List(models.Model):
+    # Every user gets one auto-managed list of each system kind; see places/system_lists.py
+    VISITED = "visited"
+    SAVED = "saved"
+    CUSTOM = "custom"
+    KIND_CHOICES = [
+        (VISITED, "Visited"),
+        (SAVED, "Saved"),
+        (CUSTOM, "Custom"),
+    ]
+    SYSTEM_KINDS = (VISITED, SAVED)
+
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     title = models.CharField(max_length=120)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=CUSTOM)
     is_public = models.BooleanField(default=True)
-    position = models.PositiveIntegerField(default=0, db_index=True)  # safe default
+    # User-chosen order among the owner's lists; see places/ranks.py
+    rank = models.CharField(max_length=64, blank=True, default="")
 
     class Meta:
-        ordering = ("position", "id")
+        ordering = ("rank", "id")
         unique_together = ("owner", "title")
+        indexes = [
+            models.Index(fields=["owner", "rank", "id"], name="list_owner_rank_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "kind"],
+                condition=~models.Q(kind="custom"),
+                name="list_owner_system_kind_uniq",
+            ),
+        ]
+
+    @property
+    def is_system(self):
+        return self.kind != self.CUSTOM
 
     def __str__(self):
         return f"{self.owner} – {self.title}"
@@ -81,10 +110,25 @@ class Pin(models.Model):
     note = models.TextField(blank=True)
     rating = models.PositiveSmallIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # User-chosen order within the list; see places/ranks.py
+    rank = models.CharField(max_length=64, blank=True, default="")
+    # Copies of the restaurant's name and top_rated score, so name and rating list pages
+    # seek one index within the list; kept in step by places/list_pages.py
+    sort_name = models.CharField(max_length=200, blank=True, default="")
+    sort_rating = models.FloatField(default=0)
 
     class Meta:
         # ✨ allow same restaurant across lists; one entry per list+restaurant
         unique_together = ("list", "restaurant")
+        indexes = [
+            # Newest-first list pages seek (created_at, id) within one list
+            models.Index(fields=["list", "-created_at", "-id"], name="pin_list_added_idx"),
+            # "My order" list pages seek (rank, id) within one list
+            models.Index(fields=["list", "rank", "id"], name="pin_list_rank_idx"),
+            # Name and rating list pages seek (sort_name, id) / (-sort_rating, id)
+            models.Index(fields=["list", "sort_name", "id"], name="pin_list_name_idx"),
+            models.Index(fields=["list", "-sort_rating", "id"], name="pin_list_rating_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user} → {self.restaurant} ({self.list and self.list.title or 'no-list'})"
@@ -119,8 +163,33 @@ class Review(models.Model):
         return f"{self.user} → {self.restaurant} ({self.overall_rating}★)"
 
 
+class PhotoBlob(models.Model):
+    """
+    One stored photo file (and its variants), shared by every Photo with the same bytes.
+    `ref_count` is the number of photos pointing at it; see places/photo_blobs.py.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    image = models.ImageField(upload_to="review_photos/sha256/")
+    variants = models.JSONField(default=dict, blank=True)
+    placeholder = models.TextField(blank=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+
+
 class Photo(models.Model):
     """Photos attached to reviews"""
+    PROCESSING = "processing"
+    READY = "ready"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PROCESSING, "Processing"),
+        (READY, "Ready"),
+        (FAILED, "Failed"),
+    ]
+
     review = models.ForeignKey(
         Review, on_delete=models.CASCADE, related_name="photos"
     )
@@ -130,6 +199,17 @@ class Photo(models.Model):
         help_text="Upload photos of your meal or the restaurant"
     )
     caption = models.CharField(max_length=200, blank=True)
+    # Resized WebP/AVIF copies of `image` and a tiny data: URI preview; see places/images.py
+    variants = models.JSONField(default=dict, blank=True)
+    placeholder = models.TextField(blank=True)
+    # Stored content. `image`, `variants` and `placeholder` are copied from it once processed.
+    blob = models.ForeignKey(
+        PhotoBlob, on_delete=models.PROTECT, null=True, blank=True, related_name="photos"
+    )
+    # Uploads wait in the local spool (`spool_name`) until places/photo_jobs.py has
+    # stored and resized them; `image` is empty until then.
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=READY)
+    spool_name = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -137,3 +217,111 @@ class Photo(models.Model):
 
     def __str__(self):
         return f"Photo for {self.review}"
+
+
+class DuplicateCandidate(models.Model):
+    """
+    A pair of restaurants places/dedup.py thinks may be the same place, but not surely
+    enough to merge on its own. Staff merge or dismiss them from the admin; dismissed
+    pairs are never queued or merged automatically again. `restaurant` is the lower id.
+    """
+    PENDING = "pending"
+    DISMISSED = "dismissed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (DISMISSED, "Dismissed"),
+    ]
+
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name="+")
+    duplicate = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("-score",)
+        constraints = [
+            models.UniqueConstraint(fields=["restaurant", "duplicate"], name="duplicate_candidate_pair_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.restaurant} ≈ {self.duplicate} ({self.score:.2f})"
+
+
+class RestaurantScore(models.Model):
+    """
+    Materialized leaderboard row for one restaurant; maintained by places.leaderboards.
+
+    `trending` is the sum of event weights scaled by exp(decay * (event_time - epoch)),
+    so rows rank by their decayed score without ever being rewritten as time passes.
+    """
+    restaurant = models.OneToOneField(
+        Restaurant, on_delete=models.CASCADE, primary_key=True, related_name="score"
+    )
+    # Copied from Restaurant so leaderboard reads never join
+    city = models.CharField(max_length=100, blank=True)
+    category = models.CharField(max_length=50, blank=True)
+
+    trending = models.FloatField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    top_rated = models.FloatField(default=0)  # Bayesian average of overall_rating
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-trending"], name="score_trending_idx"),
+            models.Index(fields=["city", "-trending"], name="score_city_trending_idx"),
+            models.Index(
+                fields=["city", "category", "-trending"], name="score_city_cat_trending_idx"
+            ),
+            models.Index(fields=["-top_rated"], name="score_top_rated_idx"),
+            models.Index(fields=["city", "-top_rated"], name="score_city_top_rated_idx"),
+            models.Index(
+                fields=["city", "category", "-top_rated"], name="score_city_cat_top_rated_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Score({self.restaurant_id}: {self.trending:.3g} / {self.top_rated:.2f})"
+
+
+class HistoryImport(models.Model):
+    """
+    A user's upload of reviews and saved places from another app, imported in the
+    background by places/history_import.py. `counts` holds what the import did.
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="history_imports"
+    )
+    file = models.FileField(
+        upload_to="history_imports/%Y/%m/%d/",
+        validators=[FileExtensionValidator(allowed_extensions=["csv", "jsonl", "gz"])],
+    )
+    post_activity = models.BooleanField(
+        default=True, help_text="Show imported reviews in friends' feeds"
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    counts = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when a worker claims the import; a RUNNING import is only reclaimed once this is old.
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("-created_at",)
+
+    def __str__(self):
+        return f"{self.user} import #{self.pk} ({self.status})"
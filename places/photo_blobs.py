@@ -0,0 +1,146 @@
+"""
+Content-addressed storage for review photos.
+
+The same picture often gets uploaded more than once: re-attached to an edited review,
+uploaded again after deleting it, or shared across reviews. Each distinct file (by
+SHA-256 of the uploaded bytes) is stored and resized once, as a `PhotoBlob`, and every
+`Photo` with those bytes points at it. The photo's own `image` / `variants` /
+`placeholder` are copies of the blob's, filled in once the blob is processed, so
+templates keep reading photos.
+
+`ref_count` tracks how many photos point at a blob: `attach` takes a reference,
+deleting a photo releases it (places/signals.py), and the blob's row and files are
+removed when the last reference goes. Counts only change through conditional
+`UPDATE ... SET ref_count = ref_count ± 1`, so concurrent jobs never lose a reference
+and a blob that's being freed can't be picked up again.
+"""
+import hashlib
+import os
+
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from PIL import Image
+
+from . import images
+from .models import Photo, PhotoBlob
+
+
+def content_hash(storage, name):
+    digest = hashlib.sha256()
+    with storage.open(name, "rb") as f:
+        for chunk in f.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _acquire(sha256):
+    # The update matches nothing if the blob was freed since the lookup.
+    blob = PhotoBlob.objects.filter(sha256=sha256).first()
+    if blob and PhotoBlob.objects.filter(pk=blob.pk, ref_count__gt=0).update(ref_count=F("ref_count") + 1):
+        return blob
+    return None
+
+
+def _create(sha256, storage, name, adopt, variants=None):
+    """
+    New blob holding one reference. With `adopt` the file already lives in media storage
+    and is taken over as is; otherwise it's copied there. Returns None if another job
+    stored the same content first.
+    """
+    blob = PhotoBlob(sha256=sha256, ref_count=1, variants=variants or {})
+    if adopt:
+        blob.image.name = name
+    else:
+        with storage.open(name, "rb") as f:
+            blob.image.save(sha256 + os.path.splitext(name)[1].lower(), File(f), save=False)
+    try:
+        with transaction.atomic():
+            blob.save()
+    except IntegrityError:
+        if not adopt:
+            blob.image.delete(save=False)
+        return None
+    return blob
+
+
+def attach(photo, storage, name, adopt=False, variants=None):
+    """
+    Point `photo` at the blob for the file `name` in `storage`, storing it as a new blob if
+    these bytes haven't been seen. The photo's own copy is deleted unless it is the blob's
+    file. Returns (blob, created).
+    """
+    sha256 = content_hash(storage, name)
+    while True:
+        blob = _acquire(sha256)
+        if blob is not None:
+            created = False
+            break
+        blob = _create(sha256, storage, name, adopt, variants)
+        if blob is not None:
+            created = True
+            break
+
+    Photo.objects.filter(pk=photo.pk).update(
+        blob=blob, image="", variants={}, placeholder="", spool_name=""
+    )
+    # An adopted `name` may be the blob's own file: this photo's, or that of another
+    # photo with the same direct-upload key whose job got there first.
+    if not (adopt and name == blob.image.name):
+        storage.delete(name)
+        images.delete_variants(storage, variants)
+    # Re-read: the blob may have finished processing while this photo was being linked.
+    blob.refresh_from_db(fields=["image", "variants", "placeholder"])
+    return blob, created
+
+
+def process(blob):
+    """Make the blob's variants. Returns False if its file isn't a decodable image."""
+    try:
+        images.process_photo(blob)
+    except (Image.DecompressionBombError, Image.UnidentifiedImageError, OSError, ValueError):
+        return False
+    return True
+
+
+def fail(blob):
+    """
+    Mark every photo of a blob that couldn't be decoded as failed and drop their
+    references, so the blob and its file are freed (retrying would fail the same way).
+    """
+    photo_ids = list(Photo.objects.filter(blob=blob).values_list("pk", flat=True))
+    Photo.objects.filter(pk__in=photo_ids).update(
+        blob=None, image="", variants={}, placeholder="", spool_name="", status=Photo.FAILED
+    )
+    for _ in photo_ids:
+        release(blob.pk)
+
+
+def publish(blob):
+    """Copy a processed blob's files onto all its photos and mark them ready."""
+    return Photo.objects.filter(blob=blob).update(
+        image=blob.image.name,
+        variants=blob.variants,
+        placeholder=blob.placeholder,
+        status=Photo.READY,
+        spool_name="",
+    )
+
+
+def _delete_files(storage, name, variants):
+    images.delete_variants(storage, variants)
+    if name:
+        storage.delete(name)
+
+
+def release(blob_id):
+    """Drop one reference; frees the blob (row now, files after commit) when it was the last."""
+    PhotoBlob.objects.filter(pk=blob_id, ref_count__gt=0).update(ref_count=F("ref_count") - 1)
+    blob = PhotoBlob.objects.filter(pk=blob_id, ref_count=0).first()
+    if blob is None:
+        return
+    # Conditional delete: a concurrent attach may have taken a new reference meanwhile.
+    deleted, _ = PhotoBlob.objects.filter(pk=blob.pk, ref_count=0).delete()
+    if deleted:
+        storage, name, variants = blob.image.storage, blob.image.name, blob.variants
+        transaction.on_commit(lambda: _delete_files(storage, name, variants))
@@ -0,0 +1,109 @@
+"""
+Off-request storage upload and resizing of review photos.
+
+A review POST only writes each upload to a local spool directory and creates its
+`Photo` row with status "processing", so the request no longer waits on R2 uploads
+or Pillow. Once the review commits, the photo ids go to a per-process thread pool:
+each job copies the spooled file to media storage, makes its variants
+(places/images.py), marks the photo ready and removes the spool file. Content seen
+before is only linked to the existing copy (places/photo_blobs.py). Uploads and
+resizing for different photos run concurrently; templates show a placeholder until
+a photo is ready.
+
+Jobs only live in memory, so photos whose process exited mid-job stay "processing"
+(or "failed" if storage errored); `manage.py process_pending_photos` picks them up
+again. Files Pillow can't decode (including decompression bombs) are "failed" for
+good: their file is dropped, so there is nothing left to retry. With PHOTO_WORKERS = 0
+jobs run inline on commit instead.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import close_old_connections, transaction
+
+from . import photo_blobs
+from .models import Photo
+
+spool_storage = FileSystemStorage(location=settings.PHOTO_SPOOL_DIR)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PHOTO_WORKERS, thread_name_prefix="photo-jobs"
+            )
+    return _executor
+
+
+def spool(upload):
+    """Write an uploaded file to the local spool. Returns its spool name."""
+    return spool_storage.save(os.path.basename(upload.name), upload)
+
+
+def process(photo_id):
+    """
+    Store and resize one pending photo. Returns the photo's new status, or None if there
+    was nothing to do (already processed, deleted meanwhile, or failed for good).
+    """
+    photo = Photo.objects.filter(pk=photo_id).exclude(status=Photo.READY).select_related("blob").first()
+    if photo is None:
+        return None
+    blob = photo.blob
+    if blob is None and not (photo.spool_name or photo.image):
+        return None  # not a decodable image; see photo_blobs.fail
+    if blob is None:
+        # Spooled uploads are copied into media storage; direct uploads already live
+        # there, so their file becomes the blob's as is.
+        if photo.spool_name:
+            storage, name, adopt = spool_storage, photo.spool_name, False
+        else:
+            storage, name, adopt = photo.image.storage, photo.image.name, True
+        try:
+            blob, created = photo_blobs.attach(photo, storage, name, adopt=adopt)
+        except OSError:
+            Photo.objects.filter(pk=photo.pk).update(status=Photo.FAILED)
+            return Photo.FAILED
+        if not created and not blob.variants:
+            # Same bytes as a photo still being resized; that job marks this one ready too.
+            return Photo.PROCESSING
+
+    if not blob.variants and not photo_blobs.process(blob):
+        # Not a decodable image, or a decompression bomb (direct uploads are only
+        # checked for size and type).
+        photo_blobs.fail(blob)
+        return Photo.FAILED
+    photo_blobs.publish(blob)
+    return Photo.READY
+
+
+def _run(photo_id):
+    # Pool threads hold their own DB connections; don't let them go stale between jobs.
+    close_old_connections()
+    try:
+        return process(photo_id)
+    finally:
+        close_old_connections()
+
+
+def enqueue(photo_ids):
+    """Process the photos once the current transaction commits."""
+    photo_ids = list(photo_ids)
+    if not photo_ids:
+        return
+
+    def submit():
+        for photo_id in photo_ids:
+            if settings.PHOTO_WORKERS:
+                _pool().submit(_run, photo_id)
+            else:
+                process(photo_id)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,184 @@
+"""
+Lexicographic rank keys for user-ordered lists and pins.
+
+A rank is a base-62 string compared as a plain string, read as a fraction (``"V"`` is
+0.5, ``"k"`` ~0.74). Between any two keys there is always another, so a drag-and-drop
+move writes only the moved row: its new key is computed from its two new neighbours.
+Keys never end in the lowest digit, which keeps room below every key.
+
+Repeated moves into the same gap make keys longer; `rebalance()` rewrites one scope
+(a user's lists, or one list's pins) with short evenly spaced keys. It runs from
+`manage.py rebalance_ranks`, or inline if a key would hit the column limit.
+"""
+from django.db import transaction
+from django.db.models import Max, Q
+from django.db.models.functions import Length
+
+from .models import List, Pin
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+_INDEX = {ch: i for i, ch in enumerate(DIGITS)}
+
+MAX_LENGTH = 64
+# Scopes with any key longer than this get rebalanced by the periodic job.
+REBALANCE_LENGTH = 16
+
+
+def key_between(before=None, after=None):
+    """
+    A key strictly between `before` and `after`; None means an open end.
+    Appending and prepending step the first digit with headroom, so keys at either
+    end grow by one character per ~60 additions rather than per ~6 halvings.
+    """
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f"{before!r} is not before {after!r}")
+
+    if before and after is None:
+        for i, ch in enumerate(before):
+            if _INDEX[ch] < BASE - 1:
+                return before[:i] + DIGITS[_INDEX[ch] + 1]
+        return before + DIGITS[BASE // 2]
+
+    if after and not before:
+        for i, ch in enumerate(after):
+            if _INDEX[ch] > 1:
+                return after[:i] + DIGITS[_INDEX[ch] - 1]
+
+    # Midpoint, digit by digit: copy the shared prefix, split the first wide gap.
+    lo = before or ""
+    hi = after
+    key = []
+    i = 0
+    while True:
+        d_lo = _INDEX[lo[i]] if i < len(lo) else 0
+        d_hi = _INDEX[hi[i]] if hi is not None and i < len(hi) else BASE
+        if d_hi - d_lo > 1:
+            key.append(DIGITS[(d_lo + d_hi) // 2])
+            return "".join(key)
+        key.append(DIGITS[d_lo])
+        if d_hi - d_lo == 1:
+            # Anything starting with this prefix is below `after` now.
+            hi = None
+        i += 1
+
+
+def spaced_keys(n):
+    """`n` increasing, evenly spaced keys of equal (minimal) width."""
+    if n <= 0:
+        return []
+    width = 1
+    while BASE ** width <= n:
+        width += 1
+    span = BASE ** width
+    keys = []
+    for i in range(1, n + 1):
+        value = i * span // (n + 1)
+        digits = []
+        for _ in range(width):
+            value, d = divmod(value, BASE)
+            digits.append(DIGITS[d])
+        keys.append("".join(reversed(digits)).rstrip(DIGITS[0]))
+    return keys
+
+
+def keys_after(last, n):
+    """`n` increasing keys that all sort after `last` (None for an empty scope)."""
+    if last is None or n <= 0:
+        return spaced_keys(n)
+    if n == 1:
+        return [key_between(last, None)]
+    # Step past `last` first, then extend: the keys stay above it, and repeated bulk
+    # appends don't make them one `spaced_keys` width longer each time.
+    start = key_between(last, None)
+    return [start + key for key in spaced_keys(n)]
+
+
+def last_key(queryset):
+    return queryset.aggregate(last=Max("rank"))["last"]
+
+
+def append_keys(scope, n):
+    """`n` keys after everything in `scope`, rebalancing it first if they'd get too long."""
+    keys = keys_after(last_key(scope), n)
+    if keys and max(len(key) for key in keys) >= MAX_LENGTH:
+        rebalance(scope)
+        keys = keys_after(last_key(scope), n)
+    return keys
+
+
+def _unbalanced(queryset, length):
+    # Over-long keys, plus unranked rows written by paths that bypass pre_save.
+    return queryset.annotate(rank_length=Length("rank")).filter(
+        Q(rank_length__gt=length) | Q(rank="")
+    )
+
+
+def rebalance(queryset, batch_size=1000):
+    """Rewrite one scope's keys, keeping its current order. Returns rows updated."""
+    with transaction.atomic():
+        rows = list(queryset.select_for_update().order_by("rank", "id").only("pk", "rank"))
+        for row, key in zip(rows, spaced_keys(len(rows))):
+            row.rank = key
+        if rows:
+            queryset.model.objects.bulk_update(rows, ["rank"], batch_size=batch_size)
+    return len(rows)
+
+
+def move(obj, scope, before_id=None, after_id=None):
+    """
+    Give `obj` a key between its new neighbours (ids within `scope`, None for an end)
+    and save just that row. Returns the new key.
+    """
+    if obj.pk in (before_id, after_id) or (before_id is not None and before_id == after_id):
+        raise ValueError("Invalid neighbours")
+    with transaction.atomic():
+        if before_id is None and after_id is None:
+            key = append_keys(scope.exclude(pk=obj.pk), 1)[0]
+        else:
+            key = _key_between_neighbours(scope, before_id, after_id)
+        obj.rank = key
+        obj.save(update_fields=["rank"])
+    return key
+
+
+def _key_between_neighbours(scope, before_id, after_id):
+    for attempt in range(2):
+        neighbours = dict(
+            scope.select_for_update()
+            .filter(pk__in=[i for i in (before_id, after_id) if i is not None])
+            .values_list("pk", "rank")
+        )
+        before = neighbours.get(before_id) if before_id is not None else None
+        after = neighbours.get(after_id) if after_id is not None else None
+        if (before_id is not None and before is None) or (after_id is not None and after is None):
+            raise ValueError("Unknown neighbour")
+        if (before is None or after is None or before < after) and max(
+            len(before or ""), len(after or "")
+        ) < MAX_LENGTH - 1:
+            return key_between(before, after)
+        if attempt:
+            # Still out of order once the scope has distinct keys: stale or swapped ids.
+            raise ValueError("Neighbours out of order")
+        # Duplicate/legacy keys or no room left: respace the scope once and retry.
+        rebalance(scope)
+
+
+def rebalance_all(length=REBALANCE_LENGTH):
+    """
+    Rebalance every scope holding a key longer than `length` (or an unranked row).
+    Returns (list_scopes, pin_scopes) rebalanced.
+    """
+    owner_ids = list(
+        _unbalanced(List.objects.all(), length)
+        .order_by("owner_id").values_list("owner_id", flat=True).distinct()
+    )
+    list_ids = list(
+        _unbalanced(Pin.objects.filter(list__isnull=False), length)
+        .order_by("list_id").values_list("list_id", flat=True).distinct()
+    )
+    for owner_id in owner_ids:
+        rebalance(List.objects.filter(owner_id=owner_id))
+    for list_id in list_ids:
+        rebalance(Pin.objects.filter(list_id=list_id))
+    return len(owner_ids), len(list_ids)
@@ -0,0 +1,193 @@
+"""
+Saving a review from the review forms.
+
+`save_review` writes the review, its photos, the 'Visited' pin and the feed activity in
+one transaction with as few statements as it can:
+
+- the existing review (if any) is locked and loaded once, which also gives the stored
+  rating, so none of the receivers that would re-read it run: the review is marked
+  `_saved_by_service` and the profile stats and leaderboard row are updated here, each
+  with one UPDATE, and only when the rating (or a new review) moves them;
+- one query reads everything the 'Visited' pin needs (whether it exists, the author's
+  other pin for the place, the list's last rank, the place's name and score) and at
+  most one pin is written, without Pin signals;
+- photos (spooled multipart uploads, or keys the browser uploaded to directly) go in
+  with one bulk INSERT; storing and resizing them happens off-request
+  (places/photo_jobs.py);
+- the activity is a single INSERT ... ON CONFLICT DO NOTHING against its
+  (type, review) unique constraint.
+
+`on_review_saved` skips reviews saved here and runs the same helpers for reviews saved
+any other way (admin, shell). With DEBUG on, the result carries the wall time and
+number of queries the write took.
+"""
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, OuterRef, Subquery
+
+from . import leaderboards, photo_jobs, ranks
+from .models import List, Photo, Pin, Restaurant, RestaurantScore, Review
+from .system_lists import system_list_id
+
+# Review columns the review forms edit (everything but user and restaurant).
+REVIEW_FIELDS = ("overall_rating", "would_go_again", "food", "service", "value", "atmosphere", "text")
+
+
+class _QueryCounter:
+    """connection.execute_wrapper that counts statements."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def review_values(form):
+    """The review columns from a valid ReviewForm."""
+    return {name: form.cleaned_data.get(name) for name in REVIEW_FIELDS if name in form.cleaned_data}
+
+
+def ensure_visited_pin(review):
+    """
+    Put the reviewed place in the author's 'Visited' list, moving an existing pin there
+    if any. The pin is written without Pin signals: a move applies its profile stats
+    here, and a new pin's trending event is left to the caller. Returns True if a pin
+    was created.
+    """
+    from social import stats  # local import to avoid circular deps
+
+    visited_id = system_list_id(review.user_id, List.VISITED)
+    mine = Pin.objects.filter(user_id=review.user_id, restaurant_id=review.restaurant_id)
+    first = mine.order_by("pk")
+    found = (
+        List.objects.filter(pk=visited_id)
+        .annotate(
+            pinned=Exists(mine.filter(list_id=OuterRef("pk"))),
+            other_id=Subquery(first.values("pk")[:1]),
+            other_list_id=Subquery(first.values("list_id")[:1]),
+            last_rank=Subquery(Pin.objects.filter(list_id=OuterRef("pk")).order_by("-rank").values("rank")[:1]),
+            name=Subquery(Restaurant.objects.filter(pk=review.restaurant_id).values("name")[:1]),
+            top_rated=Subquery(RestaurantScore.objects.filter(pk=review.restaurant_id).values("top_rated")[:1]),
+        )
+        .values("pinned", "other_id", "other_list_id", "last_rank", "name", "top_rated")
+        .get()
+    )
+    if found["pinned"]:
+        return False
+    # A key after Visited's last pin; a moved pin's old key belongs to the other list's order.
+    rank = ranks.keys_after(found["last_rank"], 1)[0]
+    if len(rank) >= ranks.MAX_LENGTH:
+        rank = ranks.append_keys(Pin.objects.filter(list_id=visited_id), 1)[0]
+    if found["other_id"] is not None:
+        Pin.objects.filter(pk=found["other_id"]).update(list_id=visited_id, rank=rank)
+        pin = Pin(pk=found["other_id"], user_id=review.user_id, restaurant_id=review.restaurant_id)
+        stats.pin_changed(pin, before_list_id=found["other_list_id"], after_list_id=visited_id)
+        return False
+    Pin.objects.bulk_create([
+        Pin(
+            user_id=review.user_id,
+            restaurant_id=review.restaurant_id,
+            list_id=visited_id,
+            rank=rank,
+            sort_name=found["name"],
+            sort_rating=found["top_rated"] or 0,
+        )
+    ])
+    return True
+
+
+def upsert_activity(review):
+    """Create the review's feed activity unless it already has one."""
+    from social.models import Activity  # local import to avoid circular deps
+    Activity.objects.bulk_create(
+        [Activity(type="review", user_id=review.user_id, restaurant_id=review.restaurant_id, review=review)],
+        ignore_conflicts=True,
+    )
+
+
+def _save(review, user, restaurant, old_rating):
+    """Insert or update `review`; returns (created, the rating stored before this save)."""
+    if not review._state.adding:
+        review.save()
+        return False, old_rating
+    try:
+        with transaction.atomic():
+            review.save()
+        return True, None
+    except IntegrityError:
+        # Another request (a double submit) created it first: update that row instead.
+        review.pk, old_rating = (
+            Review.objects.select_for_update()
+            .filter(user=user, restaurant=restaurant)
+            .values_list("pk", "overall_rating")
+            .get()
+        )
+        review._state.adding = False
+        review.save()
+        return False, old_rating
+
+
+def save_review(user, restaurant, values, photos=(), photo_keys=(), review=None):
+    """
+    Create or update `user`'s review of `restaurant` with `values` (review field -> value)
+    and attach the uploaded `photos` plus any confirmed direct-upload `photo_keys`. Pass
+    `review` when the caller already holds the row being edited; otherwise the existing
+    review, if there is one, is updated.
+
+    Returns (review, created, debug); `debug` is {"ms": ..., "queries": ...} when
+    settings.DEBUG is on and None otherwise.
+    """
+    from social import stats  # local import to avoid circular deps
+
+    counter = _QueryCounter() if settings.DEBUG else None
+    started = time.perf_counter()
+    with connection.execute_wrapper(counter) if counter else nullcontext():
+        with transaction.atomic():
+            if review is None:
+                review = (
+                    Review.objects.select_for_update().filter(user=user, restaurant=restaurant).first()
+                    or Review(user=user, restaurant=restaurant)
+                )
+                old_rating = None if review._state.adding else review.overall_rating
+            else:
+                # A form-bound instance already holds the new values: lock the row and
+                # read the rating it replaces.
+                old_rating = (
+                    Review.objects.select_for_update()
+                    .filter(pk=review.pk)
+                    .values_list("overall_rating", flat=True)
+                    .first()
+                )
+            for name, value in values.items():
+                setattr(review, name, value)
+            review.user = user
+            review.restaurant = restaurant
+            # The Review receivers leave the pin, activity, stats and scores to us.
+            review._saved_by_service = True
+            created, old_rating = _save(review, user, restaurant, old_rating)
+
+            pinned = ensure_visited_pin(review)
+            leaderboards.review_saved(review, created, old_rating, pinned=pinned)
+            stats.review_saved(review, created, old_rating)
+            upsert_activity(review)
+            new_photos = [
+                Photo(review=review, status=Photo.PROCESSING, spool_name=photo_jobs.spool(photo))
+                for photo in photos
+            ] + [
+                # Already in media storage (direct upload); only resizing is left.
+                Photo(review=review, status=Photo.PROCESSING, image=key)
+                for key in photo_keys
+            ]
+            if new_photos:
+                Photo.objects.bulk_create(new_photos)
+                photo_jobs.enqueue(photo.pk for photo in new_photos)
+
+    debug = None
+    if counter:
+        debug = {"ms": (time.perf_counter() - started) * 1000, "queries": counter.count}
+    return review, created, debug
@@ -1,7 +1,15 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from .models import List, Pin, Review
+from social.friendships import get_friend_ids
+
+from . import leaderboards, list_pages, photo_blobs, ranks, reviews
+from .dedup import name_key
+from .friend_ratings import invalidate_friend_ratings
+from .memberships import invalidate_memberships
+from .models import List, Photo, Pin, Restaurant, Review
+from .system_lists import invalidate_system_lists
 
 
 @receiver(post_save, sender=Review)
@@ -9,33 +17,125 @@ def on_review_saved(sender, instance: Review, created, **kwargs):
     """
     - Ensure the restaurant is in the user's 'Visited' list (create both if needed).
     - Create/refresh an Activity('review') for the feed.
+    Reviews written through places.reviews.save_review do both in the same transaction.
     """
-    user = instance.user
-    r = instance.restaurant
-
-    # Ensure 'Visited' list exists
-    visited, _ = List.objects.get_or_create(owner=user, title="Visited", defaults={"is_public": False})
-
-    # Ensure the restaurant is in the user's 'Visited' list
-    # First, check if there's already a pin in the visited list
-    existing_visited_pin = Pin.objects.filter(user=user, restaurant=r, list=visited).first()
-
-    if not existing_visited_pin:
-        # Check if there are any other pins for this user-restaurant combination
-        other_pins = Pin.objects.filter(user=user, restaurant=r).exclude(list=visited)
-
-        if other_pins.exists():
-            # Move the first existing pin to the visited list
-            pin = other_pins.first()
-            pin.list = visited
-            pin.save(update_fields=["list"])
-        else:
-            # Create a new pin in the visited list
-            Pin.objects.create(user=user, restaurant=r, list=visited)
-
-    # Create or update the review activity
-    from social.models import Activity  # local import to avoid circular deps
-    Activity.objects.update_or_create(
-        type="review", user=user, restaurant=r, review=instance,
-        defaults={}
-    )
+    if getattr(instance, "_saved_by_service", False):
+        return
+    if reviews.ensure_visited_pin(instance):
+        leaderboards.record_event(instance.restaurant_id, leaderboards.PIN_WEIGHT)
+    reviews.upsert_activity(instance)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_friends_ratings_cache(sender, instance: Review, **kwargs):
+    """A review changes what every friend of its author sees in 'Your friends rated this'."""
+    # After commit, so a concurrent read can't cache the pre-commit ratings again.
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_friend_ratings(get_friend_ids(user_id)))
+
+
+@receiver(post_save, sender=Pin)
+@receiver(post_delete, sender=Pin)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_memberships_cache(sender, instance, **kwargs):
+    """Pins and reviews are what the author's cached membership arrays are built from."""
+    if kwargs.get("update_fields") == frozenset({"rank"}):
+        return  # reordering doesn't change membership
+    # After commit, so a concurrent read can't cache the pre-commit memberships again.
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_memberships(user_id))
+
+
+@receiver(post_save, sender=List)
+@receiver(post_delete, sender=List)
+def invalidate_system_lists_cache(sender, instance: List, **kwargs):
+    if instance.is_system:
+        # After commit, so a concurrent read can't cache the pre-commit lists again.
+        owner_id = instance.owner_id
+        transaction.on_commit(lambda: invalidate_system_lists(owner_id))
+
+
+@receiver(pre_save, sender=Restaurant)
+def set_restaurant_name_key(sender, instance: Restaurant, **kwargs):
+    instance.name_key = name_key(instance.name)
+
+
+@receiver(post_delete, sender=Photo)
+def release_photo_blob(sender, instance: Photo, **kwargs):
+    """The stored file is shared; it's only deleted with the last photo using it."""
+    if instance.blob_id:
+        photo_blobs.release(instance.blob_id)
+
+
+# -------------------
+# LEADERBOARDS
+# -------------------
+
+@receiver(post_save, sender=Review)
+def score_review_saved(sender, instance: Review, created, **kwargs):
+    if getattr(instance, "_saved_by_service", False):
+        return  # save_review applies the whole write in one UPDATE
+    if created:
+        leaderboards.record_event(instance.restaurant_id, leaderboards.REVIEW_WEIGHT, instance.created_at)
+    leaderboards.refresh_rating(instance.restaurant_id)
+
+
+@receiver(post_delete, sender=Review)
+def score_review_deleted(sender, instance: Review, **kwargs):
+    leaderboards.record_event(instance.restaurant_id, -leaderboards.REVIEW_WEIGHT, instance.created_at)
+    leaderboards.refresh_rating(instance.restaurant_id, create=False)
+
+
+@receiver(post_save, sender=Pin)
+def score_pin_saved(sender, instance: Pin, created, **kwargs):
+    if created:
+        leaderboards.record_event(instance.restaurant_id, leaderboards.PIN_WEIGHT, instance.created_at)
+
+
+@receiver(post_delete, sender=Pin)
+def score_pin_deleted(sender, instance: Pin, **kwargs):
+    leaderboards.record_event(instance.restaurant_id, -leaderboards.PIN_WEIGHT, instance.created_at)
+
+
+@receiver(post_save, sender=Restaurant)
+def score_restaurant_saved(sender, instance: Restaurant, created, **kwargs):
+    if not created:
+        leaderboards.sync_restaurant(instance)
+
+
+@receiver(post_save, sender=Restaurant)
+def sort_keys_restaurant_saved(sender, instance: Restaurant, created, update_fields=None, **kwargs):
+    """A rename changes where the place sorts in name-ordered list pages."""
+    if created or (update_fields is not None and "name" not in update_fields):
+        return
+    # Writes nothing unless the name changed: pins already holding it are skipped.
+    list_pages.set_sort_name(instance.pk, instance.name)
+
+
+# -------------------
+# RANKS
+# -------------------
+
+@receiver(pre_save, sender=List)
+def rank_new_list(sender, instance: List, **kwargs):
+    """New lists go after the owner's existing ones."""
+    if instance._state.adding and not instance.rank:
+        instance.rank = ranks.append_keys(List.objects.filter(owner_id=instance.owner_id), 1)[0]
+
+
+@receiver(pre_save, sender=Pin)
+def rank_new_pin(sender, instance: Pin, **kwargs):
+    """New pins go at the end of their list."""
+    if instance._state.adding and not instance.rank and instance.list_id:
+        instance.rank = ranks.append_keys(Pin.objects.filter(list_id=instance.list_id), 1)[0]
+
+
+@receiver(pre_save, sender=Pin)
+def sort_keys_new_pin(sender, instance: Pin, **kwargs):
+    """New pins copy the restaurant's name and rating for list page sorts."""
+    if instance._state.adding and not instance.sort_name and instance.restaurant_id:
+        keys = list_pages.sort_keys([instance.restaurant_id]).get(instance.restaurant_id)
+        if keys:
+            instance.sort_name, instance.sort_rating = keys
@@ -0,0 +1,55 @@
+"""
+Per-user ids of the auto-managed "Visited" and "Saved" lists.
+
+System lists are marked by `List.kind` rather than by title, and each kind is unique
+per owner, so a user's kind -> list id map never changes once the lists exist. The map
+is cached per user: the review-save path and profile stats work with a plain list id
+instead of a get_or_create by title or a join on List.title.
+"""
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from .models import List
+
+SYSTEM_LISTS_TTL = 24 * 60 * 60
+SYSTEM_TITLES = {List.VISITED: "Visited", List.SAVED: "Saved"}
+
+
+def _key(user_id):
+    return f"places:system_lists:{user_id}"
+
+
+def get_system_list_ids(user_id):
+    """Return {kind: list_id} for the system lists `user_id` has (missing kinds absent)."""
+    key = _key(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = dict(
+            List.objects.filter(owner_id=user_id, kind__in=List.SYSTEM_KINDS).values_list("kind", "pk")
+        )
+        cache.set(key, ids, SYSTEM_LISTS_TTL)
+    return ids
+
+
+def system_list_id(user_id, kind):
+    """The id of the user's `kind` list, creating the list if they don't have one yet."""
+    list_id = get_system_list_ids(user_id).get(kind)
+    if list_id is None:
+        try:
+            with transaction.atomic():
+                list_id = List.objects.get_or_create(
+                    owner_id=user_id, kind=kind,
+                    defaults={"title": SYSTEM_TITLES[kind], "is_public": False},
+                )[0].pk
+        except IntegrityError:
+            # Created concurrently; the partial unique index guarantees just one.
+            list_id = List.objects.get(owner_id=user_id, kind=kind).pk
+    return list_id
+
+
+def ensure_system_lists(user_id):
+    return {kind: system_list_id(user_id, kind) for kind in List.SYSTEM_KINDS}
+
+
+def invalidate_system_lists(*user_ids):
+    cache.delete_many([_key(uid) for uid in user_ids])
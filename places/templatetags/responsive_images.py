@@ -0,0 +1,92 @@
+"""
+Template tags for the image variants made by places/images.py.
+
+    {% load responsive_images %}
+    {% responsive_image photo.image photo.variants status=photo.status sizes="(min-width: 768px) 33vw, 50vw" placeholder=photo.placeholder alt="Review photo" class="..." %}
+    <img src="{% variant_url profile.avatar profile.avatar_variants "thumb" %}" ...>
+
+`responsive_image` emits a <picture> with an AVIF <source> and a WebP <img> srcset, so
+the browser downloads the smallest variant that fills the slot. The <img> also gets
+`data-full` (largest variant) for the click-to-zoom modals, the variant's width/height
+so the layout doesn't shift, `loading="lazy"` (pass loading="eager" to override) and
+the photo's blurred placeholder as its background until the image paints. Without
+variants both tags fall back to the original upload; photos still processing get a
+"processing" tile, and photos that failed (pass status=photo.status) an "unavailable" one.
+"""
+from django import template
+from django.template.loader import render_to_string
+from django.utils.html import format_html, format_html_join
+
+from places.images import FORMATS
+from places.models import Photo
+
+register = template.Library()
+
+
+def _url(storage, name):
+    return storage.url(name) if name else ""
+
+
+def _srcset(storage, variants, fmt):
+    return ", ".join(
+        f"{storage.url(entry[fmt])} {entry['width']}w"
+        for entry in sorted(variants.values(), key=lambda entry: entry["width"])
+        if entry.get(fmt)
+    )
+
+
+def _largest(variants):
+    return max(variants.values(), key=lambda entry: entry["width"])
+
+
+@register.simple_tag
+def variant_url(field_file, variants, name="card", fmt="webp"):
+    """URL of one variant, or of the original upload if it hasn't been processed."""
+    if not field_file:
+        return ""
+    entry = (variants or {}).get(name)
+    if entry and entry.get(fmt):
+        return _url(field_file.storage, entry[fmt])
+    return field_file.url
+
+
+@register.simple_tag
+def responsive_image(field_file, variants, sizes="100vw", size="card", placeholder="", status="", **attrs):
+    """
+    <picture> for an image field; extra keyword arguments become <img> attributes.
+    Photos still being stored/resized (empty field) render a same-sized "processing" tile;
+    failed ones a same-sized "unavailable" tile.
+    """
+    attrs = {key.replace("_", "-"): value for key, value in attrs.items()}
+    if status == Photo.FAILED:
+        return render_to_string("places/_photo_failed.html", {"class": attrs.get("class", "")})
+    if not field_file:
+        return render_to_string("places/_photo_processing.html", {"class": attrs.get("class", "")})
+    attrs.setdefault("loading", "lazy")
+    attrs.setdefault("decoding", "async")
+    if placeholder:
+        attrs["style"] = f"background: center / cover no-repeat url({placeholder}); {attrs.get('style', '')}".rstrip()
+    if variants:
+        entry = variants.get(size) or _largest(variants)
+        attrs = {"width": entry["width"], "height": entry["height"], **attrs}
+    extra = format_html_join("", ' {}="{}"', attrs.items())
+    if not variants:
+        return format_html(
+            '<img src="{}" data-full="{}"{}>', field_file.url, field_file.url, extra
+        )
+
+    storage = field_file.storage
+    sources = format_html_join(
+        "",
+        '<source type="image/{}" srcset="{}" sizes="{}">',
+        ((fmt, _srcset(storage, variants, fmt), sizes) for fmt in FORMATS if fmt != "webp"),
+    )
+    return format_html(
+        '<picture style="display: contents">{}<img src="{}" srcset="{}" sizes="{}" data-full="{}"{}></picture>',
+        sources,
+        variant_url(field_file, variants, size),
+        _srcset(storage, variants, "webp"),
+        sizes,
+        _url(storage, _largest(variants).get("webp")),
+        extra,
+    )
@@ -7,6 +7,7 @@ app_name = "places"
 urlpatterns = [
     path("", views.home, name="home"),
     path("discover/", views.discover, name="discover"),
+    path("trending/", views.trending, name="trending"),
     path("my/", views.my_restaurants, name="my_restaurants"),
     path("review/", views.review_tab, name="review_tab"),
     path("r/<int:pk>/", views.restaurant_detail, name="restaurant_detail"),
@@ -14,7 +15,10 @@ urlpatterns = [
     path("r/<int:pk>/review/", views.review_create_for_restaurant, name="review_for_restaurant"),
     path("review/<int:pk>/edit/", views.review_edit, name="review_edit"),
     path("review/thanks/", views.review_thanks, name="review_thanks"),
+    path("review/import/", views.import_history, name="import_history"),
     path("photo/<int:pk>/delete/", views.photo_delete, name="photo_delete"),
+    path("photo/upload-url/", views.photo_upload_url, name="photo_upload_url"),
+    path("photo/upload/<str:token>/", views.photo_upload_local, name="photo_upload_local"),
     
     # Lists
     path("list/<int:list_id>/", views.list_detail, name="list_detail"),
@@ -25,6 +29,9 @@ urlpatterns = [
     path("r/<int:pk>/list-picker/", views.list_picker, name="list_picker"),
     path("r/<int:pk>/toggle-in-list/<int:list_id>/", views.toggle_in_list, name="toggle_in_list"),
     
+    # Staff exports
+    path("export/<str:dataset>/", views.export_data, name="export"),
+
     # API endpoints
     path("api/restaurants/autocomplete/", views.restaurant_autocomplete, name="restaurant_autocomplete"),
 ]
@@ -1,29 +1,38 @@
 import os
 
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.paginator import Paginator
 from django.db import models
 from django.db.models import Q
-from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
-from django.views.decorators.http import require_http_methods
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods, require_POST
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 
-from .forms import ReviewForm
-from .models import List, Photo, Pin, Restaurant, Review
+from social.friendships import are_friends
+
+from . import bulk_lists, direct_uploads, exports, history_import, leaderboards, list_pages, ranks
+from .forms import HistoryImportForm, ReviewForm
+from .friend_ratings import annotate_friend_ratings, get_friend_ratings
+from .list_summaries import annotate_list_summaries
+from .memberships import annotate_memberships, get_memberships
+from .models import HistoryImport, List, Photo, Pin, Restaurant, RestaurantScore, Review
+from .reviews import review_values, save_review
+
+DISCOVER_PAGE_SIZE = 48
 
 
 def home(request):
     # optional: show some recent restaurants
     restaurants = list(Restaurant.objects.order_by("-id")[:24])
-    pinned_ids = set()
-    if request.user.is_authenticated:
-        pinned_ids = set(
-            Pin.objects.filter(user=request.user, restaurant__in=restaurants)
-            .values_list("restaurant_id", flat=True)
-        )
-    for r in restaurants:
-        r.is_pinned = r.id in pinned_ids
+    annotate_memberships(request.user, restaurants)
+    annotate_friend_ratings(request.user, restaurants)
     return render(
         request,
         "places/home.html",
@@ -57,7 +66,11 @@ def restaurant_detail(request, pk):
     return render(
         request,
         "places/restaurant_detail.html",
-        {"r": r, "reviews": reviews},
+        {
+            "r": r,
+            "reviews": reviews,
+            "friend_rating": get_friend_ratings(request.user, [r.id]).get(r.id),
+        },
     )
 
 
@@ -75,20 +88,12 @@ def toggle_pin(request, pk):
 
 @login_required
 def my_restaurants(request):
-    all_lists = list(
-        List.objects.filter(owner=request.user)
-        .prefetch_related("pins__restaurant")
-        .order_by("title")
+    all_lists = annotate_list_summaries(
+        List.objects.filter(owner=request.user).order_by("rank", "id")
     )
-
-    def norm(s: str) -> str:
-        return (s or "").strip().lower()
-
-    visited = next((lst for lst in all_lists if norm(lst.title) == "visited"), None)
-    # Treat either “Saved” or your earlier “Want to go” as the default saved list
-    saved = next((lst for lst in all_lists if norm(lst.title) in {"saved", "want to go"}), None)
-
-    custom_lists = [lst for lst in all_lists if lst not in {visited, saved}]
+    visited = next((lst for lst in all_lists if lst.kind == List.VISITED), None)
+    saved = next((lst for lst in all_lists if lst.kind == List.SAVED), None)
+    custom_lists = [lst for lst in all_lists if not lst.is_system]
 
     return render(
         request,
@@ -115,6 +120,10 @@ def discover(request):
         ).order_by("-id")
     else:
         restaurants = Restaurant.objects.order_by("-id")
+    # Only the cards on this page are rendered, so only they get per-viewer annotations.
+    page = Paginator(restaurants, DISCOVER_PAGE_SIZE).get_page(request.GET.get("page"))
+    restaurants = annotate_friend_ratings(request.user, list(page.object_list))
+    annotate_memberships(request.user, restaurants)
 
     # Get restaurants with coordinates for the map
     restaurants_with_coords = Restaurant.objects.filter(
@@ -127,6 +136,7 @@ def discover(request):
         "places/discover.html",
         {
             "restaurants": restaurants,
+            "page": page,
             "restaurants_with_coords": restaurants_with_coords,
             "active_tab": "discover",
             "search_query": search_query,
@@ -135,37 +145,69 @@ def discover(request):
     )
 
 
+def trending(request):
+    """Trending / top-rated leaderboards, optionally per city and category."""
+    board = request.GET.get("board", "trending")
+    city = request.GET.get("city", "").strip()
+    category = request.GET.get("category", "").strip()
+
+    if board == "top_rated":
+        restaurants = leaderboards.top_rated(city=city, category=category, limit=24)
+    else:
+        board = "trending"
+        restaurants = leaderboards.trending(city=city, category=category, limit=24)
+    annotate_friend_ratings(request.user, restaurants)
+    annotate_memberships(request.user, restaurants)
+
+    cities = (
+        RestaurantScore.objects.exclude(city="")
+        .order_by("city")
+        .values_list("city", flat=True)
+        .distinct()
+    )
+
+    return render(
+        request,
+        "places/trending.html",
+        {
+            "restaurants": restaurants,
+            "board": board,
+            "city": city,
+            "category": category,
+            "cities": cities,
+            "categories": Restaurant.CATEGORY_CHOICES,
+            "active_tab": "discover",
+        },
+    )
+
+
 # -------------------
 # REVIEWS
 # -------------------
 
+def _with_server_timing(response, debug):
+    """In DEBUG, report save_review's timing to the browser's network panel."""
+    if debug:
+        response["Server-Timing"] = f'review;dur={debug["ms"]:.1f};desc="{debug["queries"]} queries"'
+    return response
+
+
 @login_required
 def review_tab(request):
     """Center tab: create a review and see recent reviews by the user."""
     if request.method == "POST":
         form = ReviewForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
-            # One review per user per restaurant
-            review, _created = Review.objects.update_or_create(
-                user=request.user,
-                restaurant=form.cleaned_data["restaurant"],
-                defaults={
-                    "overall_rating": form.cleaned_data["overall_rating"],
-                    "food": form.cleaned_data.get("food"),
-                    "service": form.cleaned_data.get("service"),
-                    "value": form.cleaned_data.get("value"),
-                    "atmosphere": form.cleaned_data.get("atmosphere"),
-                    "text": form.cleaned_data.get("text", ""),
-                },
+            # One review per user per restaurant: updates the existing one if any
+            _review, _created, debug = save_review(
+                request.user,
+                form.cleaned_data["restaurant"],
+                review_values(form),
+                photos=request.FILES.getlist('photos'),
+                photo_keys=form.cleaned_data["photo_keys"],
             )
-
-            # Handle photo uploads
-            photos = request.FILES.getlist('photos')
-            for photo in photos:
-                Photo.objects.create(review=review, image=photo)
-
             messages.success(request, "Review saved!")
-            return redirect("places:review_thanks")
+            return _with_server_timing(redirect("places:review_thanks"), debug)
     else:
         form = ReviewForm(user=request.user)
 
@@ -191,18 +233,16 @@ def review_create_for_restaurant(request, pk):
     if request.method == "POST":
         form = ReviewForm(request.POST, request.FILES, instance=instance, user=request.user)
         if form.is_valid():
-            review = form.save(commit=False)
-            review.user = request.user
-            review.restaurant = restaurant
-            review.save()
-
-            # Handle photo uploads
-            photos = request.FILES.getlist('photos')
-            for photo in photos:
-                Photo.objects.create(review=review, image=photo)
-
+            _review, _created, debug = save_review(
+                request.user,
+                restaurant,
+                review_values(form),
+                photos=request.FILES.getlist('photos'),
+                photo_keys=form.cleaned_data["photo_keys"],
+                review=instance,
+            )
             messages.success(request, "Review saved!")
-            return redirect("places:review_thanks")
+            return _with_server_timing(redirect("places:review_thanks"), debug)
     else:
         form = ReviewForm(instance=instance, user=request.user)
         form.fields["restaurant"].initial = restaurant
@@ -223,15 +263,16 @@ def review_edit(request, pk):
     if request.method == "POST":
         form = ReviewForm(request.POST, request.FILES, instance=review, user=request.user)
         if form.is_valid():
-            form.save()
-
-            # Handle new photo uploads
-            photos = request.FILES.getlist('photos')
-            for photo in photos:
-                Photo.objects.create(review=review, image=photo)
-
+            _review, _created, debug = save_review(
+                request.user,
+                form.cleaned_data["restaurant"],
+                review_values(form),
+                photos=request.FILES.getlist('photos'),
+                photo_keys=form.cleaned_data["photo_keys"],
+                review=review,
+            )
             messages.success(request, "Review updated!")
-            return redirect("feed")
+            return _with_server_timing(redirect("feed"), debug)
     else:
         form = ReviewForm(instance=review, user=request.user)
         # Lock the restaurant field since we're editing an existing review
@@ -255,18 +296,57 @@ def photo_delete(request, pk):
 
     return JsonResponse({"success": False, "error": "Invalid request method"})
 
+# -------------------
+# PHOTO UPLOADS
+# -------------------
+
+@login_required
+@require_POST
+def photo_upload_url(request):
+    """Where to send one photo directly (presigned S3 POST, or the local PUT fallback)."""
+    try:
+        target = direct_uploads.upload_target(
+            request.user, request.POST.get("content_type", ""), int(request.POST.get("size") or 0)
+        )
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse(target)
+
+
+@csrf_exempt
+@require_http_methods(["PUT"])
+def photo_upload_local(request, token):
+    """Filesystem stand-in for a presigned upload URL; the signed token is the authorisation."""
+    try:
+        key, size = direct_uploads.load_local_token(token)
+    except signing.BadSignature:
+        return HttpResponseForbidden("Invalid or expired upload URL")
+    if int(request.headers.get("Content-Length") or 0) != size:
+        return HttpResponseBadRequest("Size mismatch")
+    if default_storage.exists(key):
+        return HttpResponseBadRequest("Already uploaded")
+    default_storage.save(key, File(request, name=key))
+    return HttpResponse(status=201)
+
+
 # -------------------
 # LISTS
 # -------------------
 
+def _list_picker_context(user, r):
+    return {
+        "r": r,
+        "lists": List.objects.filter(owner=user).order_by("title"),
+        # which lists already contain this restaurant
+        "present": get_memberships(user).lists_with(r.id),
+    }
+
+
 @login_required
 def list_picker(request, pk):
     """Return a small modal with the user's lists and add/remove toggles for this restaurant."""
     r = get_object_or_404(Restaurant, pk=pk)
-    lists = List.objects.filter(owner=request.user).order_by("title").prefetch_related("pins")
-    # which lists already contain this restaurant
-    present = set(Pin.objects.filter(list__in=lists, restaurant=r).values_list("list_id", flat=True))
-    return render(request, "places/_list_picker.html", {"r": r, "lists": lists, "present": present})
+    return render(request, "places/_list_picker.html", _list_picker_context(request.user, r))
 
 @login_required
 def toggle_in_list(request, pk, list_id):
@@ -308,12 +388,8 @@ def create_list(request):
             if restaurant_id:
                 # If called from list picker, show errors in the list picker context
                 r = get_object_or_404(Restaurant, pk=restaurant_id)
-                lists = List.objects.filter(owner=request.user).order_by("title").prefetch_related("pins")
-                present = set(Pin.objects.filter(list__in=lists, restaurant=r).values_list("list_id", flat=True))
                 return render(request, "places/_list_picker.html", {
-                    "r": r,
-                    "lists": lists,
-                    "present": present,
+                    **_list_picker_context(request.user, r),
                     "create_errors": errors,
                     "create_title_value": title,
                     "create_is_public_value": is_public,
@@ -332,9 +408,7 @@ def create_list(request):
         if restaurant_id:
             # If called from list picker, refresh the list picker instead of redirecting
             r = get_object_or_404(Restaurant, pk=restaurant_id)
-            lists = List.objects.filter(owner=request.user).order_by("title").prefetch_related("pins")
-            present = set(Pin.objects.filter(list__in=lists, restaurant=r).values_list("list_id", flat=True))
-            return render(request, "places/_list_picker.html", {"r": r, "lists": lists, "present": present})
+            return render(request, "places/_list_picker.html", _list_picker_context(request.user, r))
         else:
             # HTMX redirect so the page changes without reloading everything
             resp = HttpResponse("")
@@ -345,32 +419,46 @@ def create_list(request):
     return render(request, "places/_list_create_modal.html")
 @login_required
 def list_detail(request, list_id):
-    # First try to get the list
+    """List contents, one keyset page at a time; HTMX "load more" gets just the next page."""
     lst = get_object_or_404(List, pk=list_id)
 
-    # Check permissions
-    if lst.owner == request.user:
-        # User owns the list - can view it
-        pass
-    elif lst.is_public:
-        # List is public - anyone can view it
+    # Owners see everything, anyone sees public lists, friends see private ones
+    if (
+        lst.owner_id != request.user.id
+        and not lst.is_public
+        and not are_friends(request.user.id, lst.owner_id)
+    ):
+        raise Http404("List not found")
+
+    origin = None
+    try:
+        origin = (float(request.GET["lat"]), float(request.GET["lng"]))
+    except (KeyError, ValueError):
         pass
-    else:
-        # List is private and user doesn't own it - check if they're friends
-        from social.models import Friend
-        friendship = Friend.objects.filter(
-            Q(requesting_user=request.user, target_user=lst.owner, status='accepted') |
-            Q(requesting_user=lst.owner, target_user=request.user, status='accepted')
-        ).first()
-
-        if not friendship:
-            # Not friends and list is private - deny access
-            from django.http import Http404
-            raise Http404("List not found")
-
-    items = (Pin.objects.select_related("restaurant")
-             .filter(list=lst).order_by("-created_at"))
-    return render(request, "places/list_detail.html", {"lst": lst, "items": items})
+
+    try:
+        items, next_cursor, sort = list_pages.page(
+            lst,
+            sort=request.GET.get("sort", list_pages.DEFAULT_SORT),
+            after=request.GET.get("after"),
+            origin=origin,
+        )
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor")
+
+    context = {
+        "lst": lst,
+        "items": items,
+        "next_cursor": next_cursor,
+        "sort": sort,
+        "sort_choices": list_pages.SORT_CHOICES,
+        "origin": origin,
+        # Drag-and-drop only makes sense while viewing the owner's own order
+        "reorderable": sort == "custom" and lst.owner_id == request.user.id,
+    }
+    if request.htmx and request.GET.get("after"):
+        return render(request, "places/_list_items.html", context)
+    return render(request, "places/list_detail.html", context)
 
 @login_required
 def delete_pin(request, list_id, pin_id):
@@ -432,7 +520,7 @@ def delete_list(request, list_id):
     lst = get_object_or_404(List, pk=list_id, owner=request.user)
 
     # Don't allow deletion of default lists
-    if lst.title.lower() in ['visited', 'saved', 'want to go']:
+    if lst.is_system:
         return HttpResponseBadRequest("Cannot delete default lists")
 
     lst.delete()
@@ -445,6 +533,180 @@ def delete_list(request, list_id):
     return redirect("my_restaurants")
 
 
+# -------------------
+# REORDERING
+# -------------------
+
+def _posted_neighbours(request):
+    """(before_id, after_id) from POST; either may be blank for an end of the order."""
+    return tuple(
+        int(request.POST[name]) if request.POST.get(name) else None
+        for name in ("before_id", "after_id")
+    )
+
+
+@login_required
+@require_POST
+def reorder_list(request, list_id):
+    """Drop a list between two of the user's other lists; writes only the moved row."""
+    lst = get_object_or_404(List, pk=list_id, owner=request.user)
+    try:
+        before_id, after_id = _posted_neighbours(request)
+        rank = ranks.move(lst, List.objects.filter(owner=request.user), before_id, after_id)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid neighbours")
+    return JsonResponse({"rank": rank})
+
+
+@login_required
+@require_POST
+def reorder_pin(request, list_id, pin_id):
+    """Drop a pin between two others in the same list; writes only the moved row."""
+    lst = get_object_or_404(List, pk=list_id, owner=request.user)
+    pin = get_object_or_404(Pin, pk=pin_id, list=lst)
+    try:
+        before_id, after_id = _posted_neighbours(request)
+        rank = ranks.move(pin, Pin.objects.filter(list=lst), before_id, after_id)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid neighbours")
+    return JsonResponse({"rank": rank})
+
+
+# -------------------
+# BULK LIST OPERATIONS
+# -------------------
+
+def _posted_ids(request, name):
+    """Distinct integer ids from a repeated POST field; raises ValueError on junk."""
+    return list(dict.fromkeys(int(v) for v in request.POST.getlist(name)))
+
+
+def _owned_list_ids(user, list_ids):
+    """The ids unchanged if the user owns every list, else 404."""
+    owned = set(List.objects.filter(owner=user, pk__in=list_ids).values_list("pk", flat=True))
+    if not list_ids or owned != set(list_ids):
+        raise Http404("List not found")
+    return list_ids
+
+
+def _posted_restaurant_ids(request):
+    ids = _posted_ids(request, "restaurant_ids")
+    if len(ids) > bulk_lists.MAX_RESTAURANTS:
+        raise ValueError(f"At most {bulk_lists.MAX_RESTAURANTS} restaurants per request")
+    # Unknown ids are dropped rather than failing the whole batch on the FK.
+    return list(Restaurant.objects.filter(pk__in=ids).values_list("pk", flat=True))
+
+
+@login_required
+@require_POST
+def bulk_add_to_lists(request):
+    """Add many restaurants (restaurant_ids) to many of the user's lists (list_ids)."""
+    try:
+        list_ids = _owned_list_ids(request.user, _posted_ids(request, "list_ids"))
+        restaurant_ids = _posted_restaurant_ids(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e) or "Invalid ids")
+    created = bulk_lists.add_to_lists(request.user, list_ids, restaurant_ids)
+    return JsonResponse({"created": created})
+
+
+@login_required
+@require_POST
+def bulk_remove_from_lists(request):
+    """Remove many restaurants (restaurant_ids) from many of the user's lists (list_ids)."""
+    try:
+        list_ids = _owned_list_ids(request.user, _posted_ids(request, "list_ids"))
+        restaurant_ids = _posted_ids(request, "restaurant_ids")
+    except ValueError:
+        return HttpResponseBadRequest("Invalid ids")
+    deleted = bulk_lists.remove_from_lists(request.user, list_ids, restaurant_ids)
+    return JsonResponse({"deleted": deleted})
+
+
+@login_required
+@require_POST
+def move_list_pins(request, list_id):
+    """Move pins to target_list_id; only restaurant_ids if given, otherwise the whole list."""
+    try:
+        target_id = int(request.POST.get("target_list_id", ""))
+        restaurant_ids = _posted_ids(request, "restaurant_ids") or None
+    except ValueError:
+        return HttpResponseBadRequest("Invalid ids")
+    if target_id == list_id:
+        return HttpResponseBadRequest("Source and target are the same list")
+    _owned_list_ids(request.user, [list_id, target_id])
+    moved = bulk_lists.move_pins(request.user, list_id, target_id, restaurant_ids)
+    return JsonResponse({"moved": moved})
+
+
+@login_required
+@require_POST
+def copy_list(request, list_id):
+    """Copy a list the user can see into a new list of their own called `title`."""
+    source = get_object_or_404(List, pk=list_id)
+    if source.owner_id != request.user.id and not source.is_public:
+        raise Http404("List not found")
+
+    title = (request.POST.get("title") or "").strip()
+    if not title:
+        return HttpResponseBadRequest("Please enter a name.")
+    if List.objects.filter(owner=request.user, title=title).exists():
+        return HttpResponseBadRequest("You already have a list with this name.")
+    is_public = request.POST.get("is_public") == "on" if "is_public" in request.POST else None
+
+    new_list, copied = bulk_lists.copy_list(request.user, source, title, is_public)
+    return JsonResponse({
+        "list_id": new_list.id,
+        "copied": copied,
+        "url": reverse("list_detail", args=[new_list.id]),
+    })
+
+
+@login_required
+@require_POST
+def merge_lists(request, list_id):
+    """Merge source_list_ids into this list and delete them."""
+    try:
+        source_ids = [i for i in _posted_ids(request, "source_list_ids") if i != list_id]
+    except ValueError:
+        return HttpResponseBadRequest("Invalid ids")
+    _owned_list_ids(request.user, [list_id, *source_ids])
+    if List.objects.filter(pk__in=source_ids).exclude(kind=List.CUSTOM).exists():
+        return HttpResponseBadRequest("Cannot merge away default lists")
+    moved = bulk_lists.merge_lists(request.user, source_ids, list_id)
+    return JsonResponse({"moved": moved})
+
+
+@login_required
+def import_history(request):
+    """Upload reviews and saved places from another app; imported in the background."""
+    if request.method == "POST":
+        form = HistoryImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            job = form.save(commit=False)
+            job.user = request.user
+            job.save()
+            history_import.enqueue(job.pk)
+            messages.success(request, "Import started. We'll fill in your reviews and lists shortly.")
+            return redirect("places:import_history")
+    else:
+        form = HistoryImportForm()
+
+    imports = HistoryImport.objects.filter(user=request.user)[:10]
+    # Re-rendered by htmx polling while an import is still going.
+    template = "places/_history_imports.html" if request.htmx else "places/import_history.html"
+    return render(
+        request,
+        template,
+        {
+            "form": form,
+            "imports": imports,
+            "in_progress": any(job.status in (HistoryImport.PENDING, HistoryImport.RUNNING) for job in imports),
+            "active_tab": "review",
+        },
+    )
+
+
 @login_required
 def review_thanks(request):
     """Thank you page after posting a review with auto-redirect to home feed."""
@@ -461,8 +723,12 @@ def review_thanks(request):
 
 @require_http_methods(["GET"])
 def restaurant_autocomplete(request):
-    """API endpoint for restaurant autocomplete search."""
+    """
+    API endpoint for restaurant autocomplete search.
+    The map needs coordinates; pickers pass ?coords=0 to search every restaurant.
+    """
     query = request.GET.get('q', '').strip()
+    require_coords = request.GET.get('coords', '1') != '0'
     
     if len(query) < 2:
         return JsonResponse({'restaurants': []})
@@ -472,10 +738,13 @@ def restaurant_autocomplete(request):
         Q(cuisine__icontains=query) |
         Q(city__icontains=query) |
         Q(address__icontains=query)
-    ).filter(
-        lat__isnull=False, 
-        lng__isnull=False
-    ).exclude(lat=0, lng=0)[:10]  # Limit to 10 results
+    )
+    if require_coords:
+        restaurants = restaurants.filter(
+            lat__isnull=False, 
+            lng__isnull=False
+        ).exclude(lat=0, lng=0)
+    restaurants = restaurants[:10]  # Limit to 10 results
     
     results = []
     for restaurant in restaurants:
@@ -485,9 +754,28 @@ def restaurant_autocomplete(request):
             'cuisine': restaurant.cuisine or '',
             'address': restaurant.address or '',
             'city': restaurant.city or '',
-            'lat': float(restaurant.lat),
-            'lng': float(restaurant.lng),
+            'lat': float(restaurant.lat) if restaurant.lat is not None else None,
+            'lng': float(restaurant.lng) if restaurant.lng is not None else None,
             'url': reverse('places:restaurant_detail', args=[restaurant.id])
         })
     
     return JsonResponse({'restaurants': results})
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def export_data(request, dataset):
+    """Staff download of one dataset, streamed; ?format=csv|jsonl&gzip=1 (see places/exports.py)."""
+    if dataset not in exports.DATASETS:
+        raise Http404("Unknown dataset")
+    fmt = request.GET.get("format", "csv")
+    if fmt not in exports.FORMATS:
+        return HttpResponseBadRequest("format must be csv or jsonl")
+    compress = request.GET.get("gzip") in {"1", "true", "yes"}
+
+    response = StreamingHttpResponse(
+        exports.export(dataset, fmt, compress),
+        content_type="application/gzip" if compress else exports.content_type(fmt),
+    )
+    response["Content-Disposition"] = f'attachment; filename="{exports.filename(dataset, fmt, compress)}"'
+    return response
@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib.auth import get_user_model
 
+from places.forms import RestaurantAutocompleteSelectMultiple
+
 from .models import Profile
 
 User = get_user_model()
@@ -49,9 +51,9 @@ class ProfileForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Allow selection from all restaurants
+        # Allow selection from all restaurants; only submitted ids are looked up
         from places.models import Restaurant
-        self.fields['favorite_spots'].queryset = Restaurant.objects.all().order_by('name')
+        self.fields['favorite_spots'].queryset = Restaurant.objects.all()
 
     def clean_favorite_spots(self):
         spots = self.cleaned_data.get('favorite_spots')
@@ -67,6 +69,6 @@ class ProfileForm(forms.ModelForm):
             "bio":          forms.Textarea(attrs={"class": "w-full border rounded-xl px-3 py-2", "rows": 4}),
             "location":     forms.TextInput(attrs={"class": "w-full border rounded-xl px-3 py-2"}),
             "website":      forms.URLInput(attrs={"class": "w-full border rounded-xl px-3 py-2"}),
-            "favorite_spots": forms.SelectMultiple(attrs={"class": "w-full border rounded-xl px-3 py-2", "size": "5"}),
+            "favorite_spots": RestaurantAutocompleteSelectMultiple(attrs={"class": "w-full border rounded-xl px-3 py-2", "size": "5"}),
             # avatar uses default file input
         }
@@ -0,0 +1,41 @@
+"""Cached lookups over accepted friendships.
+
+`Friend` rows can point either way, so "who are my friends" is an OR query over both
+columns. Views ask it on almost every page, so the resulting id set is cached per user
+and dropped from signals whenever a friendship row changes.
+"""
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import Friend
+
+FRIEND_IDS_TTL = 60 * 60
+
+
+def _friend_ids_key(user_id):
+    return f"social:friend_ids:{user_id}"
+
+
+def get_friend_ids(user_id):
+    """Return a frozenset of user ids with an accepted friendship with `user_id`."""
+    key = _friend_ids_key(user_id)
+    friend_ids = cache.get(key)
+    if friend_ids is None:
+        pairs = Friend.objects.filter(
+            Q(requesting_user_id=user_id) | Q(target_user_id=user_id),
+            status="accepted",
+        ).values_list("requesting_user_id", "target_user_id")
+        friend_ids = frozenset(
+            target_id if requesting_id == user_id else requesting_id
+            for requesting_id, target_id in pairs
+        )
+        cache.set(key, friend_ids, FRIEND_IDS_TTL)
+    return friend_ids
+
+
+def are_friends(user_id, other_id):
+    return other_id in get_friend_ids(user_id)
+
+
+def invalidate_friend_ids(*user_ids):
+    cache.delete_many([_friend_ids_key(uid) for uid in user_ids])
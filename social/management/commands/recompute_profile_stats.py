@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from social import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized profile stats (reviews, average rating, saved spots) from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Only recompute for this user id (can be repeated)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Profiles per bulk update'
+        )
+
+    def handle(self, *args, **options):
+        updated = stats.recompute(options['user_ids'], batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Recomputed stats for {updated} profiles')
+        )
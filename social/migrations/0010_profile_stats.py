@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:45
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_profile_stats(apps, schema_editor):
+    Profile = apps.get_model("social", "Profile")
+    Review = apps.get_model("places", "Review")
+    Pin = apps.get_model("places", "Pin")
+
+    review_totals = {
+        row["user_id"]: (row["n"], row["total"])
+        for row in Review.objects.order_by().values("user_id").annotate(n=Count("id"), total=Sum("overall_rating"))
+    }
+    saved_totals = dict(
+        Pin.objects.exclude(list__title="Visited").order_by()
+        .values("user_id").annotate(n=Count("restaurant", distinct=True))
+        .values_list("user_id", "n")
+    )
+    profiles = list(Profile.objects.all())
+    for profile in profiles:
+        profile.spots_reviewed_count, profile.rating_sum = review_totals.get(profile.user_id, (0, 0))
+        profile.spots_saved_count = saved_totals.get(profile.user_id, 0)
+    Profile.objects.bulk_update(
+        profiles, ["spots_reviewed_count", "rating_sum", "spots_saved_count"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0007_restaurantscore'),
+        ('social', '0009_notification_comment_like_notification_like_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='spots_reviewed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='spots_saved_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_profile_stats, migrations.RunPython.noop),
+    ]
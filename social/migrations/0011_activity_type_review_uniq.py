@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:03
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_activities(apps, schema_editor):
+    """Fold repeated (type, review) activities into the oldest one, keeping their comments and likes."""
+    Activity = apps.get_model("social", "Activity")
+    Comment = apps.get_model("social", "Comment")
+    Like = apps.get_model("social", "Like")
+    Notification = apps.get_model("social", "Notification")
+    groups = (
+        Activity.objects.filter(review__isnull=False)
+        .values("type", "review_id")
+        .annotate(n=Count("id"), keep=Min("id"))
+        .filter(n__gt=1)
+    )
+    for group in groups:
+        keep = group["keep"]
+        dupes = Activity.objects.filter(type=group["type"], review_id=group["review_id"]).exclude(pk=keep)
+        for dupe_id in list(dupes.values_list("pk", flat=True)):
+            Comment.objects.filter(activity_id=dupe_id).update(activity_id=keep)
+            Notification.objects.filter(activity_id=dupe_id).update(activity_id=keep)
+            liked = Like.objects.filter(activity_id=keep).values("user_id")
+            Like.objects.filter(activity_id=dupe_id).exclude(user_id__in=liked).update(activity_id=keep)
+        dupes.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0010_list_kind'),
+        ('social', '0010_profile_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_activities, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='activity',
+            constraint=models.UniqueConstraint(condition=models.Q(('review__isnull', False)), fields=('type', 'review'), name='activity_type_review_uniq'),
+        ),
+    ]
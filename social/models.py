@@ -89,6 +89,14 @@ class Activity(models.Model):
 
     class Meta:
         ordering = ("-created_at",)
+        constraints = [
+            # Lets places.reviews upsert a review's activity with one INSERT ... ON CONFLICT.
+            models.UniqueConstraint(
+                fields=["type", "review"],
+                condition=models.Q(review__isnull=False),
+                name="activity_type_review_uniq",
+            ),
+        ]
 
 class Like(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -175,32 +183,25 @@ class Profile(models.Model):
     location = models.CharField(max_length=80, blank=True)
     website = models.URLField(blank=True)
     avatar = models.ImageField(upload_to="avatars/", blank=True, null=True)
+    # Resized WebP/AVIF copies of `avatar`; see places/images.py
+    avatar_variants = models.JSONField(default=dict, blank=True)
 
     # New Goodreads-style fields
     favorite_cuisines = models.JSONField(default=list, blank=True, help_text="List of favorite cuisine types")
     favorite_spots = models.ManyToManyField("places.Restaurant", blank=True, related_name="favorite_of", limit_choices_to={'id__in': []})
 
+    # Denormalized stats, kept in step by social.stats from review/pin signals.
+    # `manage.py recompute_profile_stats` rebuilds them from scratch.
+    spots_reviewed_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    spots_saved_count = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return f"Profile({self.user.username})"
 
     @property
     def avg_rating(self):
-        """Calculate average rating from user's reviews"""
-        from places.models import Review
-        reviews = Review.objects.filter(user=self.user, overall_rating__isnull=False)
-        if not reviews.exists():
+        """Average overall rating across the user's reviews"""
+        if not self.spots_reviewed_count:
             return None
-        return round(reviews.aggregate(avg=models.Avg('overall_rating'))['avg'], 1)
-
-    @property
-    def spots_reviewed_count(self):
-        """Count of spots reviewed by user"""
-        from places.models import Review
-        return Review.objects.filter(user=self.user).count()
-
-    @property
-    def spots_saved_count(self):
-        """Count of unique spots saved in lists (excluding 'Visited' list)"""
-        from places.models import Pin
-        # Get all unique restaurants that this user has pinned to any list EXCEPT 'Visited'
-        return Pin.objects.filter(user=self.user).exclude(list__title='Visited').values('restaurant').distinct().count()
+        return round(self.rating_sum / self.spots_reviewed_count, 1)
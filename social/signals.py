@@ -1,11 +1,17 @@
 # social/signals.py
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from places.models import List
+from places import leaderboards
+from places.friend_ratings import invalidate_friend_ratings
+from places.models import Pin, Review
+from places.system_lists import ensure_system_lists
 
-from .models import CommentLike, Like, Notification, Profile
+from . import stats
+from .friendships import invalidate_friend_ids
+from .models import CommentLike, Friend, Like, Notification, Profile
 
 User = get_user_model()
 
@@ -14,8 +20,21 @@ def ensure_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.get_or_create(user=instance)
         # Default lists
-        for title in ["Visited", "Saved"]:
-            List.objects.get_or_create(owner=instance, title=title, defaults={"is_public": False})
+        ensure_system_lists(instance.id)
+
+
+@receiver(post_save, sender=Friend)
+@receiver(post_delete, sender=Friend)
+def on_friendship_changed(sender, instance, **kwargs):
+    """Drop cached friend sets (and anything derived from them) for both sides."""
+    user_ids = (instance.requesting_user_id, instance.target_user_id)
+
+    def invalidate():
+        invalidate_friend_ids(*user_ids)
+        invalidate_friend_ratings(user_ids)
+
+    # After commit, so a concurrent read can't cache the pre-commit state again.
+    transaction.on_commit(invalidate)
 
 
 @receiver(post_save, sender=Like)
@@ -50,3 +69,69 @@ def create_comment_like_notification(sender, instance, created, **kwargs):
         else:
             # Debug: Log self-like to help troubleshoot
             print(f"DEBUG: Self-like prevented - User {instance.user.username} liked their own comment")
+
+
+@receiver(post_save, sender=Like)
+def score_like_saved(sender, instance, created, **kwargs):
+    """A like on a review counts towards the reviewed restaurant's trending score."""
+    if created:
+        leaderboards.record_event(instance.activity.restaurant_id, leaderboards.LIKE_WEIGHT, instance.created_at)
+
+
+@receiver(post_delete, sender=Like)
+def score_like_deleted(sender, instance, **kwargs):
+    leaderboards.record_event(instance.activity.restaurant_id, -leaderboards.LIKE_WEIGHT, instance.created_at)
+
+
+# ---------- Profile stats ----------
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, update_fields=None, **kwargs):
+    """Edits only move rating_sum by the difference, so note the stored rating first."""
+    if getattr(instance, "_saved_by_service", False):
+        return  # save_review read it from the locked row and updates the stats itself
+    if update_fields is not None and "overall_rating" not in update_fields:
+        # The stored rating isn't being written, so there is no difference to apply.
+        instance._stats_old_rating = instance.overall_rating
+    elif not instance._state.adding:
+        instance._stats_old_rating = (
+            Review.objects.filter(pk=instance.pk).values_list("overall_rating", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def update_stats_on_review_saved(sender, instance, created, **kwargs):
+    if getattr(instance, "_saved_by_service", False):
+        return
+    stats.review_saved(instance, created, getattr(instance, "_stats_old_rating", None))
+
+
+@receiver(post_delete, sender=Review)
+def update_stats_on_review_deleted(sender, instance, **kwargs):
+    stats.review_deleted(instance)
+
+
+@receiver(pre_save, sender=Pin)
+def remember_pin_list(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {"list", "list_id", "restaurant", "restaurant_id"} & update_fields:
+        # Rank-only reorders and the like can't move the pin between lists: no lookup.
+        instance._stats_old_list_id = instance.list_id
+    elif not instance._state.adding:
+        instance._stats_old_list_id = (
+            Pin.objects.filter(pk=instance.pk).values_list("list_id", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Pin)
+def update_stats_on_pin_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.pin_changed(instance, after_list_id=instance.list_id)
+    else:
+        before = getattr(instance, "_stats_old_list_id", instance.list_id)
+        if before != instance.list_id:
+            stats.pin_changed(instance, before_list_id=before, after_list_id=instance.list_id)
+
+
+@receiver(post_delete, sender=Pin)
+def update_stats_on_pin_deleted(sender, instance, **kwargs):
+    stats.pin_changed(instance, before_list_id=instance.list_id)
@@ -0,0 +1,92 @@
+"""
+Denormalized Profile stats.
+
+Review and pin signals apply deltas here, so profile headers, friend lists and search
+results read plain columns instead of running aggregates on every render.
+`recompute()` rebuilds the columns from the source tables (backfills, drift repair).
+"""
+from django.db.models import Count, F, Sum
+
+from places.models import List, Pin, Review
+from places.system_lists import get_system_list_ids
+
+from .models import Profile
+
+# Marks the missing side of a pin change: no "before" on create, no "after" on delete.
+ABSENT = object()
+
+
+def _apply(user_id, **deltas):
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if changes:
+        Profile.objects.filter(user_id=user_id).update(**changes)
+
+
+def review_saved(review, created, old_rating=None):
+    if created:
+        _apply(review.user_id, spots_reviewed_count=1, rating_sum=int(review.overall_rating))
+    elif old_rating is not None:
+        _apply(review.user_id, rating_sum=int(review.overall_rating) - old_rating)
+
+
+def review_deleted(review):
+    _apply(review.user_id, spots_reviewed_count=-1, rating_sum=-int(review.overall_rating))
+
+
+def pin_changed(pin, before_list_id=ABSENT, after_list_id=ABSENT):
+    """
+    Apply the spots_saved_count delta for a pin that was created, moved between lists
+    or deleted. A restaurant counts once however many non-Visited lists hold it.
+    """
+    visited_ids = {get_system_list_ids(pin.user_id).get(List.VISITED)} - {None}
+
+    was_saved = before_list_id is not ABSENT and before_list_id not in visited_ids
+    is_saved = after_list_id is not ABSENT and after_list_id not in visited_ids
+    if was_saved == is_saved:
+        return
+
+    # Another saved pin for the same place means the distinct count doesn't move.
+    if (
+        Pin.objects.filter(user_id=pin.user_id, restaurant_id=pin.restaurant_id)
+        .exclude(pk=pin.pk)
+        .exclude(list_id__in=visited_ids)
+        .exists()
+    ):
+        return
+    _apply(pin.user_id, spots_saved_count=1 if is_saved else -1)
+
+
+def recompute(user_ids=None, batch_size=1000):
+    """Rebuild stats for the given users (or everyone) with grouped queries. Returns rows updated."""
+    reviews = Review.objects.order_by()
+    # Pins in the auto-managed "Visited" list don't count as saved spots.
+    pins = Pin.objects.exclude(list__kind=List.VISITED).order_by()
+    profiles = Profile.objects.order_by("pk")
+    if user_ids is not None:
+        reviews = reviews.filter(user_id__in=user_ids)
+        pins = pins.filter(user_id__in=user_ids)
+        profiles = profiles.filter(user_id__in=user_ids)
+
+    review_totals = {
+        row["user_id"]: (row["n"], row["total"])
+        for row in reviews.values("user_id").annotate(n=Count("id"), total=Sum("overall_rating"))
+    }
+    saved_totals = dict(
+        pins.values("user_id")
+        .annotate(n=Count("restaurant", distinct=True))
+        .values_list("user_id", "n")
+    )
+
+    fields = ["spots_reviewed_count", "rating_sum", "spots_saved_count"]
+    updated = 0
+    batch = []
+    for profile in profiles.only("pk", "user_id", *fields).iterator(chunk_size=batch_size):
+        profile.spots_reviewed_count, profile.rating_sum = review_totals.get(profile.user_id, (0, 0))
+        profile.spots_saved_count = saved_totals.get(profile.user_id, 0)
+        batch.append(profile)
+        if len(batch) >= batch_size:
+            updated += Profile.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        updated += Profile.objects.bulk_update(batch, fields)
+    return updated
@@ -3,14 +3,17 @@ from django.contrib.auth import get_user_model, login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.db.models import Count, Prefetch, Q
-from django.http import HttpResponseBadRequest, JsonResponse
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.views.decorators.http import require_http_methods, require_POST
 
+from places.images import process_avatar
+from places.list_summaries import annotate_list_summaries
 from places.models import List
 
 from .forms import ProfileForm, UserEditForm
+from .friendships import are_friends
 from .models import (
     Activity,
     Comment,
@@ -36,11 +39,20 @@ def signup(request):
     return render(request, "registration/signup.html", {"form": form})
 
 
+PROFILE_TABS = ("about", "updates", "lists")
+
+
+def _tab_redirect(url, request, tab):
+    """Non-HTMX hits on a tab URL land on the full page with that tab open."""
+    query = f"?{request.GET.urlencode()}" if request.GET else ""
+    return redirect(f"{url}{query}#{tab}")
+
+
 @login_required
 def profile_me(request):
-    """Basic profile page; shows lists via reverse relation if present."""
+    """Profile shell: header and tab bar. Each tab body is loaded by `profile_me_tab`."""
     U = get_user_model()
-    me = get_object_or_404(U, pk=request.user.id)
+    me = get_object_or_404(U.objects.select_related("profile"), pk=request.user.id)
 
     # Handle form submissions
     if request.method == "POST":
@@ -73,14 +85,38 @@ def profile_me(request):
             profile.save()
             messages.success(request, "About section updated!")
             return redirect("profile_me")
-    # If you registered List in places, Django will create me.list_set
-    lists = getattr(me, "list_set", None).all().order_by("title") if hasattr(me, "list_set") else []
 
-    # Get recent activities for Updates tab (like the main feed)
-    from django.db.models import Count, Prefetch
+    # Header stats (denormalized columns, no aggregate queries)
+    profile = getattr(me, 'profile', None)
+    stats = {
+        'avg_rating': profile.avg_rating if profile else None,
+        'spots_reviewed': profile.spots_reviewed_count if profile else 0,
+        'spots_saved': profile.spots_saved_count if profile else 0,
+    }
+
+    return render(
+        request,
+        "social/profile_me.html",
+        {
+            "me": me,
+            "active_tab": "profile",
+            "stats": stats,
+        },
+    )
+
 
-    from .models import Like
+def _profile_me_about(request, me):
+    profile = getattr(me, 'profile', None)
+    return {
+        "stats": {
+            'favorite_cuisines': profile.favorite_cuisines if profile else [],
+            'favorite_spots': profile.favorite_spots.all() if profile else [],
+        },
+        "cuisine_choices": ProfileForm.CUISINE_CHOICES,
+    }
 
+
+def _profile_me_updates(request, me):
     # Get filter parameters
     would_go_again = request.GET.get('would_go_again')
     date_filter = request.GET.get('date')
@@ -146,37 +182,29 @@ def profile_me(request):
     for a in activities:
         a.liked_by_me = a.id in liked_ids
 
-    # Get profile stats
-    profile = getattr(me, 'profile', None)
-    stats = {
-        'avg_rating': profile.avg_rating if profile else None,
-        'spots_reviewed': profile.spots_reviewed_count if profile else 0,
-        'spots_saved': profile.spots_saved_count if profile else 0,
-        'favorite_cuisines': profile.favorite_cuisines if profile else [],
-        'favorite_spots': profile.favorite_spots.all() if profile else [],
-    }
+    return {"activities": activities}
 
-    # Get all restaurants for the dropdown
-    from places.models import Restaurant
-    all_restaurants = Restaurant.objects.all().order_by('name')
 
-    # Get cuisine choices for the dropdown
-    from .forms import ProfileForm
-    cuisine_choices = ProfileForm.CUISINE_CHOICES
+def _profile_me_lists(request, me):
+    return {"lists": annotate_list_summaries(List.objects.filter(owner=me).order_by("rank", "id"))}
 
-    return render(
-        request,
-        "social/profile_me.html",
-        {
-            "me": me,
-            "lists": lists,
-            "active_tab": "profile",
-            "activities": activities,
-            "stats": stats,
-            "all_restaurants": all_restaurants,
-            "cuisine_choices": cuisine_choices,
-        },
-    )
+
+@login_required
+def profile_me_tab(request, tab):
+    """HTMX fragment for one tab of the own-profile page; only that tab's queries run."""
+    if tab not in PROFILE_TABS:
+        raise Http404("Unknown tab")
+    if not request.htmx:
+        return _tab_redirect(reverse("profile_me"), request, tab)
+
+    me = request.user
+    builders = {
+        "about": _profile_me_about,
+        "updates": _profile_me_updates,
+        "lists": _profile_me_lists,
+    }
+    context = {"me": me, **builders[tab](request, me)}
+    return render(request, f"social/_profile_me_{tab}.html", context)
 
 
 @login_required
@@ -258,6 +286,7 @@ def friends(request, username=None):
 
 @login_required
 def profile_public(request, username: str):
+    """Public profile shell; tab bodies are loaded by `profile_public_tab`."""
     person = get_object_or_404(
         User.objects.select_related("profile"),
         username=username,
@@ -266,7 +295,7 @@ def profile_public(request, username: str):
     if person.id == request.user.id:
         return redirect("profile_me")
 
-    # Check friend relationship
+    # Check friend relationship (the header's friend button needs the row itself)
     friendship = Friend.objects.filter(
         Q(requesting_user=request.user, target_user=person) |
         Q(requesting_user=person, target_user=request.user)
@@ -275,32 +304,6 @@ def profile_public(request, username: str):
     is_friend = friendship and friendship.status == 'accepted'
     is_pending_request = friendship and friendship.status == 'pending'
 
-    # Get activities (reviews) for the Updates tab
-    activities = (
-        Activity.objects
-        .filter(user=person)
-        .select_related('user', 'user__profile', 'restaurant', 'review')
-        .prefetch_related(
-            'review__photos',
-            'comments__user__profile',
-            'likes__user__profile'
-        )
-        .annotate(comment_count=Count('comments'))
-        .order_by('-created_at')[:20]
-    )
-
-    # Get lists for the Spots tab
-    # Show all lists if they're friends, otherwise only public lists
-    lists_query = List.objects.filter(owner=person)
-    if not is_friend:
-        lists_query = lists_query.filter(is_public=True)
-
-    lists = (
-        lists_query
-        .prefetch_related('pins__restaurant')
-        .order_by('title')
-    )
-
     return render(
         request,
         "social/profile_public.html",
@@ -309,10 +312,50 @@ def profile_public(request, username: str):
             "is_friend": is_friend,
             "is_pending_request": is_pending_request,
             "friendship": friendship,
-            "activities": activities,
-            "lists": lists,
         },
     )
+
+
+@login_required
+def profile_public_tab(request, username: str, tab: str):
+    """HTMX fragment for one tab of someone else's profile."""
+    if tab not in PROFILE_TABS:
+        raise Http404("Unknown tab")
+    if not request.htmx:
+        return _tab_redirect(reverse("profile_public", args=[username]), request, tab)
+
+    person = get_object_or_404(
+        User.objects.select_related("profile"),
+        username=username,
+    )
+    context = {"person": person}
+
+    if tab == "updates":
+        context["activities"] = (
+            Activity.objects
+            .filter(user=person)
+            .select_related('user', 'user__profile', 'restaurant', 'review')
+            .prefetch_related(
+                'review__photos',
+                'comments__user__profile',
+                'likes__user__profile'
+            )
+            .annotate(comment_count=Count('comments'))
+            .order_by('-created_at')[:20]
+        )
+    elif tab == "lists":
+        # Show all lists if they're friends, otherwise only public lists
+        is_friend = are_friends(request.user.id, person.id)
+        lists_query = List.objects.filter(owner=person)
+        if not is_friend:
+            lists_query = lists_query.filter(is_public=True)
+
+        context["is_friend"] = is_friend
+        context["lists"] = annotate_list_summaries(lists_query.order_by('rank', 'id'))
+
+    return render(request, f"social/_profile_public_{tab}.html", context)
+
+
 # ---------- Feed ----------
 
 @login_required
@@ -775,6 +818,7 @@ def find_friends(request):
     users_with_relationships = []
     if q:
         users = (User.objects
+                 .select_related("profile")
                  .exclude(id=request.user.id)
                  .filter(
                      Q(username__icontains=q) |
@@ -829,7 +873,7 @@ def find_friends_search(request):
     """
     q = (request.GET.get("q") or "").strip()
 
-    users = User.objects.exclude(id=request.user.id)
+    users = User.objects.select_related("profile").exclude(id=request.user.id)
     if q:
         users = users.filter(
             Q(username__icontains=q) |
@@ -912,7 +956,12 @@ def edit_profile(request):
         pform = ProfileForm(request.POST, request.FILES, instance=profile)
         if uform.is_valid() and pform.is_valid():
             uform.save()
-            pform.save()
+            profile = pform.save()
+            if "avatar" in pform.changed_data:
+                try:
+                    process_avatar(profile)
+                except (OSError, ValueError):
+                    pass  # served as uploaded; generate_image_variants can retry
             messages.success(request, "Profile updated!")
             return redirect("profile_me")
     else: